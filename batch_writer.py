@@ -0,0 +1,89 @@
+import logging
+import queue
+import threading
+import time
+
+log = logging.getLogger(__name__)
+_STOP = object()
+
+
+class BatchWriter(threading.Thread):
+    """Thread nền ghi theo lô: event loop chỉ việc đưa item vào hàng đợi bằng `submit`.
+
+    Item được gom lại và giao cho `_write` (lớp con cài đặt) khi đủ `batch_size` item hoặc sau
+    `flush_interval` giây. Nếu hàng đợi đầy, item bị bỏ và được đếm vào `dropped`; lô mà `_write`
+    ném lỗi (đĩa đầy, không mở được file...) được ghi log, đếm vào `failed` và thread vẫn chạy
+    tiếp. Khi dừng, các item còn lại được ghi nốt rồi `_close` được gọi.
+    """
+
+    def __init__(self, name, max_queue=10000, batch_size=256, flush_interval=1.0):
+        super().__init__(name=name, daemon=True)
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self.written = 0
+        self.batches = 0
+        self.failed = 0  # Số item thuộc các lô ghi lỗi
+
+    def submit(self, item):
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+
+    def _write(self, batch):
+        raise NotImplementedError
+
+    def _close(self):
+        pass
+
+    def _flush(self, batch):
+        try:
+            self._write(batch)
+        except Exception:
+            self.failed += len(batch)
+            log.exception("%s: không ghi được lô %d item", self.name, len(batch))
+            return
+        self.written += len(batch)
+        self.batches += 1
+
+    def run(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                item = self.queue.get(timeout=max(0, deadline - time.monotonic()))
+            except queue.Empty:
+                item = None
+            if item is _STOP:
+                break
+            if item is not None:
+                batch.append(item)
+            if len(batch) >= self.batch_size or time.monotonic() >= deadline:
+                if batch:
+                    self._flush(batch)
+                batch = []
+                deadline = time.monotonic() + self.flush_interval
+        if batch:
+            self._flush(batch)
+        self._close()
+
+    def stop(self, timeout=5.0):
+        """Ghi nốt các item còn trong hàng đợi rồi dừng thread, chờ tối đa khoảng 2 * `timeout` giây"""
+        try:
+            self.queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            # Hàng đợi vẫn đầy sau `timeout` giây: thread ghi đã chết hoặc bị treo, không chờ nó nữa
+            log.error("%s không nhận lệnh dừng, bỏ %d item còn trong hàng đợi", self.name, self.queue.qsize())
+        self.join(timeout)
+
+    def stats(self):
+        """Số item đang chờ, đã ghi, bị bỏ, ghi lỗi và số lô đã ghi"""
+        return {
+            "queue_depth": self.queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "batches": self.batches,
+        }
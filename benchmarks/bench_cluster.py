@@ -0,0 +1,181 @@
+"""Đo thông lượng lệnh kinh tế khi chia bot thành nhiều process shard (xem cluster.py).
+
+Process này đóng vai process chủ: nạp bộ dữ liệu giả lập, mở EconomyServer rồi chạy N process
+shard. Mỗi process shard gọi trực tiếp các lệnh (balance, daily, give, foxcoin buy, leaderboard,
+pets buy) với `ctx` giả trong `--seconds` giây, người dùng được chọn ngẫu nhiên trên toàn bộ dữ
+liệu nên rất nhiều lệnh give là giữa hai shard khác nhau.
+
+Sau mỗi lần chạy, tổng số dư được đối chiếu với trước khi chạy sau khi trừ tiền daily đã phát
+và cộng lại tiền đã chi cho foxcoin/pet: give giữa các shard không được làm mất hay sinh thêm tiền.
+
+Chạy: python benchmarks/bench_cluster.py --workers 1,2,4 --users 100000 --seconds 10
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_commands import FIRST_ID, FakeCtx, FakeGuild, FakeUser, make_fixtures, percentile  # noqa: E402
+
+MIX = {'balance': 3, 'give': 3, 'daily': 1, 'foxcoin buy': 1, 'leaderboard': 1, 'pets buy': 1}
+
+
+# --- Process shard ---
+
+async def run_worker(users, seconds, seed):
+    import main
+    main.price_feed.load()
+    rng = random.Random(seed)
+    guild = FakeGuild()
+    names = list(MIX)
+    weights = list(MIX.values())
+    counts = dict.fromkeys(names, 0)
+    timings = []
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        command = rng.choices(names, weights)[0]
+        uid = FIRST_ID + rng.randrange(users)
+        ctx = FakeCtx(uid, guild)
+        start = time.perf_counter_ns()
+        if command == 'balance':
+            await main.balance.callback(ctx)
+        elif command == 'give':
+            await main.give.callback(ctx, FakeUser(FIRST_ID + rng.randrange(users)), rng.randint(1, 50))
+        elif command == 'daily':
+            await main.daily.callback(ctx)
+        elif command == 'foxcoin buy':
+            await main.foxcoin.callback(ctx, 'buy', '1')
+        elif command == 'leaderboard':
+            await main.leaderboard.callback(ctx, rng.randint(1, 5))
+        else:
+            await main.pets.callback(ctx, 'buy', 'dog')
+        timings.append(time.perf_counter_ns() - start)
+        counts[command] += 1
+    timings.sort()
+    main.user_store.close()
+    return {
+        'commands': len(timings),
+        'counts': counts,
+        'p50_us': percentile(timings, 0.50) / 1000,
+        'p99_us': percentile(timings, 0.99) / 1000,
+        'rpc_calls': main.user_store.client.calls,
+    }
+
+
+# --- Process chủ ---
+
+def economy_totals(store):
+    """Tổng số dư, foxcoin và số pet"""
+    balance = foxcoin = pets = 0
+    for user_id, user in store.iter_users():
+        balance += user['balance']
+        foxcoin += user['foxcoin']
+        pets += len(user.get('pets', []))
+    return balance, foxcoin, pets
+
+
+async def run_cluster(workers, args, data_dir):
+    import main
+    import cluster
+    main.user_store.load()
+    main.price_feed.load()
+    before = economy_totals(main.user_store)
+    server = cluster.EconomyServer(main.user_store, main.get_foxcoin_price, cooldowns=main.cooldowns)
+    address = await server.start()
+    processes = []
+    for worker in range(workers):
+        env = dict(os.environ, BOT_ECONOMY_ADDRESS=address, BOT_ECONOMY_SECRET=server.secret,
+                   BOT_WORKER_ID=str(worker), BOT_DATA_DIR=data_dir, PYTHONPATH=ROOT)
+        processes.append(await asyncio.create_subprocess_exec(
+            sys.executable, os.path.abspath(__file__), '--worker', '--users', str(args.users),
+            '--seconds', str(args.seconds), '--seed', str(args.seed + worker),
+            cwd=data_dir, env=env, stdout=asyncio.subprocess.PIPE,
+        ))
+    results = []
+    for process in processes:
+        stdout, _ = await process.communicate()
+        if process.returncode:
+            raise SystemExit(f'Process shard lỗi (mã {process.returncode})')
+        results.append(json.loads(stdout.decode().strip().splitlines()[-1]))
+    server.close()
+    after = economy_totals(main.user_store)
+    # Giá không đổi trong lúc chạy (update_price không chạy), nên mọi thay đổi tổng số dư phải đến từ
+    # daily (+DAILY_AMOUNT mỗi lần nhận), mua foxcoin (-giá × số foxcoin) và mua pet (-giá pet)
+    # Bộ dữ liệu chưa có cooldowns.json nên mỗi cooldown daily là một lần nhận
+    claims = sum(1 for key in main.cooldowns.load() if key.endswith(':daily'))
+    expected = (before[0] + claims * main.DAILY_AMOUNT - (after[1] - before[1]) * main.get_foxcoin_price()
+                - (after[2] - before[2]) * main.get_pet_price('dog'))
+    commands = sum(result['commands'] for result in results)
+    return {
+        'workers': workers,
+        'commands': commands,
+        'commands_per_s': commands / args.seconds,
+        'p50_us': max(result['p50_us'] for result in results),
+        'p99_us': max(result['p99_us'] for result in results),
+        'owner_requests': server.requests,
+        'lease_conflicts': server.conflicts,
+        'balance_drift': after[0] - expected,
+    }
+
+
+def run_size(workers, args):
+    fixtures = make_fixtures(os.path.join(args.fixtures, str(args.users)), args.users, args.seed)
+    with tempfile.TemporaryDirectory() as work:
+        for name in os.listdir(fixtures):
+            shutil.copy(os.path.join(fixtures, name), work)
+        # Mỗi số process chạy trong một process chủ mới để `main` nạp bản sao dữ liệu riêng
+        env = dict(os.environ, BOT_DATA_DIR=work, PYTHONPATH=ROOT)
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--owner', '--workers', str(workers), '--users', str(args.users),
+             '--seconds', str(args.seconds), '--seed', str(args.seed)],
+            cwd=work, env=env, capture_output=True, text=True, check=True,
+        ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', default='1,2,4', help='Số process shard của từng lần chạy')
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--fixtures', default=os.path.join(tempfile.gettempdir(), 'zero-bot-fixtures'))
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='Ghi kết quả JSON vào file thay vì stdout')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--owner', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(asyncio.run(run_worker(args.users, args.seconds, args.seed))))
+        return
+    if args.owner:
+        print(json.dumps(asyncio.run(run_cluster(int(args.workers), args, os.getcwd()))))
+        return
+
+    report = {'cpus': os.cpu_count(), 'users': args.users, 'seconds': args.seconds, 'runs': []}
+    print(f"{'process':>7} {'lệnh/s':>10} {'p50 µs':>9} {'p99 µs':>9} {'yêu cầu chủ':>12} {'tranh chấp':>11} {'lệch tiền':>10}",
+          file=sys.stderr)
+    for workers in (int(count) for count in args.workers.split(',')):
+        run = run_size(workers, args)
+        report['runs'].append(run)
+        print(f"{workers:>7} {run['commands_per_s']:>10,.0f} {run['p50_us']:>9.1f} {run['p99_us']:>9.1f} "
+              f"{run['owner_requests']:>12,} {run['lease_conflicts']:>11,} {run['balance_drift']:>10.2f}", file=sys.stderr)
+    payload = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(payload)
+    else:
+        print(payload)
+
+
+if __name__ == '__main__':
+    main()
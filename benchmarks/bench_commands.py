@@ -0,0 +1,257 @@
+"""Đo độ trễ và bộ nhớ cấp phát của các lệnh kinh tế trên dữ liệu giả lập 1k/100k/1M người dùng.
+
+Với mỗi kích thước, script tạo (hoặc dùng lại) bộ dữ liệu users.json + foxcoin_price.csv,
+rồi chạy bot trong một process riêng với BOT_DATA_DIR trỏ tới bản sao của bộ dữ liệu đó.
+Các lệnh được gọi trực tiếp với một `ctx` giả (không kết nối Discord). Kết quả là JSON
+(stdout hoặc --output) để so sánh giữa các commit bằng --compare.
+
+Chạy: python benchmarks/bench_commands.py --sizes 1000,100000 --output bench.json
+      python benchmarks/bench_commands.py --sizes 1000,100000 --compare bench.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+COMMANDS = ('balance', 'daily', 'foxcoin check', 'foxcoin buy', 'leaderboard', 'give', 'pets buy')
+FIRST_ID = 100000000000000000
+
+
+# --- Dữ liệu giả lập ---
+
+def make_fixtures(directory, users, seed=1):
+    """Tạo users.json, foxcoin_price.csv và bảng giá trong `directory` (bỏ qua nếu đã có)"""
+    marker = os.path.join(directory, '.complete')
+    if os.path.exists(marker):
+        return directory
+    os.makedirs(directory, exist_ok=True)
+    rng = random.Random(seed)
+    pets = ['dog', 'cat', 'snail', 'fox', 'pig']
+    with open(os.path.join(directory, 'users.json'), 'w', encoding='utf-8') as f:
+        f.write('{')
+        for i in range(users):
+            record = {
+                'balance': rng.randint(0, 200000),
+                'last_daily': '2025-07-30T04:59:35.483067' if rng.random() < 0.3 else None,
+                'foxcoin': round(rng.random() * 100, 2),
+                'pets': rng.sample(pets, k=rng.randint(0, 3)),
+            }
+            f.write(('' if i == 0 else ',') + json.dumps(str(FIRST_ID + i)) + ':' + json.dumps(record, ensure_ascii=False))
+        f.write('}')
+    with open(os.path.join(directory, 'foxcoin_price.csv'), 'w', encoding='utf-8') as f:
+        f.write('timestamp,price\n')
+        price = 10.0
+        start = time.time() - 24 * 3600 * 30
+        for hour in range(24 * 30):
+            price = round(price * (1 + rng.choice([0.005, -0.005, 0.01, -0.01])), 2)
+            f.write(time.strftime('%Y-%m-%d %H:%M', time.localtime(start + hour * 3600)) + f',{price}\n')
+    for name in ('pets_price.json', 'shop_items.json'):
+        shutil.copy(os.path.join(ROOT, name), directory)
+    open(marker, 'w').close()
+    return directory
+
+
+# --- Chạy lệnh (trong process con) ---
+
+class FakeUser:
+    def __init__(self, user_id):
+        self.id = user_id
+        self.mention = f'<@{user_id}>'
+        self.name = self.display_name = f'user{user_id}'
+        self.bot = False
+
+    def __str__(self):
+        return self.name
+
+
+class FakeGuild:
+    id = 1
+
+    def get_member(self, user_id):
+        return FakeUser(user_id)
+
+
+class FakeCtx:
+    def __init__(self, user_id, guild):
+        self.author = FakeUser(user_id)
+        self.guild = guild
+        self.channel = FakeGuild()
+        self.message = None
+        self.sent = 0
+
+    async def send(self, content=None, **kwargs):
+        self.sent += 1
+
+
+def percentile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+async def run_worker(users, iterations, alloc_iterations, seed):
+    started = time.perf_counter()
+    import main
+    main.user_store.load()
+    main.price_feed.load()
+    main.price_history.load()
+    startup = time.perf_counter() - started
+
+    rng = random.Random(seed)
+    guild = FakeGuild()
+
+    def call(command):
+        uid = FIRST_ID + rng.randrange(users)
+        ctx = FakeCtx(uid, guild)
+        if command == 'balance':
+            return main.balance.callback(ctx)
+        if command == 'daily':
+            return main.daily.callback(ctx)
+        if command == 'foxcoin check':
+            return main.foxcoin.callback(ctx, 'check')
+        if command == 'foxcoin buy':
+            return main.foxcoin.callback(ctx, 'buy', '1')
+        if command == 'leaderboard':
+            return main.leaderboard.callback(ctx, rng.randint(1, 5))
+        if command == 'give':
+            return main.give.callback(ctx, FakeUser(FIRST_ID + rng.randrange(users)), 10)
+        if command == 'pets buy':
+            return main.pets.callback(ctx, 'buy', 'dog')
+        raise ValueError(command)
+
+    results = {}
+    for command in COMMANDS:
+        timings = []
+        for _ in range(iterations):
+            coro = call(command)
+            start = time.perf_counter_ns()
+            await coro
+            timings.append(time.perf_counter_ns() - start)
+        timings.sort()
+        total = sum(timings)
+        results[command] = {
+            'calls': iterations,
+            'mean_us': total / iterations / 1000,
+            'p50_us': percentile(timings, 0.50) / 1000,
+            'p90_us': percentile(timings, 0.90) / 1000,
+            'p99_us': percentile(timings, 0.99) / 1000,
+            'max_us': timings[-1] / 1000,
+            'ops_per_s': iterations / (total / 1e9),
+        }
+
+    # Đo cấp phát bộ nhớ riêng vì tracemalloc làm chậm các lệnh
+    tracemalloc.start()
+    for command in COMMANDS:
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        for _ in range(alloc_iterations):
+            await call(command)
+        after, peak = tracemalloc.get_traced_memory()
+        results[command]['alloc_peak_bytes'] = peak - before
+        results[command]['alloc_retained_bytes_per_call'] = (after - before) / alloc_iterations
+    tracemalloc.stop()
+
+    dirty = len(main.user_store.dirty)
+    start = time.perf_counter()
+    main.user_store.flush()
+    flush_ms = (time.perf_counter() - start) * 1000
+    main.user_store.close()
+    return {
+        'users': users,
+        'mode': main.USER_STORE_MODE,
+        'startup_ms': startup * 1000,
+        'flush': {'records': dirty, 'ms': flush_ms},
+        'commands': results,
+    }
+
+
+# --- Điều phối ---
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run_size(users, args):
+    fixtures = make_fixtures(os.path.join(args.fixtures, str(users)), users, args.seed)
+    with tempfile.TemporaryDirectory() as work:
+        # Lệnh ghi vào dữ liệu, nên mỗi lần chạy dùng một bản sao
+        for name in os.listdir(fixtures):
+            shutil.copy(os.path.join(fixtures, name), work)
+        env = dict(os.environ, BOT_DATA_DIR=work, USER_STORE_MODE=args.mode, PYTHONPATH=ROOT)
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--worker', '--users', str(users),
+             '--iterations', str(args.iterations), '--alloc-iterations', str(args.alloc_iterations), '--seed', str(args.seed)],
+            cwd=work, env=env, capture_output=True, text=True, check=True,
+        ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def print_table(run, baseline=None):
+    print(f"\n{run['users']:,} người dùng ({run['mode']}): khởi động {run['startup_ms']:,.0f} ms, "
+          f"flush {run['flush']['records']:,} bản ghi {run['flush']['ms']:,.1f} ms", file=sys.stderr)
+    print(f"{'lệnh':<14} {'p50 µs':>9} {'p90 µs':>9} {'p99 µs':>9} {'ops/s':>10} {'peak KiB':>9} {'giữ B/lệnh':>11}"
+          + ('  p50/p99 so với trước' if baseline else ''), file=sys.stderr)
+    for command, result in run['commands'].items():
+        line = (f"{command:<14} {result['p50_us']:>9.1f} {result['p90_us']:>9.1f} {result['p99_us']:>9.1f} "
+                f"{result['ops_per_s']:>10,.0f} {result['alloc_peak_bytes'] / 1024:>9.1f} {result['alloc_retained_bytes_per_call']:>11.1f}")
+        old = baseline['commands'].get(command) if baseline else None
+        if old:
+            line += f"  x{result['p50_us'] / old['p50_us']:.2f} / x{result['p99_us'] / old['p99_us']:.2f}"
+        print(line, file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='1000,100000,1000000', help='Số người dùng của từng bộ dữ liệu')
+    parser.add_argument('--mode', default='json', choices=['json', 'journal', 'binary', 'sqlite'], help='USER_STORE_MODE')
+    parser.add_argument('--iterations', type=int, default=2000, help='Số lần gọi mỗi lệnh khi đo độ trễ')
+    parser.add_argument('--alloc-iterations', type=int, default=200, help='Số lần gọi mỗi lệnh khi đo bộ nhớ')
+    parser.add_argument('--fixtures', default=os.path.join(tempfile.gettempdir(), 'zero-bot-fixtures'),
+                        help='Thư mục giữ bộ dữ liệu giả lập để dùng lại giữa các lần chạy')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='Ghi kết quả JSON vào file thay vì stdout')
+    parser.add_argument('--compare', help='File JSON của lần chạy trước để so sánh')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--users', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        result = asyncio.run(run_worker(args.users, args.iterations, args.alloc_iterations, args.seed))
+        print(json.dumps(result))
+        return
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = {(run['users'], run['mode']): run for run in json.load(f)['runs']}
+    report = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'iterations': args.iterations,
+        'runs': [],
+    }
+    for users in (int(size) for size in args.sizes.split(',')):
+        run = run_size(users, args)
+        report['runs'].append(run)
+        print_table(run, baseline.get((users, args.mode)))
+    payload = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(payload)
+    else:
+        print(payload)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,409 @@
+"""Tạo tải cho bot thật qua một Discord giả lập chạy tại chỗ (không kết nối mạng).
+
+Tin nhắn được đưa vào bot dưới dạng payload MESSAGE_CREATE của gateway, nên đi qua đúng
+đường xử lý thật: parse của discord.py -> on_message -> prefix (`!z`, `!zero`, mention) ->
+converter -> lệnh. Lớp REST được thay bằng một HTTP client giả, đếm số lần gọi API theo route
+và theo lệnh, có thể thêm độ trễ giả lập. Tin nhắn được sinh theo tỉ lệ các lệnh (--mix) hoặc
+phát lại từ log của server (--replay logs/<guild>.log, logs/archive/..., logs/events/...),
+với tốc độ --rate tin nhắn/giây.
+
+Báo cáo (JSON): độ trễ p50/p99 từ lúc nhận tin nhắn tới khi lệnh xong, độ trễ của event loop,
+số lần gọi API theo route và theo lệnh (số tin nhắn lệnh gửi/sửa và số lần gọi sau khi outbox gộp,
+xem outbox.py). --send-window và --channel-rate đổi cách gộp và rate limit mỗi kênh để so sánh.
+
+Chạy: python benchmarks/bench_gateway.py --messages 5000 --rate 500 --users 10000
+      python benchmarks/bench_gateway.py --replay logs/123456789.log --rate 200
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_commands import FIRST_ID, make_fixtures, percentile  # noqa: E402
+
+BOT_ID = 999000000000000001
+GUILD_BASE = 800000000000000000
+CHANNEL_BASE = 810000000000000000
+PREFIXES = ('!z ', '!zero ', f'<@{BOT_ID}> ')
+TIMESTAMP = '2025-01-01T00:00:00+00:00'
+
+# Tên lệnh -> mẫu nội dung (không gồm prefix). {other} là một người dùng khác, được mention
+MESSAGE_TEMPLATES = {
+    'balance': 'balance',
+    'daily': 'daily',
+    'coinflip': 'cf heads 10',
+    'spin': 'spin 10',
+    'taixiu': 'taixiu tai 10',
+    'foxcoin': 'fxc check',
+    'leaderboard': 'ldb {page}',
+    'give': 'give <@{other}> 5',
+    'work': 'work',
+    'blackjack': 'bj 10',
+    'chat': None,  # Tin nhắn thường, không phải lệnh
+}
+DEFAULT_MIX = 'balance=20,daily=5,coinflip=15,spin=10,taixiu=10,foxcoin=5,leaderboard=5,give=5,work=5,blackjack=5,chat=15'
+COMMAND_LINE = re.compile(r'\[COMMAND\] .* \((\d+)\) dùng lệnh: (.*)$', re.S)
+MENTION = re.compile(r'<@!?(\d{15,20})>')
+
+
+# --- Payload gateway ---
+
+def user_payload(user_id, bot=False):
+    return {'id': str(user_id), 'username': f'user{user_id}', 'discriminator': '0', 'avatar': None, 'bot': bot}
+
+
+def member_payload():
+    return {'roles': [], 'joined_at': TIMESTAMP, 'deaf': False, 'mute': False, 'flags': 0}
+
+
+def guild_payload(guild_id, channel_ids):
+    return {
+        'id': str(guild_id), 'name': f'guild{guild_id}', 'icon': None, 'owner_id': str(FIRST_ID),
+        'roles': [{'id': str(guild_id), 'name': '@everyone', 'permissions': '0', 'position': 0, 'color': 0,
+                   'hoist': False, 'managed': False, 'mentionable': False}],
+        'channels': [{'id': str(cid), 'type': 0, 'name': f'channel{cid}', 'position': i, 'permission_overwrites': []}
+                     for i, cid in enumerate(channel_ids)],
+        'members': [], 'member_count': 0, 'emojis': [], 'stickers': [], 'features': [],
+        'verification_level': 0, 'default_message_notifications': 0, 'explicit_content_filter': 0,
+        'mfa_level': 0, 'premium_tier': 0, 'preferred_locale': 'en-US', 'system_channel_flags': 0,
+        'nsfw_level': 0, 'premium_progress_bar_enabled': False, 'unavailable': False,
+    }
+
+
+def message_payload(message_id, guild_id, channel_id, user_id, content, author=None):
+    mentions = []
+    for mentioned in dict.fromkeys(int(uid) for uid in MENTION.findall(content)):
+        mention = user_payload(mentioned, bot=mentioned == BOT_ID)
+        mention['member'] = member_payload()
+        mentions.append(mention)
+    return {
+        'id': str(message_id), 'channel_id': str(channel_id), 'guild_id': str(guild_id),
+        'author': author or user_payload(user_id), 'member': member_payload(), 'content': content,
+        'timestamp': TIMESTAMP, 'edited_timestamp': None, 'tts': False, 'mention_everyone': False,
+        'mentions': mentions, 'mention_roles': [], 'attachments': [], 'embeds': [], 'pinned': False, 'type': 0,
+    }
+
+
+# --- Discord giả lập ---
+
+class FakeDiscord:
+    """Gắn bot vào gateway/REST giả: tạo server và kênh, thay `bot.http.request` bằng hàm đếm số lần gọi"""
+
+    def __init__(self, bot, api_latency=0.0):
+        self.bot = bot
+        self.state = bot._connection
+        self.api_latency = api_latency
+        self.next_id = 900000000000000000
+        self.api_calls = Counter()  # route -> số lần gọi
+
+    async def install(self, guilds, channels_per_guild):
+        import discord
+        await self.bot._async_setup_hook()
+        self.state.user = discord.ClientUser(state=self.state, data=user_payload(BOT_ID, bot=True))
+        self.bot.http.request = self.request
+        self.channels = []
+        for g in range(guilds):
+            guild_id = GUILD_BASE + g
+            channel_ids = [CHANNEL_BASE + g * channels_per_guild + c for c in range(channels_per_guild)]
+            self.state.parse_guild_create(guild_payload(guild_id, channel_ids))
+            self.channels.extend((guild_id, cid) for cid in channel_ids)
+
+    def snowflake(self):
+        self.next_id += 1
+        return self.next_id
+
+    async def request(self, route, **kwargs):
+        key = f'{route.method} {route.path}'
+        self.api_calls[key] += 1
+        if self.api_latency:
+            await asyncio.sleep(self.api_latency)
+        payload = kwargs.get('json') or {}
+        if route.path.endswith('/messages') or route.path.endswith('/messages/{message_id}'):
+            data = message_payload(
+                getattr(route, 'message_id', None) or self.snowflake(), 0, route.channel_id, BOT_ID,
+                payload.get('content') or '', author=user_payload(BOT_ID, bot=True),
+            )
+            del data['guild_id'], data['member']
+            data['embeds'] = payload.get('embeds') or []
+            return data
+        if route.path == '/users/{user_id}':
+            return user_payload(route.user_id if hasattr(route, 'user_id') else self.snowflake())
+        return {}
+
+    def inject(self, guild_id, channel_id, user_id, content):
+        """Đưa một tin nhắn vào bot như gateway gửi MESSAGE_CREATE, trả về ID tin nhắn"""
+        message_id = self.snowflake()
+        self.state.parse_message_create(message_payload(message_id, guild_id, channel_id, user_id, content))
+        return message_id
+
+
+# --- Nguồn tin nhắn ---
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        if name not in MESSAGE_TEMPLATES:
+            raise SystemExit(f'Không có mẫu tin nhắn cho "{name}", chọn trong: {", ".join(MESSAGE_TEMPLATES)}')
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def generate_messages(count, mix, users, channels, rng):
+    """Sinh (kênh, người dùng, nội dung) theo tỉ lệ `mix`. Sau mỗi ván blackjack người đó gõ `stand`"""
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    pending_stand = []
+    messages = []
+    while len(messages) < count:
+        if pending_stand and rng.random() < 0.5:
+            messages.append(pending_stand.pop(0) + ('stand',))
+            continue
+        name = rng.choices(names, weights)[0]
+        guild_id, channel_id = rng.choice(channels)
+        user_id = FIRST_ID + rng.randrange(users)
+        template = MESSAGE_TEMPLATES[name]
+        if template is None:
+            messages.append((guild_id, channel_id, user_id, 'hello'))
+            continue
+        other = FIRST_ID + rng.randrange(users)
+        content = rng.choice(PREFIXES) + template.format(other=other, page=rng.randint(1, 5))
+        messages.append((guild_id, channel_id, user_id, content))
+        if name == 'blackjack':
+            pending_stand.append((guild_id, channel_id, user_id))
+    return messages[:count]
+
+
+def _replay_lines(path):
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        if '.jsonl' in path:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue
+                if event.get('kind') == 'command' and event.get('user_id'):
+                    yield event['channel_id'], event['user_id'], event['payload'].get('content', '')
+        else:
+            import log_archive
+            for _, event, text in log_archive.iter_records(f):
+                match = COMMAND_LINE.search(text) if event == 'COMMAND' else None
+                if match:
+                    yield None, int(match.group(1)), match.group(2)
+
+
+def load_replay(paths, channels):
+    """Đọc các lệnh đã ghi trong log server (.log/.log.gz) hoặc sự kiện (.jsonl/.jsonl.gz).
+
+    Kênh trong log được ánh xạ cố định lên các kênh giả lập, log văn bản không có kênh thì dùng
+    kênh theo người dùng.
+    """
+    messages = []
+    for path in paths:
+        files = [path]
+        if os.path.isdir(path):
+            files = sorted(os.path.join(dirpath, name) for dirpath, _, names in os.walk(path) for name in names
+                           if name.endswith(('.log', '.log.gz', '.jsonl', '.jsonl.gz')))
+        for file in files:
+            for channel, user_id, content in _replay_lines(file):
+                guild_id, channel_id = channels[hash(channel or user_id) % len(channels)]
+                messages.append((guild_id, channel_id, user_id, content))
+    return messages
+
+
+# --- Đo ---
+
+class LoopLagProbe:
+    """Đo độ trễ của event loop: task ngủ `interval` giây và ghi lại phần thức dậy muộn"""
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.samples = []
+        self.task = None
+
+    async def _run(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.samples.append(time.perf_counter() - start - self.interval)
+
+    def start(self):
+        self.task = asyncio.ensure_future(self._run())
+
+    def stop(self):
+        self.task.cancel()
+
+
+def latency_summary(values):
+    if not values:
+        return {'count': 0}
+    values = sorted(values)
+    return {
+        'count': len(values),
+        'p50_ms': percentile(values, 0.50) * 1000,
+        'p90_ms': percentile(values, 0.90) * 1000,
+        'p99_ms': percentile(values, 0.99) * 1000,
+        'max_ms': values[-1] * 1000,
+    }
+
+
+async def run(args):
+    import main
+    fake = FakeDiscord(main.bot, api_latency=args.api_latency_ms / 1000)
+    await fake.install(args.guilds, args.channels)
+    main.user_store.load()
+    main.price_feed.load()
+    main.flush_users.start()
+    main.expire_sessions.start()
+
+    injected = {}  # message_id -> thời điểm đưa vào
+    latencies = defaultdict(list)
+    errors = Counter()
+
+    async def on_command_completion(ctx):
+        started = injected.pop(ctx.message.id, None)
+        if started is not None:
+            latencies[ctx.command.qualified_name].append(time.perf_counter() - started)
+
+    async def on_command_error(ctx, error):
+        injected.pop(ctx.message.id, None)
+        errors[type(error).__name__] += 1
+    main.bot.add_listener(on_command_completion)
+    main.bot.add_listener(on_command_error)
+
+    rng = random.Random(args.seed)
+    if args.replay:
+        messages = load_replay(args.replay, fake.channels)
+        if args.messages:
+            messages = messages[:args.messages]
+    else:
+        messages = generate_messages(args.messages, parse_mix(args.mix), args.users, fake.channels, rng)
+    if not messages:
+        raise SystemExit('Không có tin nhắn nào để gửi')
+
+    probe = LoopLagProbe()
+    probe.start()
+    start = time.perf_counter()
+    for i, (guild_id, channel_id, user_id, content) in enumerate(messages):
+        delay = start + i / args.rate - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        message_id = fake.inject(guild_id, channel_id, user_id, content)
+        if content.startswith(PREFIXES):
+            injected[message_id] = time.perf_counter()
+    sent_seconds = time.perf_counter() - start
+    # Chờ các lệnh còn đang chạy
+    deadline = time.perf_counter() + args.drain
+    while injected and time.perf_counter() < deadline:
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - start
+    probe.stop()
+    main.flush_users.cancel()
+    main.expire_sessions.cancel()
+    await main.user_store.flush_async()
+
+    commands_done = sum(len(values) for values in latencies.values())
+    return {
+        'messages': len(messages),
+        'target_rate': args.rate,
+        'achieved_rate': len(messages) / sent_seconds,
+        'elapsed_s': elapsed,
+        'commands_completed': commands_done,
+        'commands_unfinished': len(injected),
+        'errors': dict(errors),
+        'latency': dict(latency_summary([v for values in latencies.values() for v in values]),
+                        by_command={name: latency_summary(values) for name, values in sorted(latencies.items())}),
+        'loop_lag': latency_summary(probe.samples),
+        'api_calls': {
+            'total': sum(fake.api_calls.values()),
+            'per_command': sum(fake.api_calls.values()) / commands_done if commands_done else 0.0,
+            'by_route': dict(fake.api_calls.most_common()),
+            'by_command': {
+                name: {'messages': messages_sent, 'api_calls': round(calls, 3), 'per_command': round(per_run, 3)}
+                for name, messages_sent, calls, per_run in sorted(main.metrics.top_api_commands(None))
+            },
+            'coalesced': main.outbox.requests - main.outbox.api_calls,
+        },
+    }
+
+
+def print_summary(report):
+    latency, lag, api = report['latency'], report['loop_lag'], report['api_calls']
+    print(f"{report['messages']:,} tin nhắn, {report['achieved_rate']:,.0f}/{report['target_rate']:,.0f} tin/s, "
+          f"{report['commands_completed']:,} lệnh xong, {report['commands_unfinished']} chưa xong, lỗi {report['errors']}",
+          file=sys.stderr)
+    if latency['count']:
+        print(f"Độ trễ lệnh: p50 {latency['p50_ms']:.2f} ms, p99 {latency['p99_ms']:.2f} ms, max {latency['max_ms']:.1f} ms", file=sys.stderr)
+    if lag['count']:
+        print(f"Độ trễ event loop: p50 {lag['p50_ms']:.2f} ms, p99 {lag['p99_ms']:.2f} ms, max {lag['max_ms']:.1f} ms", file=sys.stderr)
+    print(f"API: {api['total']:,} lần gọi ({api['per_command']:.2f}/lệnh, gộp bớt {api['coalesced']:,}) "
+          + ', '.join(f'{k}: {v}' for k, v in api['by_route'].items()), file=sys.stderr)
+    print('API theo lệnh: ' + ', '.join(f"{name} {calls['per_command']:.2f}" for name, calls in api['by_command'].items()),
+          file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--messages', type=int, default=5000, help='Số tin nhắn (với --replay: tối đa)')
+    parser.add_argument('--rate', type=float, default=500, help='Số tin nhắn mỗi giây')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='Tỉ lệ các loại tin nhắn, ví dụ balance=5,give=1,chat=3')
+    parser.add_argument('--replay', nargs='+', help='File/thư mục log server hoặc sự kiện để phát lại')
+    parser.add_argument('--users', type=int, default=10000, help='Số người dùng của bộ dữ liệu giả lập')
+    parser.add_argument('--guilds', type=int, default=10)
+    parser.add_argument('--channels', type=int, default=5, help='Số kênh mỗi server')
+    parser.add_argument('--api-latency-ms', type=float, default=0.0, help='Độ trễ giả lập của mỗi lần gọi API')
+    parser.add_argument('--drain', type=float, default=30.0, help='Số giây tối đa chờ các lệnh còn chạy sau khi gửi xong')
+    parser.add_argument('--send-window', help='SEND_COALESCE_WINDOW: số giây gom tin nhắn cùng kênh (0: chỉ gộp khi đang chờ)')
+    parser.add_argument('--channel-rate', help='CHANNEL_RATE_LIMIT: "<số lần gọi>/<số giây>" mỗi kênh, "0": không giới hạn')
+    parser.add_argument('--mode', default='json', choices=['json', 'journal', 'binary', 'sqlite'], help='USER_STORE_MODE')
+    parser.add_argument('--fixtures', default=os.path.join(tempfile.gettempdir(), 'zero-bot-fixtures'))
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='Ghi kết quả JSON vào file thay vì stdout')
+    args = parser.parse_args()
+    args.replay = [os.path.abspath(path) for path in args.replay or []]
+    output = os.path.abspath(args.output) if args.output else None
+
+    fixtures = make_fixtures(os.path.join(args.fixtures, str(args.users)), args.users, args.seed)
+    with tempfile.TemporaryDirectory() as work:
+        for name in os.listdir(fixtures):
+            shutil.copy(os.path.join(fixtures, name), work)
+        # Bot đọc dữ liệu và ghi log vào thư mục tạm, không đụng tới dữ liệu thật
+        os.environ['BOT_DATA_DIR'] = work
+        os.environ['USER_STORE_MODE'] = args.mode
+        if args.send_window is not None:
+            os.environ['SEND_COALESCE_WINDOW'] = args.send_window
+        if args.channel_rate is not None:
+            os.environ['CHANNEL_RATE_LIMIT'] = args.channel_rate
+        os.chdir(work)
+        try:
+            report = asyncio.run(run(args))
+        finally:
+            import events
+            import server_logger
+            server_logger.shutdown()
+            events.shutdown()
+            os.chdir(ROOT)
+    print_summary(report)
+    payload = json.dumps(report, indent=2, ensure_ascii=False)
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            f.write(payload)
+    else:
+        print(payload)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""So sánh số lần ghi/giây giữa save_data cũ (ghi lại cả users.json) và journal append-only.
+
+Chạy: python benchmarks/bench_persistence.py --users 10000 --writes 200
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from journal import UserJournal  # noqa: E402
+
+
+def make_users(n):
+    return {
+        str(100000000000000000 + i): {
+            'balance': random.randint(0, 100000),
+            'last_daily': '2025-07-30T04:59:35.483067',
+            'foxcoin': random.random() * 1000,
+            'pets': random.sample(['dog', 'cat', 'snail', 'fox', 'pig'], k=random.randint(0, 3)),
+        }
+        for i in range(n)
+    }
+
+
+def legacy_save_data(path, data):
+    # Bản sao của save_data trước đây
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+
+
+def bench(name, calls, fn, records_per_call=1):
+    start = time.perf_counter()
+    for i in range(calls):
+        fn(i)
+    elapsed = time.perf_counter() - start
+    writes = calls * records_per_call
+    print(f'{name:<32} {writes / elapsed:>12,.1f} writes/s  ({elapsed * 1000 / writes:.3f} ms/write)')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--writes', type=int, default=200)
+    parser.add_argument('--batch', type=int, default=50, help='Số bản ghi mỗi lần flush của write-behind')
+    args = parser.parse_args()
+
+    data = make_users(args.users)
+    keys = list(data)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'users.json')
+        print(f'{args.users:,} người dùng, {args.writes} lần ghi')
+
+        def legacy(i):
+            data[keys[i % len(keys)]]['balance'] += 1
+            legacy_save_data(path, data)
+        bench('save_data (ghi lại cả file)', args.writes, legacy)
+
+        journal = UserJournal(path, compact_bytes=1 << 62)
+
+        def append_one(i):
+            uid = keys[i % len(keys)]
+            data[uid]['balance'] += 1
+            journal.commit(journal.encode([uid], data))
+        bench('journal (1 bản ghi/fsync)', args.writes, append_one)
+
+        def append_batch(i):
+            uids = [keys[(i * args.batch + j) % len(keys)] for j in range(args.batch)]
+            for uid in uids:
+                data[uid]['balance'] += 1
+            journal.commit(journal.encode(uids, data))
+        bench(f'journal ({args.batch} bản ghi/fsync)', args.writes, append_batch, args.batch)
+
+        start = time.perf_counter()
+        loaded = UserJournal(path).load()
+        print(f'Phát lại snapshot + journal: {(time.perf_counter() - start) * 1000:.1f} ms, {len(loaded):,} người dùng')
+
+
+if __name__ == '__main__':
+    main()
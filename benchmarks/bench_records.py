@@ -0,0 +1,159 @@
+"""So sánh bộ nhớ và tốc độ mã hoá/giải mã của bản ghi người dùng dạng dict và UserRecord.
+
+Dùng cùng bộ dữ liệu giả lập với bench_commands.py. Với mỗi kích thước đo:
+- bộ nhớ mỗi người dùng khi giữ toàn bộ trong bộ nhớ (tracemalloc, gồm cả dict ngoài cùng)
+- tốc độ ghi/đọc: JSON với dict, JSON với UserRecord và codec nhị phân của records.py
+- tốc độ truy cập/ghi `user['balance']` như trong các lệnh
+
+Trước khi đo, `check_mutations` kiểm tra UserRecord cư xử như dict với các thao tác sửa tại chỗ
+mà lệnh dùng (setdefault(...).append, move_item của UserStore).
+
+Chạy: python benchmarks/bench_records.py --sizes 100000,1000000 --output records.json
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_commands import make_fixtures  # noqa: E402
+from records import UserRecord, decode_records, encode_records, to_json  # noqa: E402
+from storage import JsonStorage  # noqa: E402
+from user_store import UserStore  # noqa: E402
+
+
+def check_mutations():
+    """UserRecord phải cho cùng kết quả với dict khi lệnh sửa pets/inventory tại chỗ"""
+    for data in ({'balance': 1}, {'balance': 1, 'pets': ['dog'], 'inventory': {'gold': 1}}):
+        expected = json.loads(json.dumps(data))
+        record = UserRecord.from_dict(data)
+        for user in (expected, record):
+            user.setdefault('pets', []).append('cat')
+            user.setdefault('inventory', {})['key'] = 2
+            user.setdefault('inventory', {})['gold'] = 3
+        assert record.to_dict() == dict(expected, last_daily=None, foxcoin=0), record
+        assert decode_records(encode_records({'1': record}))['1'].to_dict() == record.to_dict()
+    with tempfile.TemporaryDirectory() as work:
+        path = os.path.join(work, 'users.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'1': {'balance': 1, 'pets': ['cat']}, '2': {'balance': 1}}, f)
+        store = UserStore(JsonStorage(path), compact=True)
+        store.move_item(1, 2, 'cat')
+        assert list(store.get(1)['pets']) == [] and list(store.get(2)['pets']) == ['cat']
+
+
+def measure_memory(build):
+    """Số byte còn giữ sau khi `build()` tạo xong dữ liệu"""
+    gc.collect()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    data = build()
+    after, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return data, after - before, peak - before
+
+
+def timed(func, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def touch_balances(data, keys):
+    for key in keys:
+        user = data[key]
+        user['balance'] += 1
+        user.get('pets', [])
+
+
+def run_size(users, args):
+    fixtures = make_fixtures(os.path.join(args.fixtures, str(users)), users, args.seed)
+    with open(os.path.join(fixtures, 'users.json'), 'rb') as f:
+        raw = f.read()
+
+    dicts, dict_bytes, dict_peak = measure_memory(lambda: json.loads(raw))
+    records, record_bytes, record_peak = measure_memory(lambda: {uid: UserRecord.from_dict(user) for uid, user in dicts.items()})
+    assert all(records[uid].to_dict() == user for uid, user in dicts.items())
+
+    result = {
+        'users': users,
+        'memory': {
+            'dict_bytes_per_user': dict_bytes / users,
+            'record_bytes_per_user': record_bytes / users,
+            'dict_peak_bytes': dict_peak,
+            'record_peak_bytes': record_peak,
+        },
+        'codecs': {},
+    }
+
+    codecs = {
+        'json_dict': (lambda: json.dumps(dicts, ensure_ascii=False), json.loads),
+        'json_record': (lambda: json.dumps(records, ensure_ascii=False, default=to_json),
+                        lambda payload: {uid: UserRecord.from_dict(user) for uid, user in json.loads(payload).items()}),
+        'binary': (lambda: encode_records(records), decode_records),
+    }
+    for name, (encode, decode) in codecs.items():
+        payload, encode_seconds = timed(encode, args.repeat)
+        _, decode_seconds = timed(lambda: decode(payload), args.repeat)
+        result['codecs'][name] = {
+            'bytes': len(payload),
+            'encode_ms': encode_seconds * 1000,
+            'decode_ms': decode_seconds * 1000,
+            'encode_users_per_s': users / encode_seconds,
+            'decode_users_per_s': users / decode_seconds,
+        }
+
+    keys = list(records)[:min(users, 100000)]
+    _, dict_seconds = timed(lambda: touch_balances(dicts, keys), args.repeat)
+    _, record_seconds = timed(lambda: touch_balances(records, keys), args.repeat)
+    result['access_ns'] = {'dict': dict_seconds / len(keys) * 1e9, 'record': record_seconds / len(keys) * 1e9}
+    return result
+
+
+def print_table(result):
+    memory = result['memory']
+    print(f"\n{result['users']:,} người dùng: dict {memory['dict_bytes_per_user']:.0f} B/người, "
+          f"UserRecord {memory['record_bytes_per_user']:.0f} B/người "
+          f"(x{memory['dict_bytes_per_user'] / memory['record_bytes_per_user']:.2f} nhỏ hơn)", file=sys.stderr)
+    print(f"{'codec':<12} {'MiB':>8} {'ghi ms':>9} {'đọc ms':>9} {'ghi người/s':>13} {'đọc người/s':>13}", file=sys.stderr)
+    for name, codec in result['codecs'].items():
+        print(f"{name:<12} {codec['bytes'] / 2 ** 20:>8.1f} {codec['encode_ms']:>9.0f} {codec['decode_ms']:>9.0f} "
+              f"{codec['encode_users_per_s']:>13,.0f} {codec['decode_users_per_s']:>13,.0f}", file=sys.stderr)
+    access = result['access_ns']
+    print(f"user['balance'] += 1: dict {access['dict']:.0f} ns, UserRecord {access['record']:.0f} ns", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='100000,1000000', help='Số người dùng của từng bộ dữ liệu')
+    parser.add_argument('--repeat', type=int, default=3, help='Lấy lần nhanh nhất trong số lần chạy này')
+    parser.add_argument('--fixtures', default=os.path.join(tempfile.gettempdir(), 'zero-bot-fixtures'),
+                        help='Thư mục giữ bộ dữ liệu giả lập (dùng chung với bench_commands.py)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='Ghi kết quả JSON vào file thay vì stdout')
+    args = parser.parse_args()
+
+    check_mutations()
+    report = {'python': sys.version.split()[0], 'runs': []}
+    for users in (int(size) for size in args.sizes.split(',')):
+        result = run_size(users, args)
+        report['runs'].append(result)
+        print_table(result)
+    payload = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(payload)
+    else:
+        print(payload)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""Đo số giao dịch chuyển tiền/giây của UserStore.transfer trên từng backend lưu trữ.
+
+Mỗi giao dịch chuyển một số tiền ngẫu nhiên giữa hai người dùng ngẫu nhiên, cứ `--flush-every`
+giao dịch thì flush một lần (giống flush định kỳ của bot). Cuối cùng nạp lại dữ liệu từ đĩa
+và kiểm tra tổng số tiền không đổi.
+
+Chạy: python benchmarks/bench_transfer.py --users 10000 --transfers 20000 --flush-every 500
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import open_storage  # noqa: E402
+from user_store import UserStore, InsufficientFunds  # noqa: E402
+
+
+def make_store(mode, tmp, users):
+    json_path = os.path.join(tmp, f'{mode}.json')
+    store = UserStore(open_storage(mode, json_path, os.path.join(tmp, f'{mode}.db'), compact_bytes=1 << 62))
+    data = {
+        str(100000000000000000 + i): {'balance': 1000, 'last_daily': None, 'foxcoin': 0, 'pets': []}
+        for i in range(users)
+    }
+    if store.storage.lazy:
+        store.load()
+        for uid, record in data.items():
+            store.update(uid, record)
+    else:
+        store.replace_all(data)
+    store.flush()
+    return store, json_path, list(data)
+
+
+def total_balance(store):
+    return sum(user['balance'] for _, user in store.iter_users())
+
+
+def run(mode, args, tmp):
+    store, json_path, keys = make_store(mode, tmp, args.users)
+    expected = total_balance(store)
+    rng = random.Random(args.seed)
+    rejected = 0
+    flush_seconds = 0.0
+    start = time.perf_counter()
+    for i in range(1, args.transfers + 1):
+        sender, receiver = rng.sample(keys, 2)
+        try:
+            store.transfer(sender, receiver, rng.randint(1, 500))
+        except InsufficientFunds:
+            rejected += 1
+        if i % args.flush_every == 0:
+            flush_start = time.perf_counter()
+            store.flush()
+            flush_seconds += time.perf_counter() - flush_start
+    flush_start = time.perf_counter()
+    store.flush()
+    flush_seconds += time.perf_counter() - flush_start
+    elapsed = time.perf_counter() - start
+    store.close()
+
+    # Nạp lại từ đĩa để chắc chắn không có tiền bị tạo ra hoặc mất đi
+    reloaded = UserStore(open_storage(mode, json_path, os.path.join(tmp, f'{mode}.db')))
+    reloaded.load()
+    conserved = total_balance(reloaded) == expected
+    reloaded.close()
+    print(
+        f'{mode:<8} {args.transfers / elapsed:>12,.0f} giao dịch/s  '
+        f'(flush {flush_seconds / elapsed:>5.1%} thời gian, {rejected} bị từ chối, '
+        f'tổng tiền {"không đổi" if conserved else "SAI LỆCH"})'
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--transfers', type=int, default=20000)
+    parser.add_argument('--flush-every', type=int, default=500, help='Số giao dịch giữa hai lần flush')
+    parser.add_argument('--modes', default='json,journal,sqlite')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    print(f'{args.users:,} người dùng, {args.transfers:,} giao dịch, flush mỗi {args.flush_every} giao dịch')
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in args.modes.split(','):
+            run(mode, args, tmp)
+
+
+if __name__ == '__main__':
+    main()
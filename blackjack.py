@@ -0,0 +1,78 @@
+import random
+from dataclasses import dataclass, field
+
+SUITS = ('♠', '♥', '♦', '♣')
+RANKS = ('2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K', 'A')
+ACE = RANKS.index('A')
+
+# Lá bài là một số nguyên 0..51 = hạng * 4 + chất, bộ bài là bytearray 52 byte
+CARD_NAMES = tuple(rank + suit for rank in RANKS for suit in SUITS)
+CARD_POINTS = tuple(1 if rank == ACE else min(rank + 2, 10) for rank in range(len(RANKS)) for _ in SUITS)  # A tính 1
+IS_ACE = tuple(rank == ACE for rank in range(len(RANKS)) for _ in SUITS)
+# Điểm của bài theo (tổng điểm khi A tính 1, có A hay không): một A được tính 11 nếu không quá 21
+MAX_HARD = 31  # Tổng lớn nhất có thể có: 21 + một lá 10
+HAND_VALUES = tuple(
+    hard + 10 if has_ace and hard + 10 <= 21 else hard
+    for hard in range(MAX_HARD + 1) for has_ace in (False, True)
+)
+
+
+def new_deck(rng=random):
+    deck = bytearray(range(52))
+    rng.shuffle(deck)
+    return deck
+
+
+def hand_value(hand):
+    hard = 0
+    has_ace = False
+    for card in hand:
+        hard += CARD_POINTS[card]
+        has_ace = has_ace or IS_ACE[card]
+    return HAND_VALUES[min(hard, MAX_HARD) * 2 + has_ace]
+
+
+def format_hand(hand):
+    return ', '.join(CARD_NAMES[card] for card in hand)
+
+
+@dataclass(slots=True)
+class Table:
+    """Một ván blackjack: tiền cược, bộ bài còn lại và bài của hai bên"""
+
+    bet: float
+    deck: bytearray
+    player: list = field(default_factory=list)
+    dealer: list = field(default_factory=list)
+
+
+def deal(bet, rng=random):
+    """Chia bài mở đầu: mỗi bên hai lá"""
+    deck = new_deck(rng)
+    return Table(bet, deck, [deck.pop(), deck.pop()], [deck.pop(), deck.pop()])
+
+
+def hit(table):
+    """Người chơi rút thêm một lá, trả về lá vừa rút"""
+    card = table.deck.pop()
+    table.player.append(card)
+    return card
+
+
+def play_dealer(table):
+    """Dealer rút đến khi đạt ít nhất 17 điểm"""
+    while hand_value(table.dealer) < 17:
+        table.dealer.append(table.deck.pop())
+
+
+def payout(table):
+    """Số tiền trả lại cho người chơi (gồm cả tiền cược): gấp đôi nếu thắng, bằng tiền cược nếu hòa"""
+    player = hand_value(table.player)
+    if player > 21:
+        return 0
+    dealer = hand_value(table.dealer)
+    if dealer > 21 or player > dealer:
+        return table.bet * 2
+    if player == dealer:
+        return table.bet
+    return 0
@@ -0,0 +1,78 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from collections.abc import Mapping
+
+log = logging.getLogger(__name__)
+
+
+class Catalog(Mapping):
+    """Bảng giá (pet, vật phẩm...) đọc từ file JSON, giữ trong bộ nhớ để tra cứu O(1).
+
+    Lần tra cứu đầu tiên sau mỗi `check_interval` giây sẽ `stat` file một lần. Chỉ khi mtime
+    hoặc kích thước thay đổi thì file mới được đọc lại. Nội dung chỉ được parse lại khi hash
+    khác lần trước. Nhờ vậy có thể sửa giá lúc bot đang chạy mà không phải khởi động lại.
+    Nếu file chưa tồn tại thì dùng `default`. Nếu file mới bị lỗi JSON thì giữ bảng giá cũ.
+    """
+
+    def __init__(self, path, default=None, check_interval=2.0):
+        self.path = path
+        self.default = dict(default or {})
+        self.check_interval = check_interval
+        self.data = self.default
+        self.stamp = None  # (mtime_ns, kích thước) của lần đọc file gần nhất
+        self.digest = None
+        self.next_check = 0.0
+        self.reloads = 0
+
+    def _current(self):
+        now = time.monotonic()
+        if now >= self.next_check:
+            self.next_check = now + self.check_interval
+            self.refresh()
+        return self.data
+
+    def refresh(self):
+        """Đọc lại file nếu nó đã thay đổi, trả về True nếu bảng giá được thay mới"""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            if self.stamp is not None:
+                self.data, self.stamp, self.digest = self.default, None, None
+                return True
+            return False
+        stamp = (st.st_mtime_ns, st.st_size)
+        if stamp == self.stamp:
+            return False
+        with open(self.path, 'rb') as f:
+            raw = f.read()
+        self.stamp = stamp
+        digest = hashlib.blake2b(raw, digest_size=16).digest()
+        if digest == self.digest:
+            return False
+        try:
+            data = json.loads(raw)
+        except ValueError:
+            log.warning('Không đọc được %s, giữ bảng giá cũ', self.path)
+            return False
+        self.data = data
+        self.digest = digest
+        self.reloads += 1
+        return True
+
+    def __getitem__(self, key):
+        return self._current()[key]
+
+    def __iter__(self):
+        return iter(self._current())
+
+    def __len__(self):
+        return len(self._current())
+
+    def __contains__(self, key):
+        return key in self._current()
+
+    def get(self, key, default=None):
+        return self._current().get(key, default)
@@ -0,0 +1,481 @@
+"""Chạy bot thành nhiều process shard dùng chung một kho dữ liệu kinh tế.
+
+Process chủ giữ UserStore thật (ghi đĩa, supply, bảng xếp hạng) và phục vụ các process shard
+qua một socket TCP nội bộ, mỗi yêu cầu/trả lời là một dòng JSON. Process shard dùng
+SharedUserStore + SharedUserLocks: khi một lệnh khoá người dùng, bản ghi của họ được mượn
+về process shard (process chủ không cho process khác mượn cùng lúc), đọc/ghi tại chỗ như
+bình thường rồi được gửi trả khi nhả khoá. Vì vậy give/rob giữa hai người ở hai shard khác
+nhau vẫn là một giao dịch, và leaderboard luôn đọc từ một bảng xếp hạng duy nhất.
+Cooldown (xem cooldowns.py) cũng chỉ nằm ở process chủ, process shard hỏi qua SharedCooldowns.
+"""
+import asyncio
+import collections
+import contextlib
+import json
+import logging
+import os
+import secrets
+import socket
+import sys
+import time
+
+from locks import UserLocks
+from records import to_json
+from user_store import InsufficientFunds, SupplyExceeded, UserStore
+
+log = logging.getLogger(__name__)
+
+
+def _dumps(message):
+    return json.dumps(message, ensure_ascii=False, separators=(',', ':'), default=to_json).encode('utf-8') + b'\n'
+
+
+class EconomyServer:
+    """Phía process chủ: giữ `store` và quyền mượn từng người dùng của các process shard.
+
+    Quyền mượn hết hạn sau `lease_ttl` giây: sau đó shard khác được mượn lại người dùng đó (ví dụ
+    khi shard đang mượn bị treo, hoặc không nhận được trả lời của yêu cầu mượn), và thay đổi mà
+    shard cũ gửi sau khi đã mất quyền mượn bị từ chối.
+    """
+
+    def __init__(self, store, get_price, host='127.0.0.1', port=0, secret=None, cooldowns=None, lease_ttl=30.0):
+        self.store = store
+        self.cooldowns = cooldowns
+        self.get_price = get_price
+        self.host = host
+        self.port = port
+        self.secret = secret or secrets.token_hex(16)
+        self.lease_ttl = lease_ttl
+        self.leases = {}  # user_id -> (process shard đang mượn, thời điểm hết hạn theo time.monotonic)
+        self.requests = 0
+        self.conflicts = 0
+        self.server = None
+
+    @property
+    def address(self):
+        return f'{self.host}:{self.port}'
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._serve, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self.address
+
+    async def _serve(self, reader, writer):
+        client = writer.get_extra_info('peername')
+        try:
+            line = await reader.readline()
+            if not line or json.loads(line).get('key') != self.secret:
+                return
+            writer.write(_dumps({'ok': True, 'price': self.get_price()}))
+            while line := await reader.readline():
+                request = json.loads(line)
+                try:
+                    response = self.handle(client, request)
+                except Exception as e:
+                    log.exception('Lỗi khi xử lý yêu cầu %s của shard %s', request.get('op'), client)
+                    response = {'error': f'{type(e).__name__}: {e}'}
+                response['price'] = self.get_price()
+                writer.write(_dumps(response))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            # Shard mất kết nối: trả lại mọi người dùng nó đang mượn (thay đổi chưa gửi bị bỏ)
+            for key in [key for key, (holder, _) in self.leases.items() if holder == client]:
+                del self.leases[key]
+            writer.close()
+
+    def handle(self, client, request):
+        """Xử lý một yêu cầu. Không có `await` nên mỗi yêu cầu là nguyên tử với mọi shard"""
+        self.requests += 1
+        op = request['op']
+        if op == 'lease':
+            keys = request['ids']
+            now = time.monotonic()
+            for key in keys:
+                holder, expires = self.leases.get(key, (client, 0))
+                if holder != client and expires > now:
+                    self.conflicts += 1
+                    return {'ok': False}
+            for key in keys:
+                holder, _ = self.leases.get(key, (client, 0))
+                if holder != client:
+                    log.warning('Quyền mượn người dùng %s của shard %s đã hết hạn, chuyển cho shard %s', key, holder, client)
+                self.leases[key] = (client, now + self.lease_ttl)
+            return {'ok': True, 'users': {key: self.store.get(key) for key in keys}}
+        if op == 'commit':
+            self._commit_users(client, request['users'])
+            for key in request.get('release', ()):
+                if self.leases.get(key, (None, 0))[0] == client:
+                    del self.leases[key]
+            return {'ok': True}
+        if op == 'apply_batch':
+            legs = request['legs']
+            self._commit_users(client, request['users'], [user_id for user_id, _, _ in legs])
+            try:
+                return {'ok': True, 'users': self.store.apply_batch(legs)}
+            except InsufficientFunds as e:
+                return {'ok': False, 'funds': [e.user_id, e.field, e.available, e.required]}
+            except SupplyExceeded as e:
+                return {'ok': False, 'supply': [e.supply, e.max_supply, e.required]}
+        if op == 'get':
+            return {'user': self.store.get(request['id'])}
+        if op == 'supply':
+            self.store.load()
+            return {'supply': self.store.supply}
+        if op == 'top':
+            # `store` của process chủ có NetWorthIndex (main.py) nên không phải quét cả bảng SQLite
+            return {'top': self.store.top_networth(self.get_price(), request['limit'], request['offset'])}
+        if op == 'rank':
+            return {'rank': self.store.networth_rank(request['id'])}
+        if op == 'count':
+            return {'count': self.store.ranked_count()}
+        if op == 'cooldown':
+            return {'remaining': self.cooldowns.remaining(request['id'], request['action'])}
+        if op == 'start_cooldown':
+            self.cooldowns.start(request['id'], request['action'], request['seconds'])
+            return {'ok': True}
+        raise ValueError(f'Yêu cầu không hợp lệ: {op}')
+
+    def _commit_users(self, client, users, leased=()):
+        """Ghi các bản ghi shard gửi về, sau khi kiểm tra quyền mượn và giới hạn supply"""
+        lost = [key for key in (*users, *leased) if self.leases.get(key, (None, 0))[0] != client]
+        if lost:
+            # Quyền mượn đã hết hạn và bị shard khác lấy (hoặc chưa từng mượn): không ghi đè
+            raise ValueError(f'Shard không còn mượn người dùng {", ".join(lost)}')
+        self.store.check_supply(sum(record.get('foxcoin', 0) - self.store.get(key).get('foxcoin', 0)
+                                    for key, record in users.items()))
+        for key, record in users.items():
+            self.store.update(key, record)
+
+    def close(self):
+        if self.server is not None:
+            self.server.close()
+
+
+class EconomyClient:
+    """Phía process shard: kết nối asyncio tới EconomyServer.
+
+    Các yêu cầu được gửi nối đuôi nhau trên cùng một kết nối (không chờ trả lời của yêu cầu trước),
+    process chủ trả lời theo đúng thứ tự đó nên mỗi yêu cầu chỉ cần chờ future của nó; trong lúc
+    chờ, event loop của process shard vẫn chạy (gateway, lệnh khác). `on_price` được gọi khi giá
+    foxcoin ở process chủ đổi.
+    """
+
+    def __init__(self, address, secret, on_price=None, timeout=30):
+        self.address = address
+        self.secret = secret
+        self.on_price = on_price
+        self.timeout = timeout
+        self.price = None
+        self.calls = 0
+        self.reader = None
+        self.writer = None
+        self.pending = collections.deque()  # future của các yêu cầu đã gửi, theo thứ tự
+        self.reader_task = None
+        self._connecting = None
+
+    async def _connect(self):
+        host, port = self.address.rsplit(':', 1)
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, int(port)), self.timeout)
+        writer.get_extra_info('socket').setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        writer.write(_dumps({'key': self.secret}))
+        line = await asyncio.wait_for(reader.readline(), self.timeout)
+        if not line:
+            writer.close()
+            raise ConnectionError(f'Process chủ ({self.address}) từ chối kết nối')
+        self._update_price(json.loads(line))
+        self.reader, self.writer = reader, writer
+        self.reader_task = asyncio.create_task(self._read_responses())
+
+    def _update_price(self, response):
+        price = response.pop('price')
+        if price != self.price:
+            changed = self.price is not None
+            self.price = price
+            if changed and self.on_price is not None:
+                self.on_price(price)
+
+    async def _read_responses(self):
+        error = None
+        try:
+            while line := await self.reader.readline():
+                response = json.loads(line)
+                self._update_price(response)
+                future = self.pending.popleft()
+                if not future.done():
+                    future.set_result(response)
+            error = ConnectionError(f'Process chủ ({self.address}) đã đóng kết nối')
+        except Exception as e:
+            error = e
+        finally:
+            # Kết nối hỏng: báo lỗi cho mọi yêu cầu đang chờ, lần gọi sau sẽ kết nối lại
+            self.reader = self.writer = self.reader_task = None
+            while self.pending:
+                future = self.pending.popleft()
+                if not future.done():
+                    future.set_exception(error or ConnectionError('Mất kết nối tới process chủ'))
+
+    async def call(self, op, **args):
+        if self.writer is None:
+            if self._connecting is None:
+                self._connecting = asyncio.ensure_future(self._connect())
+            try:
+                await asyncio.shield(self._connecting)
+            finally:
+                if self._connecting is not None and self._connecting.done():
+                    self._connecting = None
+        self.calls += 1
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append(future)
+        self.writer.write(_dumps({'op': op, **args}))
+        response = await asyncio.wait_for(future, self.timeout)
+        if 'error' in response:
+            raise RuntimeError(f'Process chủ trả lỗi cho {op}: {response["error"]}')
+        return response
+
+    def close(self):
+        if self.writer is not None:
+            self.reader_task.cancel()
+            try:
+                self.writer.close()
+            except RuntimeError:
+                # Event loop đã đóng (sau bot.run): socket được đóng cùng process
+                pass
+            self.reader = self.writer = self.reader_task = None
+
+
+def _owner_only(name):
+    def method(self, *args, **kwargs):
+        raise NotImplementedError(f'{name}: process shard phải dùng {name}_async (hỏi process chủ)')
+    return method
+
+
+class SharedUserStore(UserStore):
+    """UserStore của process shard, dữ liệu thật nằm ở process chủ.
+
+    `data` chỉ chứa những người dùng đang được mượn (đang bị khoá bởi SharedUserLocks), đọc/ghi
+    họ bằng `get`/`update` như bình thường. Người chưa mượn và các số liệu chung (supply, bảng xếp
+    hạng) phải đọc qua các hàm `*_async`, hỏi process chủ mà không chặn event loop.
+    """
+
+    def __init__(self, client, lease_backoff=(0.001, 0.05), lease_timeout=10.0, commit_retries=2):
+        # Không có storage/index: dữ liệu thật, supply và bảng xếp hạng nằm ở process chủ
+        super().__init__(storage=None)
+        self.client = client
+        self.lease_backoff = lease_backoff
+        self.lease_timeout = lease_timeout
+        self.commit_retries = commit_retries
+        self.data = {}  # chỉ người dùng đang mượn, `dirty` là những người trong đó đã bị thay đổi
+
+    def load(self):
+        return self.data
+
+    def get(self, user_id):
+        key = str(user_id)
+        record = self.data.get(key)
+        if record is None:
+            raise RuntimeError(f'Người dùng {key} chưa được mượn: giữ khoá của họ hoặc dùng get_async')
+        return record
+
+    async def get_async(self, user_id):
+        key = str(user_id)
+        record = self.data.get(key)
+        if record is None:
+            record = (await self.client.call('get', id=key))['user']
+        return record
+
+    def update(self, user_id, user_data):
+        key = str(user_id)
+        if key not in self.data:
+            raise RuntimeError(f'Người dùng {key} chưa được mượn: chỉ sửa dữ liệu trong lúc giữ khoá')
+        self.data[key] = user_data
+        self.dirty.add(key)
+
+    def _touch(self, key, user_data):
+        self.dirty.add(key)
+
+    def check_supply(self, added):
+        # Supply chỉ có ở process chủ: giao dịch làm tăng foxcoin phải chạy ở đó
+        if added > 0:
+            raise NotImplementedError('Process shard phải dùng apply_batch_async cho giao dịch làm tăng foxcoin')
+
+    async def apply_batch_async(self, legs):
+        """Chạy apply_batch ở process chủ, nơi số dư và giới hạn supply được kiểm tra với dữ liệu thật"""
+        keys = {str(user_id) for user_id, _, _ in legs}
+        for key in keys:
+            self.get(key)  # phải đang mượn
+        changed = {key: self.data[key] for key in keys if key in self.dirty}
+        response = await self.client.call('apply_batch', legs=[[str(user_id), field, delta] for user_id, field, delta in legs],
+                                          users=changed)
+        if not response['ok']:
+            if 'funds' in response:
+                raise InsufficientFunds(*response['funds'])
+            raise SupplyExceeded(*response['supply'])
+        for key, record in response['users'].items():
+            # Sửa tại chỗ để bản ghi lệnh đang giữ thấy kết quả, như khi chạy một process
+            self.data[key].update(record)
+            self.dirty.discard(key)
+        return {key: self.data[key] for key in response['users']}
+
+    async def lease(self, user_ids):
+        """Mượn bản ghi của `user_ids` từ process chủ, chờ nếu shard khác đang mượn.
+
+        Raise TimeoutError nếu chưa mượn được sau `lease_timeout` giây.
+        """
+        keys = sorted({str(user_id) for user_id in user_ids})
+        delay, max_delay = self.lease_backoff
+        deadline = time.monotonic() + self.lease_timeout
+        while True:
+            try:
+                response = await self.client.call('lease', ids=keys)
+            except TimeoutError:
+                # Process chủ có thể đã cho mượn mà trả lời chưa tới: trả lại ngay để shard khác không phải chờ
+                with contextlib.suppress(Exception):
+                    await self.client.call('commit', users={}, release=keys)
+                raise
+            if response['ok']:
+                break
+            if time.monotonic() + delay > deadline:
+                raise TimeoutError(f'Không mượn được người dùng {", ".join(keys)} sau {self.lease_timeout} giây')
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, max_delay)
+        self.data.update(response['users'])
+
+    async def release(self, user_ids):
+        """Gửi trả bản ghi (kèm thay đổi) cho process chủ.
+
+        Bản ghi chỉ bị bỏ khỏi `data` sau khi process chủ xác nhận; quá thời gian chờ thì gửi lại
+        (tối đa `commit_retries` lần, commit ghi đè nên gửi lại không sao). Nếu vẫn không được,
+        thay đổi bị mất và lỗi được raise cho lệnh.
+        """
+        keys = {str(user_id) for user_id in user_ids}
+        changed = {key: self.data[key] for key in keys if key in self.dirty}
+        try:
+            for attempt in range(self.commit_retries + 1):
+                try:
+                    await self.client.call('commit', users=changed, release=sorted(keys))
+                    break
+                except TimeoutError:
+                    if attempt == self.commit_retries:
+                        raise
+                    log.warning('Process chủ chưa xác nhận commit của %s, gửi lại', ', '.join(sorted(keys)))
+        except Exception:
+            if changed:
+                log.error('Thay đổi của người dùng %s không được process chủ nhận', ', '.join(sorted(changed)))
+            raise
+        finally:
+            # Thành công hay không thì bản sao này cũng không còn được mượn nữa
+            for key in keys:
+                self.data.pop(key, None)
+            self.dirty -= keys
+
+    def replace_all(self, data):
+        raise NotImplementedError('Không thể thay toàn bộ dữ liệu từ process shard')
+
+    def iter_users(self):
+        raise NotImplementedError('Không thể duyệt toàn bộ người dùng từ process shard')
+
+    total_foxcoin = _owner_only('supply')
+    top_networth = _owner_only('top_networth')
+    networth_rank = _owner_only('networth_rank')
+    ranked_count = _owner_only('ranked_count')
+
+    async def supply_async(self):
+        return (await self.client.call('supply'))['supply']
+
+    async def top_networth_async(self, price, limit, offset=0):
+        # Bỏ qua `price`: giá ở process shard có thể cũ, process chủ xếp hạng theo giá của chính nó
+        # (nếu không chỉ mục networth sẽ bị rebase qua lại giữa giá cũ và giá mới)
+        return [tuple(item) for item in (await self.client.call('top', limit=limit, offset=offset))['top']]
+
+    async def networth_rank_async(self, user_id):
+        return (await self.client.call('rank', id=str(user_id)))['rank']
+
+    async def ranked_count_async(self):
+        return (await self.client.call('count'))['count']
+
+    def flush(self):
+        return 0
+
+    async def flush_async(self):
+        return 0
+
+    def close(self):
+        self.client.close()
+
+
+class SharedCooldowns:
+    """Cooldowns của process shard: hỏi/đặt cooldown ở process chủ để mọi shard thấy cùng một cooldown"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def load(self):
+        return None
+
+    async def remaining_async(self, user_id, action):
+        return (await self.client.call('cooldown', id=str(user_id), action=action))['remaining']
+
+    async def start_async(self, user_id, action, seconds):
+        await self.client.call('start_cooldown', id=str(user_id), action=action, seconds=seconds)
+
+    def purge(self):
+        return 0
+
+    async def flush_async(self):
+        return 0
+
+    def close(self):
+        pass
+
+
+class SharedUserLocks(UserLocks):
+    """Khoá người dùng giữa các process shard: khoá trong process như UserLocks, rồi mượn bản ghi"""
+
+    def __init__(self, store, stripes=1024):
+        super().__init__(stripes)
+        self.store = store
+
+    @contextlib.asynccontextmanager
+    async def hold(self, *user_ids):
+        async with super().hold(*user_ids):
+            await self.store.lease(user_ids)
+            try:
+                yield
+            finally:
+                await self.store.release(user_ids)
+
+
+def shard_plan(workers, shard_count):
+    """Chia shard cho các process: process i chạy shard i, i + workers, ..."""
+    return [list(range(worker, shard_count, workers)) for worker in range(workers)]
+
+
+async def run_workers(script, workers, shard_count, address, secret, restart_delay=5.0):
+    """Khởi động `workers` process shard chạy `script`, khởi động lại process nào bị tắt bất thường"""
+
+    async def supervise(worker, shard_ids):
+        env = dict(
+            os.environ,
+            BOT_ECONOMY_ADDRESS=address,
+            BOT_ECONOMY_SECRET=secret,
+            BOT_SHARD_COUNT=str(shard_count),
+            BOT_SHARD_IDS=','.join(map(str, shard_ids)),
+            BOT_WORKER_ID=str(worker),
+        )
+        while True:
+            process = await asyncio.create_subprocess_exec(sys.executable, script, env=env)
+            try:
+                code = await process.wait()
+            except asyncio.CancelledError:
+                process.terminate()
+                await process.wait()
+                raise
+            if code == 0:
+                return
+            log.warning('Process shard %s (shard %s) thoát với mã %s, khởi động lại sau %ss',
+                        worker, shard_ids, code, restart_delay)
+            await asyncio.sleep(restart_delay)
+
+    await asyncio.gather(*(supervise(worker, shard_ids) for worker, shard_ids in enumerate(shard_plan(workers, shard_count))))
@@ -0,0 +1,119 @@
+import asyncio
+import functools
+import heapq
+import json
+import os
+import time
+
+from journal import UserJournal
+
+
+class Cooldowns:
+    """Cooldown của mọi lệnh theo (người dùng, hành động), lưu xuống đĩa nên không mất khi khởi động lại.
+
+    `expires` là dict "user_id:action" -> thời điểm hết hạn (unix), nên kiểm tra và đặt cooldown
+    đều là O(1). Mỗi lần đặt cooldown cũng đẩy (thời điểm hết hạn, khoá) vào một heap; `purge`
+    (gọi định kỳ) lấy ra các mục đã hết hạn ở đầu heap và xoá chúng khỏi `expires`, nên bộ nhớ
+    chỉ tỉ lệ với số cooldown còn hiệu lực.
+
+    Lưu trữ dùng UserJournal (snapshot + journal) như JournalStorage: mỗi lần `flush` chỉ ghi nối
+    các cooldown vừa đặt. Cooldown bị `purge` không cần ghi lại vì khi nạp, mục đã hết hạn bị bỏ qua.
+    """
+
+    def __init__(self, path, compact_bytes=1024 * 1024):
+        self.journal = UserJournal(path, compact_bytes=compact_bytes)
+        self.expires = None
+        self.heap = []
+        self.dirty = set()
+        self.created = False  # True nếu chưa có file nào khi nạp (lần chạy đầu tiên)
+        self._flushing = False
+
+    def load(self):
+        """Nạp cooldown còn hiệu lực vào bộ nhớ (chỉ lần đầu)"""
+        if self.expires is None:
+            self.created = not (os.path.exists(self.journal.snapshot_path) or os.path.exists(self.journal.journal_path))
+            now = time.time()
+            self.expires = {key: expires for key, expires in self.journal.load().items() if expires > now}
+            self.heap = [(expires, key) for key, expires in self.expires.items()]
+            heapq.heapify(self.heap)
+        return self.expires
+
+    def remaining(self, user_id, action, now=None):
+        """Số giây còn lại trước khi `user_id` được làm `action` tiếp (0 nếu đã được)"""
+        expires = self.load().get(f'{user_id}:{action}')
+        if expires is None:
+            return 0
+        return max(expires - (time.time() if now is None else now), 0)
+
+    def start(self, user_id, action, seconds, now=None):
+        """Bắt đầu cooldown `seconds` giây cho (`user_id`, `action`) kể từ `now`"""
+        key = f'{user_id}:{action}'
+        expires = (time.time() if now is None else now) + seconds
+        self.load()[key] = expires
+        heapq.heappush(self.heap, (expires, key))
+        self.dirty.add(key)
+
+    # Giao diện async dùng chung với SharedCooldowns (cluster.py), nơi cooldown nằm ở process chủ
+    async def remaining_async(self, user_id, action):
+        return self.remaining(user_id, action)
+
+    async def start_async(self, user_id, action, seconds):
+        self.start(user_id, action, seconds)
+
+    def purge(self, now=None):
+        """Xoá các cooldown đã hết hạn, trả về số mục đã xoá"""
+        self.load()
+        now = time.time() if now is None else now
+        heap = self.heap
+        removed = 0
+        while heap and heap[0][0] <= now:
+            expires, key = heapq.heappop(heap)
+            # Bỏ qua mục cũ trong heap nếu cooldown đã được đặt lại
+            if self.expires.get(key) == expires:
+                del self.expires[key]
+                removed += 1
+        return removed
+
+    def __len__(self):
+        return len(self.load())
+
+    def _snapshot(self):
+        return json.dumps(self.expires, separators=(',', ':'))
+
+    def _take_batch(self):
+        batch = self.dirty
+        self.dirty = set()
+        lines = self.journal.encode(batch, self.expires)
+        snapshot = self._snapshot() if self.journal.needs_compaction(len(lines)) else None
+        return batch, functools.partial(self.journal.commit, lines, snapshot)
+
+    def save(self):
+        """Ghi toàn bộ cooldown thành snapshot mới (dùng sau khi nhập dữ liệu cũ)"""
+        self.load()
+        self.dirty.clear()
+        self.journal.compact(self._snapshot())
+
+    def flush(self):
+        if self.expires is None or not self.dirty:
+            return 0
+        batch, write = self._take_batch()
+        write()
+        return len(batch)
+
+    async def flush_async(self):
+        """Ghi các cooldown mới trong thread riêng để không chặn event loop"""
+        if self.expires is None or not self.dirty or self._flushing:
+            return 0
+        self._flushing = True
+        batch, write = self._take_batch()
+        try:
+            await asyncio.to_thread(write)
+        except Exception:
+            self.dirty.update(batch)
+            raise
+        finally:
+            self._flushing = False
+        return len(batch)
+
+    def close(self):
+        self.flush()
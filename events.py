@@ -0,0 +1,142 @@
+import gzip
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass, field, asdict
+from datetime import datetime, timezone
+
+from batch_writer import BatchWriter
+
+EVENT_DIR = os.path.join("logs", "events")
+# Mỗi process shard ghi file riêng (xem cluster.py), _event_files vẫn nhận ra ngày từ tên file
+FILE_SUFFIX = f".w{os.environ['BOT_WORKER_ID']}" if os.getenv("BOT_WORKER_ID") else ""
+
+
+@dataclass(slots=True)
+class Event:
+    """Một sự kiện của server, được ghi thành một dòng JSON"""
+
+    kind: str  # member_join, member_remove, message_delete, message_edit, command, member_ban, ...
+    guild_id: int | None = None
+    user_id: int | None = None
+    channel_id: int | None = None
+    ts: float = field(default_factory=time.time)
+    payload: dict = field(default_factory=dict)
+
+    def to_json(self):
+        return json.dumps(asdict(self), ensure_ascii=False, separators=(",", ":"))
+
+
+def event_path(ts, directory=EVENT_DIR):
+    """Mỗi ngày (UTC) một file JSONL"""
+    day = datetime.fromtimestamp(ts, timezone.utc).strftime("%Y-%m-%d")
+    return os.path.join(directory, f"{day}{FILE_SUFFIX}.jsonl")
+
+
+class EventWriter(BatchWriter):
+    """Thread nền ghi sự kiện theo lô vào file JSONL (xem BatchWriter)"""
+
+    def __init__(self, directory=EVENT_DIR, max_queue=50000, batch_size=512, flush_interval=1.0):
+        super().__init__("event-writer", max_queue, batch_size, flush_interval)
+        self.directory = directory
+        self.file = None
+        self.file_path = None
+
+    def _write(self, batch):
+        # Serialize trên thread này, event loop chỉ tạo object Event
+        lines_by_path = {}
+        for event in batch:
+            lines_by_path.setdefault(event_path(event.ts, self.directory), []).append(event.to_json())
+        for path, lines in lines_by_path.items():
+            if path != self.file_path:
+                if self.file is not None:
+                    self.file.close()
+                os.makedirs(self.directory, exist_ok=True)
+                self.file = open(path, "a", encoding="utf-8")
+                self.file_path = path
+            self.file.write("\n".join(lines) + "\n")
+            self.file.flush()
+
+    def _close(self):
+        if self.file is not None:
+            self.file.close()
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def emit(kind, guild=None, user=None, channel=None, **payload):
+    """Ghi một sự kiện, `guild`/`user`/`channel` là object discord hoặc ID"""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = EventWriter()
+                _writer.start()
+    _writer.submit(Event(
+        kind=kind,
+        guild_id=getattr(guild, "id", guild),
+        user_id=getattr(user, "id", user),
+        channel_id=getattr(channel, "id", channel),
+        payload=payload,
+    ))
+
+
+def stats():
+    if _writer is None:
+        return {"queue_depth": 0, "written": 0, "dropped": 0, "failed": 0, "batches": 0}
+    return _writer.stats()
+
+
+def shutdown():
+    """Ghi hết sự kiện còn trong hàng đợi (gọi khi tắt bot)"""
+    global _writer
+    with _writer_lock:
+        if _writer is not None:
+            _writer.stop()
+            _writer = None
+
+
+def _event_files(directory, since, until):
+    if not os.path.isdir(directory):
+        return []
+    first_day = datetime.fromtimestamp(since, timezone.utc).strftime("%Y-%m-%d") if since else ""
+    last_day = datetime.fromtimestamp(until, timezone.utc).strftime("%Y-%m-%d") if until else "9999"
+    files = []
+    for name in sorted(os.listdir(directory)):
+        day = name.split(".", 1)[0]
+        if (name.endswith(".jsonl") or name.endswith(".jsonl.gz")) and first_day <= day <= last_day:
+            files.append(os.path.join(directory, name))
+    return files
+
+
+def iter_events(directory=EVENT_DIR, kind=None, guild_id=None, user_id=None, since=None, until=None):
+    """Đọc tuần tự các sự kiện khớp điều kiện, từng dòng một nên bộ nhớ không phụ thuộc số sự kiện.
+
+    File theo ngày nằm ngoài [since, until] bị bỏ qua. Dòng không chứa chuỗi `"kind":"<kind>"`
+    bị bỏ qua trước khi parse JSON.
+    """
+    needle = f'"kind":{json.dumps(kind, ensure_ascii=False)}' if kind else None
+    for path in _event_files(directory, since, until):
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if needle and needle not in line:
+                    continue
+                try:
+                    data = json.loads(line)
+                except ValueError:
+                    continue
+                if kind and data["kind"] != kind:
+                    continue
+                if guild_id is not None and data["guild_id"] != guild_id:
+                    continue
+                if user_id is not None and data["user_id"] != user_id:
+                    continue
+                if since is not None and data["ts"] < since:
+                    continue
+                if until is not None and data["ts"] > until:
+                    continue
+                yield Event(**data)
@@ -0,0 +1,65 @@
+import random
+
+# Luật các trò chơi và nguồn thu nhập, dùng chung cho lệnh của bot và simulator.py.
+# Các hàm ở đây không đụng tới Discord hay dữ liệu người dùng: nhận `rng`, trả về kết quả
+# và hệ số tiền thắng/thua trên mỗi đơn vị tiền cược (+1 thắng, -1 thua, 0 hoà).
+
+DAILY_AMOUNT = 500
+DAILY_COOLDOWN = 24 * 3600
+
+COIN_SIDES = ('heads', 'tails')
+
+SPIN_SLOTS = ('🍕', '🍔', '🍟', '🌭', '🍿', '🍖', '🍗', '🥩', '🍠', '🍘', '🍤', '🍉')
+SPIN_REELS = 3
+
+TAIXIU_XIU = range(4, 11)  # Tổng 3 xúc xắc 4-10: xỉu
+TAIXIU_TAI = range(11, 18)  # Tổng 11-17: tài, còn lại (3 và 18) nhà cái ăn nhưng người chơi không mất tiền
+
+WORK_COOLDOWN = 1800
+WORK_EARNINGS = (100, 500)
+WORK_JOBS = ("lập trình", "thiết kế", "nhiếp ảnh", "viết content", "dịch thuật")
+
+ROB_COOLDOWN = 3600
+ROB_SUCCESS_RATE = 0.4
+ROB_AMOUNT = (100, 500)
+ROB_MIN_VICTIM_BALANCE = 100
+ROB_FINE_RATE = 0.05
+ROB_FINE_MAX = 5000
+
+
+def coinflip(choice, rng=random):
+    result = rng.choice(COIN_SIDES)
+    return result, 1 if result == choice else -1
+
+
+def spin(rng=random):
+    result = rng.choices(SPIN_SLOTS, k=SPIN_REELS)
+    return result, 1 if len(set(result)) == 1 else -1
+
+
+def taixiu_outcome(total):
+    if total in TAIXIU_XIU:
+        return 'xiu'
+    if total in TAIXIU_TAI:
+        return 'tai'
+    return None
+
+
+def taixiu(choice, rng=random):
+    """Trả về (3 xúc xắc, kết quả 'tai'/'xiu'/None, hệ số)"""
+    dice = [rng.randint(1, 6) for _ in range(3)]
+    outcome = taixiu_outcome(sum(dice))
+    if outcome is None:
+        return dice, outcome, 0
+    return dice, outcome, 1 if outcome == choice else -1
+
+
+def work_earnings(rng=random):
+    return rng.randint(*WORK_EARNINGS)
+
+
+def rob(robber_balance, victim_balance, rng=random):
+    """Trả về (thành công, số tiền): tiền cướp được từ nạn nhân, hoặc tiền phạt nếu bị bắt"""
+    if rng.random() < ROB_SUCCESS_RATE:
+        return True, min(rng.randint(*ROB_AMOUNT), victim_balance)
+    return False, min(int(robber_balance * ROB_FINE_RATE), ROB_FINE_MAX)
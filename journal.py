@@ -0,0 +1,127 @@
+import json
+import os
+
+from records import to_json
+
+
+def _fsync_dir(path):
+    # Đảm bảo thao tác đổi tên file đã được ghi xuống đĩa (không hỗ trợ trên Windows)
+    try:
+        fd = os.open(path or '.', os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def atomic_write(path, payload):
+    """Ghi file qua file tạm + fsync + os.replace, crash giữa chừng không làm hỏng file cũ"""
+    tmp_path = path + '.tmp'
+    if isinstance(payload, bytes):
+        f = open(tmp_path, 'wb')
+    else:
+        f = open(tmp_path, 'w', encoding='utf-8')
+    with f:
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    _fsync_dir(os.path.dirname(path))
+
+
+class UserJournal:
+    """Lưu dữ liệu người dùng dưới dạng snapshot + journal chỉ ghi nối (append-only).
+
+    Mỗi thay đổi được ghi thành một dòng JSON gọn `{"u": id, "d": record}` vào cuối journal,
+    mỗi lần ghi bắt đầu bằng dòng `{"b": số bản ghi}`. Khi phát lại, một lần ghi chỉ được áp dụng
+    khi đọc đủ số bản ghi đó, nên một giao dịch nhiều người dùng không bao giờ bị áp dụng nửa chừng.
+    Khi journal vượt quá `compact_bytes`, toàn bộ dữ liệu được ghi thành snapshot mới
+    (thay thế nguyên tử) rồi journal được làm rỗng. Khi khởi động: đọc snapshot rồi phát lại journal.
+    """
+
+    def __init__(self, snapshot_path, journal_path=None, compact_bytes=4 * 1024 * 1024):
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path or snapshot_path + '.journal'
+        self.compact_bytes = compact_bytes
+        self.journal_bytes = 0
+
+    def exists(self):
+        """Có dữ liệu cũ không: snapshot, hoặc chỉ có journal nếu chưa nén lần nào"""
+        return os.path.exists(self.snapshot_path) or os.path.exists(self.journal_path)
+
+    def load(self):
+        data = {}
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        if os.path.exists(self.journal_path):
+            pending = {}
+            expected = 0  # Số bản ghi còn thiếu của lần ghi đang đọc
+            offset = valid_bytes = 0  # valid_bytes: vị trí kết thúc của lần ghi đầy đủ cuối cùng
+            with open(self.journal_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    offset += len(line.encode('utf-8'))
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Dòng cuối bị ghi dở do crash, bỏ qua
+                        break
+                    if 'b' in entry:
+                        pending = {}
+                        expected = entry['b']
+                    elif expected:
+                        pending[entry['u']] = entry['d']
+                        expected -= 1
+                        if not expected:
+                            data.update(pending)
+                            valid_bytes = offset
+                    else:
+                        # Journal cũ, chưa có dòng bắt đầu lần ghi
+                        data[entry['u']] = entry['d']
+                        valid_bytes = offset
+            if valid_bytes < os.path.getsize(self.journal_path):
+                # Cắt phần ghi dở để các lần ghi sau không bị nối vào sau dòng hỏng
+                with open(self.journal_path, 'r+b') as f:
+                    f.truncate(valid_bytes)
+                    os.fsync(f.fileno())
+            self.journal_bytes = valid_bytes
+        return data
+
+    def encode(self, user_ids, data):
+        """Chuyển các bản ghi thay đổi thành các dòng journal (gọi trên event loop)"""
+        lines = [
+            json.dumps({'u': uid, 'd': data[uid]}, ensure_ascii=False, separators=(',', ':'), default=to_json) + '\n'
+            for uid in user_ids if uid in data
+        ]
+        if not lines:
+            return ''
+        return f'{{"b":{len(lines)}}}\n' + ''.join(lines)
+
+    def needs_compaction(self, pending_bytes=0):
+        return self.journal_bytes + pending_bytes >= self.compact_bytes
+
+    def append(self, lines):
+        if not lines:
+            return
+        with open(self.journal_path, 'a', encoding='utf-8') as f:
+            f.write(lines)
+            f.flush()
+            os.fsync(f.fileno())
+        self.journal_bytes += len(lines.encode('utf-8'))
+
+    def compact(self, snapshot):
+        """Thay snapshot bằng bản mới rồi xoá journal. Crash ở giữa vẫn an toàn vì phát lại journal là idempotent"""
+        atomic_write(self.snapshot_path, snapshot)
+        with open(self.journal_path, 'w', encoding='utf-8') as f:
+            f.flush()
+            os.fsync(f.fileno())
+        self.journal_bytes = 0
+
+    def commit(self, lines, snapshot=None):
+        self.append(lines)
+        if snapshot is not None:
+            self.compact(snapshot)
@@ -0,0 +1,52 @@
+import asyncio
+import contextlib
+import contextvars
+import functools
+
+# Số lần `hold` đang lồng nhau trong task hiện tại (xem `holding`)
+_held = contextvars.ContextVar('user_locks_held', default=0)
+
+
+def holding():
+    """True nếu task hiện tại đang giữ khoá người dùng: khi đó không nên chờ I/O chậm (ví dụ gửi tin nhắn)"""
+    return _held.get() > 0
+
+
+class UserLocks:
+    """Khoá theo người dùng dạng phân dải (lock striping) cho các lệnh kinh tế.
+
+    Mỗi người dùng thuộc một trong `stripes` khoá asyncio. Lệnh của những người khác
+    nhau chạy song song, lệnh của cùng một người chạy lần lượt. Khi cần khoá nhiều
+    người, các khoá luôn được lấy theo thứ tự tăng dần nên không thể bị deadlock.
+    Khoá không re-entrant: không lấy khoá lồng nhau cho cùng một người.
+    """
+
+    def __init__(self, stripes=1024):
+        self.locks = [asyncio.Lock() for _ in range(stripes)]
+
+    def _stripes(self, user_ids):
+        return sorted({int(user_id) % len(self.locks) for user_id in user_ids})
+
+    @contextlib.asynccontextmanager
+    async def hold(self, *user_ids):
+        acquired = []
+        try:
+            for stripe in self._stripes(user_ids):
+                await self.locks[stripe].acquire()
+                acquired.append(stripe)
+            token = _held.set(_held.get() + 1)
+            try:
+                yield
+            finally:
+                _held.reset(token)
+        finally:
+            for stripe in reversed(acquired):
+                self.locks[stripe].release()
+
+    def locked(self, func):
+        """Decorator cho lệnh chỉ đụng tới dữ liệu của người gọi lệnh"""
+        @functools.wraps(func)
+        async def wrapper(ctx, *args, **kwargs):
+            async with self.hold(ctx.author.id):
+                return await func(ctx, *args, **kwargs)
+        return wrapper
@@ -0,0 +1,175 @@
+import gzip
+import json
+import os
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from journal import atomic_write
+
+RECORD_START = re.compile(r'^\[(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})\] (?:\[([A-Z ]+)\])?')
+USER_ID = re.compile(r'\b\d{15,20}\b')
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+# Giữ trong lúc nén file log đang ghi, để lệnh tìm kiếm không đọc file đang bị chuyển đi
+segment_lock = threading.Lock()
+
+
+def iter_records(lines):
+    """Gộp các dòng log thành từng bản ghi (timestamp, loại sự kiện, nội dung đầy đủ).
+
+    Một bản ghi có thể nhiều dòng (ví dụ [EDIT]), dòng bắt đầu bằng "[thời gian]" mở bản ghi mới.
+    """
+    current = None
+    for line in lines:
+        line = line.rstrip('\n')
+        match = RECORD_START.match(line)
+        if match:
+            if current is not None:
+                yield current[0], current[1], '\n'.join(current[2])
+            current = (match.group(1), match.group(2) or '', [line])
+        elif current is not None:
+            current[2].append(line)
+    if current is not None:
+        yield current[0], current[1], '\n'.join(current[2])
+
+
+def build_index(records):
+    """Index của một đoạn log: khoảng thời gian, số bản ghi theo loại sự kiện và các user ID xuất hiện"""
+    events = Counter()
+    users = set()
+    start = end = None
+    count = 0
+    for timestamp, event, text in records:
+        if start is None:
+            start = timestamp
+        end = timestamp
+        events[event] += 1
+        users.update(USER_ID.findall(text))
+        count += 1
+    return {'start': start, 'end': end, 'records': count, 'events': dict(events), 'users': sorted(users)}
+
+
+def archive_dir(log_dir, guild_id):
+    return os.path.join(log_dir, 'archive', str(guild_id))
+
+
+def first_timestamp(path):
+    """Thời điểm (unix) của bản ghi đầu tiên trong file log, None nếu file rỗng"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            match = RECORD_START.match(f.readline())
+    except FileNotFoundError:
+        return None
+    if not match:
+        return None
+    return datetime.strptime(match.group(1), TIME_FORMAT).timestamp()
+
+
+def _compact(timestamp):
+    # '2025-08-01 12:30:00' -> '20250801123000'
+    return re.sub(r'\D', '', timestamp)
+
+
+def archive_segment(log_dir, guild_id, path):
+    """Nén file log đang ghi thành `<bắt đầu>_<kết thúc>.log.gz` kèm file index `.idx.json`, rồi xoá file gốc"""
+    with segment_lock:
+        return _archive_segment(log_dir, guild_id, path)
+
+
+def _archive_segment(log_dir, guild_id, path):
+    with open(path, 'r', encoding='utf-8') as f:
+        content = f.read()
+    index = build_index(iter_records(content.splitlines()))
+    if index['start'] is None:
+        os.remove(path)
+        return None
+    directory = archive_dir(log_dir, guild_id)
+    os.makedirs(directory, exist_ok=True)
+    name = _compact(index['start']) + '_' + _compact(index['end'])
+    base = os.path.join(directory, name)
+    suffix = 0
+    while os.path.exists(base + '.log.gz'):
+        suffix += 1
+        base = os.path.join(directory, f'{name}-{suffix}')
+    with gzip.open(base + '.log.gz', 'wt', encoding='utf-8') as f:
+        f.write(content)
+    index['file'] = os.path.basename(base) + '.log.gz'
+    # Ghi index sau cùng: lệnh tìm kiếm chỉ thấy đoạn log khi đã nén xong
+    atomic_write(base + '.idx.json', json.dumps(index, ensure_ascii=False))
+    os.remove(path)
+    return base + '.log.gz'
+
+
+def _matches(record, event, user_id, since, until, text):
+    timestamp, record_event, body = record
+    if event and record_event != event:
+        return False
+    if since and timestamp < since:
+        return False
+    if until and timestamp > until:
+        return False
+    if user_id and user_id not in body:
+        return False
+    if text and text.lower() not in body.lower():
+        return False
+    return True
+
+
+def _index_may_match(index, event, user_id, since, until):
+    if event and event not in index['events']:
+        return False
+    if since and index['end'] < since:
+        return False
+    if until and index['start'] > until:
+        return False
+    if user_id and user_id not in index['users']:
+        return False
+    return True
+
+
+def search(log_dir, guild_id, event=None, user_id=None, since=None, until=None, text=None, limit=10):
+    """Tìm các bản ghi log mới nhất khớp điều kiện.
+
+    `since`/`until` là chuỗi 'YYYY-MM-DD HH:MM:SS'. Các đoạn log đã nén được lọc bằng index,
+    chỉ giải nén những đoạn có thể chứa kết quả. Trả về (danh sách bản ghi, số liệu tìm kiếm).
+    """
+    started = time.perf_counter()
+    results = []
+    stats = {'segments': 0, 'scanned': 0}
+
+    def scan(lines):
+        remaining = limit - len(results)
+        if remaining <= 0:
+            return
+        matched = [record[2] for record in iter_records(lines) if _matches(record, event, user_id, since, until, text)]
+        # Duyệt từ mới đến cũ, nên thêm kết quả mới nhất vào trước
+        results.extend(reversed(matched[-remaining:]))
+
+    active = os.path.join(log_dir, f'{guild_id}.log')
+    directory = archive_dir(log_dir, guild_id)
+    with segment_lock:
+        try:
+            with open(active, 'r', encoding='utf-8') as f:
+                scan(f)
+        except FileNotFoundError:
+            pass
+        # Lấy danh sách đoạn log cùng lúc với đọc file đang ghi để không đọc trùng đoạn vừa được nén
+        index_files = sorted(
+            (name for name in os.listdir(directory) if name.endswith('.idx.json')) if os.path.isdir(directory) else [],
+            reverse=True,
+        )
+    stats['segments'] = len(index_files)
+    for name in index_files:
+        if len(results) >= limit:
+            break
+        with open(os.path.join(directory, name), 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        if not _index_may_match(index, event, user_id, since, until):
+            continue
+        stats['scanned'] += 1
+        with gzip.open(os.path.join(directory, index['file']), 'rt', encoding='utf-8') as f:
+            scan(f)
+    stats['ms'] = (time.perf_counter() - started) * 1000
+    return results[:limit], stats
@@ -0,0 +1,141 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+
+from metrics import Histogram
+
+log = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class StallSite:
+    __slots__ = ('count', 'total', 'max', 'leaves', 'stack')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.leaves = {}  # frame sâu nhất (thường là hàm thư viện đang chặn) -> số lần
+        self.stack = None  # stack của lần nghẽn lâu nhất
+
+
+class StallWatchdog(threading.Thread):
+    """Thread canh event loop: cứ `interval` giây gửi một nhịp vào loop và chờ loop chạy nó.
+
+    Độ trễ của mỗi nhịp là độ trễ của loop. Nếu loop không trả lời sau `threshold` giây,
+    thread chụp stack của thread đang chạy loop (chính là đoạn code đang chặn), và chụp lại
+    sau mỗi `threshold` giây cho tới khi loop chạy lại. Thời gian nghẽn được chia đều cho các
+    mẫu và cộng vào vị trí gọi của từng mẫu: frame sâu nhất nằm trong code của bot.
+    """
+
+    def __init__(self, threshold=0.5, interval=0.5, depth=16, root=BASE_DIR):
+        super().__init__(name='loop-watchdog', daemon=True)
+        self.threshold = threshold
+        self.interval = interval
+        self.depth = depth
+        self.root = root
+        self.loop = None
+        self.loop_thread = None
+        self.lag = Histogram()
+        self.sites = {}  # (file, dòng, hàm) -> StallSite
+        self.stalls = 0
+        self.blocked = 0.0
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def watch(self):
+        """Gọi từ trong event loop cần canh; chỉ khởi động thread một lần"""
+        self.loop = asyncio.get_running_loop()
+        self.loop_thread = threading.get_ident()
+        if not self.is_alive():
+            self.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            beat = threading.Event()
+            sent = time.perf_counter()
+            try:
+                self.loop.call_soon_threadsafe(beat.set)
+            except RuntimeError:
+                return  # loop đã đóng
+            if not beat.wait(self.threshold):
+                samples = [self._snapshot()]
+                while not beat.wait(self.threshold):
+                    if self._stopped.is_set() or self.loop.is_closed():
+                        return
+                    samples.append(self._snapshot())
+                self._record(samples, time.perf_counter() - sent)
+                continue
+            self.lag.observe(time.perf_counter() - sent)
+
+    def _snapshot(self):
+        frame = sys._current_frames().get(self.loop_thread)
+        return traceback.extract_stack(frame, limit=self.depth) if frame is not None else []
+
+    def _call_site(self, stack):
+        for entry in reversed(stack):
+            if entry.filename.startswith(self.root) and entry.filename != __file__:
+                return entry
+        return stack[-1] if stack else None
+
+    def _site_key(self, stack):
+        site = self._call_site(stack)
+        if site is None:
+            key = ('?', 0, '?')
+        else:
+            filename = site.filename
+            if filename.startswith(self.root):
+                filename = os.path.relpath(filename, self.root)
+            key = (filename, site.lineno, site.name)
+        return key
+
+    def _record(self, samples, blocked):
+        share = blocked / len(samples)
+        seen = {}  # vị trí -> (thời gian của lần nghẽn này tại vị trí đó, stack)
+        for stack in samples:
+            key = self._site_key(stack)
+            seen[key] = (seen.get(key, (0.0,))[0] + share, stack)
+        with self._lock:
+            self.lag.observe(blocked)
+            self.stalls += 1
+            self.blocked += blocked
+            for key, (seconds, stack) in seen.items():
+                entry = self.sites.get(key)
+                if entry is None:
+                    entry = self.sites[key] = StallSite()
+                entry.count += 1
+                entry.total += seconds
+                leaf = f"{os.path.basename(stack[-1].filename)}:{stack[-1].lineno} {stack[-1].name}" if stack else '?'
+                entry.leaves[leaf] = entry.leaves.get(leaf, 0) + 1
+                if seconds >= entry.max:
+                    entry.max = seconds
+                    entry.stack = stack
+        key, (_, stack) = max(seen.items(), key=lambda item: item[1][0])
+        log.warning("Event loop bị chặn %.0fms, chủ yếu tại %s:%s (%s)\n%s", blocked * 1000, *key,
+                    ''.join(traceback.format_list(stack)))
+
+    def top_sites(self, limit=10):
+        with self._lock:
+            return sorted(self.sites.items(), key=lambda item: item[1].total, reverse=True)[:limit]
+
+    def report(self, limit=10, stacks=False):
+        """Báo cáo các vị trí gây nghẽn, xếp theo tổng thời gian chặn"""
+        lines = [
+            f"Nghẽn event loop: {self.stalls} lần, tổng {self.blocked:.2f}s (ngưỡng {self.threshold * 1000:.0f}ms)",
+            f"Độ trễ loop: p50 {self.lag.quantile(0.5) * 1000:.1f}ms, p99 {self.lag.quantile(0.99) * 1000:.1f}ms, "
+            f"max {self.lag.max * 1000:.0f}ms ({self.lag.count} nhịp)",
+        ]
+        for (filename, lineno, name), site in self.top_sites(limit):
+            leaf = max(site.leaves, key=site.leaves.get)
+            lines.append(f"{site.count:>4}x {site.total:>7.2f}s (max {site.max:.2f}s) {filename}:{lineno} {name} <- {leaf}")
+            if stacks and site.stack:
+                lines.extend('      ' + line for line in ''.join(traceback.format_list(site.stack)).rstrip().splitlines())
+        return '\n'.join(lines)
@@ -1,86 +1,208 @@
 import discord
 from discord.ext import commands, tasks
+import asyncio
 import random
-import json
 import os
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import dotenv 
 import time
-import csv
-from server_logger import get_logger
+from server_logger import get_logger, shutdown as shutdown_logger, stats as logger_stats, LOG_DIR
+import log_archive
+import events
+from user_store import UserStore, InsufficientFunds, SupplyExceeded
+from storage import open_storage
+from price_feed import PriceFeed
+from price_history import PriceHistory, HOUR, DAY, WEEK
+from networth_index import NetWorthIndex
+from user_resolver import UserNameResolver
+import locks
+from locks import UserLocks
+from catalog import Catalog
+from cooldowns import Cooldowns
+from outbox import Outbox
+from sessions import SessionManager
+import blackjack as bj
+import games
+from games import DAILY_AMOUNT
+from metrics import metrics
+from loop_watchdog import StallWatchdog
+from journal import atomic_write
+import cluster
 
 # --- Config ---
 dotenv.load_dotenv()
 TOKEN = os.getenv("BOT_DISCORD_TOKEN")  # Thay bằng token thật khi chạy
 PREFIXES = ['!zero ', '!z ']
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DATA_FILE = os.path.join(BASE_DIR, 'users.json')
-FOXCOIN_PRICE = os.path.join(BASE_DIR, 'foxcoin_price.csv')
+DATA_DIR = os.getenv("BOT_DATA_DIR", BASE_DIR)  # Thư mục chứa users.json, giá foxcoin, bảng giá...
+DATA_FILE = os.path.join(DATA_DIR, 'users.json')
+FOXCOIN_PRICE = os.path.join(DATA_DIR, 'foxcoin_price.csv')
 MAX_FOXCOIN = 21000000000
-DAILY_AMOUNT = 500
-PETS_PRICE = os.path.join(BASE_DIR, 'pets_price.json')
+PETS_PRICE = os.path.join(DATA_DIR, 'pets_price.json')
+SHOP_ITEMS_FILE = os.path.join(DATA_DIR, 'shop_items.json')
+USER_FLUSH_INTERVAL = float(os.getenv("USER_FLUSH_INTERVAL", 5))  # Số giây tối đa dữ liệu người dùng chưa được ghi xuống đĩa
+USER_STORE_MODE = os.getenv("USER_STORE_MODE", "json")  # "json": ghi lại cả file, "journal": snapshot + journal, "binary": users.bin, "sqlite": users.db
+USER_RECORDS = os.getenv("USER_RECORDS", "dict")  # "compact": giữ người dùng trong bộ nhớ bằng UserRecord (xem records.py)
+SQLITE_FILE = os.path.join(DATA_DIR, 'users.db')
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", 100000))  # Số người dùng tối đa giữ trong bộ nhớ ở chế độ sqlite
+COOLDOWNS_FILE = os.path.join(DATA_DIR, 'cooldowns.json')  # Cooldown daily/work/rob... (snapshot + journal)
+PRICE_HISTORY_SIZE = 168  # Số lần cập nhật giá gần nhất giữ trong bộ nhớ (1 tuần)
+PRICE_HISTORY_FILE = os.path.join(DATA_DIR, 'foxcoin_price.bin')
+PRICE_RAW_RETENTION_DAYS = 30  # Sau số ngày này các tick giá được gộp thành nến 1 giờ
+LEADERBOARD_PAGE_SIZE = 10
+JOURNAL_COMPACT_BYTES = int(os.getenv("JOURNAL_COMPACT_BYTES", 4 * 1024 * 1024))
+OWNER_IDS = {int(x) for x in os.getenv("BOT_OWNER_IDS", "").split(",") if x.strip()}  # Trống: lấy chủ bot từ Discord
+METRICS_INTERVAL = float(os.getenv("METRICS_INTERVAL", 15))
+STALL_THRESHOLD = float(os.getenv("STALL_THRESHOLD", 0.5))  # Số giây event loop không trả lời thì chụp stack
+BOT_WORKERS = int(os.getenv("BOT_WORKERS", 1))  # >1: chia shard cho nhiều process, dữ liệu kinh tế ở process chủ (xem cluster.py)
+SHARD_COUNT = int(os.getenv("BOT_SHARD_COUNT", 0))  # >0: dùng AutoShardedBot với số shard này (mặc định = BOT_WORKERS)
+SHARD_IDS = [int(x) for x in os.getenv("BOT_SHARD_IDS", "").split(",") if x.strip()] or None  # Shard của process này
+ECONOMY_ADDRESS = os.getenv("BOT_ECONOMY_ADDRESS")  # Được đặt cho process shard: địa chỉ process chủ
+WORKER_ID = os.getenv("BOT_WORKER_ID")
+PROCESS_SUFFIX = f".w{WORKER_ID}" if WORKER_ID else ""  # File riêng của từng process shard
+SEND_COALESCE_WINDOW = float(os.getenv("SEND_COALESCE_WINDOW", 0.05))  # Số giây gom tin nhắn cùng kênh thành một lần gửi
+CHANNEL_RATE_LIMIT = os.getenv("CHANNEL_RATE_LIMIT", "5/5")  # "<số lần gọi>/<số giây>" cho mỗi kênh, "0": không giới hạn
+METRICS_FILE = os.getenv("METRICS_FILE", os.path.join(LOG_DIR, f"metrics{PROCESS_SUFFIX}.prom"))  # File Prometheus text cho scraper
 
 # --- Helper Functions ---
+price_feed = PriceFeed(FOXCOIN_PRICE, history_size=PRICE_HISTORY_SIZE)
+price_history = PriceHistory(PRICE_HISTORY_FILE, csv_path=FOXCOIN_PRICE, raw_retention=PRICE_RAW_RETENTION_DAYS * DAY)
+networth_index = NetWorthIndex(price_feed.current)
+
+def reload_price(price):
+    # Process chủ vừa ghi giá mới: đọc lại từ file
+    price_feed.reload()
+    price_history.reload()
+
+if ECONOMY_ADDRESS:
+    user_store = cluster.SharedUserStore(cluster.EconomyClient(ECONOMY_ADDRESS, os.getenv("BOT_ECONOMY_SECRET"), on_price=reload_price))
+else:
+    user_store = UserStore(
+        open_storage(USER_STORE_MODE, DATA_FILE, SQLITE_FILE, compact_bytes=JOURNAL_COMPACT_BYTES),
+        index=networth_index,
+        compact=USER_RECORDS == "compact" or USER_STORE_MODE == "binary",
+        max_supply=MAX_FOXCOIN,
+        cache_size=USER_CACHE_SIZE,
+    )
+cooldowns = cluster.SharedCooldowns(user_store.client) if ECONOMY_ADDRESS else Cooldowns(COOLDOWNS_FILE)
+
 def load_data():
-    if not os.path.exists(DATA_FILE):
-        return {}
-    with open(DATA_FILE, 'r', encoding='utf-8') as f:
-        return json.load(f)
+    return user_store.load()
 
 def save_data(data):
-    with open(DATA_FILE, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    user_store.replace_all(data)
 
-def get_user_data(user_id):
-    data = load_data()
-    if str(user_id) not in data:
-        data[str(user_id)] = {'balance': 1000, 'last_daily': None, 'foxcoin': 0, 'pets': []}
-        save_data(data)
-    return data[str(user_id)]
+async def get_user_data(user_id):
+    with metrics.timer('storage_read'):
+        return await user_store.get_async(user_id)
 
 def update_user_data(user_id, user_data):
-    data = load_data()
-    data[str(user_id)] = user_data
-    save_data(data)
+    with metrics.timer('storage_write'):
+        user_store.update(user_id, user_data)
+
+async def apply_user_batch(legs):
+    with metrics.timer('storage_write'):
+        return await user_store.apply_batch_async(legs)
+
+def transfer_money(from_id, to_id, amount):
+    with metrics.timer('storage_write'):
+        return user_store.transfer(from_id, to_id, amount)
+
+def move_user_item(from_id, to_id, item):
+    with metrics.timer('storage_write'):
+        return user_store.move_item(from_id, to_id, item)
+
+async def cooldown_remaining(user_id, action):
+    with metrics.timer('storage_read'):
+        return await cooldowns.remaining_async(user_id, action)
+
+async def start_cooldown(user_id, action, seconds):
+    with metrics.timer('storage_write'):
+        await cooldowns.start_async(user_id, action, seconds)
+
+def migrate_cooldowns():
+    """Lần chạy đầu có cooldowns.json: chuyển last_daily/last_work cũ trong dữ liệu người dùng sang cooldowns"""
+    cooldowns.load()
+    if not cooldowns.created:
+        return
+    for user_id, user_data in user_store.iter_users():
+        last_daily = user_data.get('last_daily')
+        if last_daily:
+            # last_daily cũ được ghi bằng datetime.utcnow()
+            claimed = datetime.fromisoformat(last_daily).replace(tzinfo=timezone.utc).timestamp()
+            cooldowns.start(user_id, 'daily', games.DAILY_COOLDOWN, now=claimed)
+        last_work = user_data.get('last_work')
+        if last_work:
+            cooldowns.start(user_id, 'work', games.WORK_COOLDOWN, now=last_work)
+    cooldowns.purge()
+    cooldowns.save()
 
 def save_foxcoin_price(price):
-    with open(FOXCOIN_PRICE, 'a', newline='') as f:
-        writer = csv.writer(f)
-        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M')
-        writer.writerow([timestamp, price])
+    price_feed.append(price)
+    price_history.append(price)
 
 def get_foxcoin_price():
-    with open(FOXCOIN_PRICE, 'r', newline='') as f:
-        rows = list(csv.reader(f))
-        if len(rows) == 1:
-            return 10.0
-        row_now = rows[-1]
-        return float(row_now[1])
+    return price_feed.current()
     
-def get_total_supply():
-    data = load_data()
-    return sum(user['foxcoin'] for user in data.values())
+async def get_total_supply():
+    return await user_store.supply_async()
+
+pet_catalog = Catalog(PETS_PRICE)  # Tự đọc lại khi pets_price.json được sửa
 
 def get_pet_price(pet_name):
-    if not os.path.exists(PETS_PRICE):
-        return {}
-    with open(PETS_PRICE, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    return data.get(pet_name)
+    return pet_catalog.get(pet_name)
 
 def get_pet_list():
-    if not os.path.exists(PETS_PRICE):
-        return {}
-    with open(PETS_PRICE, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    return data.keys()
+    return pet_catalog.keys()
 
 # --- Bot Setup ---
 intents = discord.Intents.default()
 intents.message_content = True
 intents.guilds = True
-bot = commands.Bot(command_prefix=commands.when_mentioned_or(*PREFIXES), intents=intents)
+
+rate_limit, _, rate_period = CHANNEL_RATE_LIMIT.partition('/')
+outbox = Outbox(SEND_COALESCE_WINDOW, rate=int(rate_limit) or None, per=float(rate_period or 5))
+
+def command_name(ctx):
+    return ctx.command.qualified_name if ctx.command else '-'
+
+class TimedContext(commands.Context):
+    """Context gửi tin nhắn qua `outbox` (gộp theo kênh, xếp hàng theo rate limit) và đo thời gian gửi.
+
+    Lệnh đang giữ khoá người dùng (và quyền mượn ở process chủ khi chạy nhiều process) chỉ xếp tin
+    nhắn vào hàng đợi rồi chạy tiếp, không giữ khoá trong lúc chờ rate limit; khi đó `send` trả về
+    future của Message thay vì Message, và thời gian gửi do `outbox` đo khi future xong.
+    """
+
+    async def send(self, content=None, **kwargs):
+        if locks.holding():
+            return await outbox.send(self.channel, content, command=command_name(self), wait=False, **kwargs)
+        with metrics.timer('discord_send'):
+            return await outbox.send(self.channel, content, command=command_name(self), **kwargs)
+
+async def edit_message(ctx, message, **fields):
+    """Sửa tin nhắn bot đã gửi thay vì gửi tin nhắn mới"""
+    with metrics.timer('discord_send'):
+        return await outbox.edit(message, command=command_name(ctx), **fields)
+
+class ZeroBot(commands.AutoShardedBot if SHARD_COUNT else commands.Bot):
+    async def get_context(self, origin, *, cls=TimedContext):
+        return await super().get_context(origin, cls=cls)
+
+shard_options = {'shard_count': SHARD_COUNT, 'shard_ids': SHARD_IDS} if SHARD_COUNT else {}
+bot = ZeroBot(command_prefix=commands.when_mentioned_or(*PREFIXES), intents=intents, owner_ids=OWNER_IDS or None, **shard_options)
 bot.remove_command('help')
+user_names = UserNameResolver(bot)
+user_locks = cluster.SharedUserLocks(user_store) if ECONOMY_ADDRESS else UserLocks()
+stall_watchdog = StallWatchdog(STALL_THRESHOLD)
+
+@bot.before_invoke
+async def start_command_timer(ctx):
+    metrics.command_started(ctx)
+
+@bot.after_invoke
+async def stop_command_timer(ctx):
+    metrics.command_finished(ctx)
 
 # --- Key Words ---
 
@@ -98,32 +220,30 @@ work_commands = ('work', 'lamviec', 'lv')
 # --- Economy Commands ---
 @bot.command(name='balance', aliases = balance_commands[1:])
 async def balance(ctx):
-    user_data = get_user_data(ctx.author.id)
+    user_data = await get_user_data(ctx.author.id)
     await ctx.send(f"💰 {ctx.author.mention} Số dư hiện tại: **{user_data['balance']:,.2f}**")
 
 @bot.command(name='daily', aliases = daily_commands[1:])
+@user_locks.locked
 async def daily(ctx):
-    user_data = get_user_data(ctx.author.id)
-    now = datetime.utcnow()
-    last_daily = user_data.get('last_daily')
-    if last_daily:
-        last_daily = datetime.fromisoformat(last_daily)
-        if now - last_daily < timedelta(hours=24):
-            remain = timedelta(hours=24) - (now - last_daily)
-            await ctx.send(f"⏳ Bạn đã nhận daily rồi. Thử lại sau {remain.seconds//3600}h{(remain.seconds//60)%60}p.")
-            return
+    remaining = int(await cooldown_remaining(ctx.author.id, 'daily'))
+    if remaining:
+        await ctx.send(f"⏳ Bạn đã nhận daily rồi. Thử lại sau {remaining//3600}h{(remaining//60)%60}p.")
+        return
+    user_data = await get_user_data(ctx.author.id)
     user_data['balance'] += DAILY_AMOUNT
-    user_data['last_daily'] = now.isoformat()
     update_user_data(ctx.author.id, user_data)
+    await start_cooldown(ctx.author.id, 'daily', games.DAILY_COOLDOWN)
     await ctx.send(f"🎁 {ctx.author.mention} nhận {DAILY_AMOUNT} xu mỗi ngày! Số dư mới: **{user_data['balance']:.2f}**")
 
 # --- Coinflip Command ---
 @bot.command(name='coinflip', aliases = coin_flip_commands[1:])
+@user_locks.locked
 async def coinflip(ctx, choice: str = None, amount: str = None):
     if choice not in ['heads', 'tails'] or amount is None:
         await ctx.send('Cú pháp: `!zero coinflip heads/tails <số tiền>`')
         return
-    user_data = get_user_data(ctx.author.id)
+    user_data = await get_user_data(ctx.author.id)
     if amount.isdigit():
         amount = int(amount)
     else:
@@ -134,115 +254,119 @@ async def coinflip(ctx, choice: str = None, amount: str = None):
     if amount <= 0 or amount > user_data['balance']:
         await ctx.send('Số tiền cược không hợp lệ hoặc vượt quá số dư!')
         return
-    result = random.choice(['heads', 'tails'])
-    win = (choice == result)
-    if win:
-        user_data['balance'] += amount
+    result, multiplier = games.coinflip(choice)
+    user_data['balance'] += amount * multiplier
+    if multiplier > 0:
         msg = f"🎉 {ctx.author.mention} thắng! Kết quả: **{result}**. Nhận {amount:,.2f} xu."
     else:
-        user_data['balance'] -= amount
         msg = f"😢 {ctx.author.mention} thua! Kết quả: **{result}**. Mất {amount:,.2f} xu."
     update_user_data(ctx.author.id, user_data)
     await ctx.send(msg + f" Số dư: **{user_data['balance']:,.2f}**")
 
 # --- Blackjack Game ---
-SUITS = ['♠', '♥', '♦', '♣']
-RANKS = ['2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K', 'A']
-CARD_VALUES = {str(i): i for i in range(2, 11)}
-CARD_VALUES.update({'J': 10, 'Q': 10, 'K': 10, 'A': 11})
-
-def draw_card(deck):
-    return deck.pop(random.randint(0, len(deck)-1))
-
-def hand_value(hand):
-    value = sum(CARD_VALUES[card[0]] for card in hand)
-    # Adjust for Aces
-    aces = sum(1 for card in hand if card[0] == 'A')
-    while value > 21 and aces:
-        value -= 10
-        aces -= 1
-    return value
-
-active_blackjack = {}
+active_blackjack = {}  # user_id -> Table, mỗi người chỉ chơi một ván cùng lúc
+blackjack_messages = {}  # user_id -> task gửi tin nhắn hiển thị ván bài, được sửa lại sau mỗi lượt
+BLACKJACK_TIMEOUT = 60
+game_sessions = SessionManager(timeout=BLACKJACK_TIMEOUT)
 
 @bot.command(name='blackjack', aliases = blackjack_commands[1:])
 async def blackjack(ctx, amount: str = None):
-    if amount.isdigit():
-        amount = int(amount)
-        if amount is None or amount <= 0:
-            await ctx.send('Cú pháp: `!zero blackjack <số tiền>`')
-            return
-        user_data = get_user_data(ctx.author.id)
-        if amount > user_data['balance']:
-            await ctx.send('Số dư không đủ để chơi!')
-            return
+    async with user_locks.hold(ctx.author.id):
         if ctx.author.id in active_blackjack:
             await ctx.send('Bạn đang có ván blackjack chưa kết thúc!')
             return
-    else:
-        if amount == 'all':
-            user_data = get_user_data(ctx.author.id)
-            if user_data['balance'] == 0:
+        if amount is not None and amount.isdigit():
+            amount = int(amount)
+            if amount <= 0:
+                await ctx.send('Cú pháp: `!zero blackjack <số tiền>`')
+                return
+            user_data = await get_user_data(ctx.author.id)
+            if amount > user_data['balance']:
                 await ctx.send('Số dư không đủ để chơi!')
                 return
-            amount = user_data['balance']
         else:
-            await ctx.send('Số tiền bạn nhập không hợp lệ!')
-            return
-    # Setup game
-    deck = [(rank, suit) for suit in SUITS for rank in RANKS]
-    random.shuffle(deck)
-    player = [draw_card(deck), draw_card(deck)]
-    dealer = [draw_card(deck), draw_card(deck)]
-    active_blackjack[ctx.author.id] = {
-        'deck': deck,
-        'player': player,
-        'dealer': dealer,
-        'bet': amount
-    }
-    await ctx.send(f"Bài của bạn: {format_hand(player)} (Tổng: {hand_value(player)})\nBài dealer: {format_hand([dealer[0]])} và [ẩn]\nGõ `hit` để rút, `stand` để dừng.")
+            if amount == 'all':
+                user_data = await get_user_data(ctx.author.id)
+                if user_data['balance'] <= 0:
+                    await ctx.send('Số dư không đủ để chơi!')
+                    return
+                amount = user_data['balance']
+            else:
+                await ctx.send('Số tiền bạn nhập không hợp lệ!')
+                return
+        # Giữ tiền cược ngay khi bắt đầu ván để số dư không bị dùng ở lệnh khác trong lúc chờ hit/stand
+        user_data['balance'] -= amount
+        update_user_data(ctx.author.id, user_data)
+        table = bj.deal(amount)
+        active_blackjack[ctx.author.id] = table
+    game_sessions.open(ctx, table, ('hit', 'stand'), blackjack_action, blackjack_timeout)
+    await show_blackjack(ctx, table, "Gõ `hit` để rút, `stand` để dừng.")
 
-    def check(m):
-        return m.author == ctx.author and m.channel == ctx.channel and m.content.lower() in ['hit', 'stand']
+def format_blackjack(table, footer, reveal=False):
+    if reveal:
+        dealer = f"{bj.format_hand(table.dealer)} (Tổng: {bj.hand_value(table.dealer)})"
+    else:
+        dealer = f"{bj.format_hand(table.dealer[:1])} và [ẩn]"
+    return f"Bài của bạn: {bj.format_hand(table.player)} (Tổng: {bj.hand_value(table.player)})\nBài dealer: {dealer}\n{footer}"
 
-    while True:
-        try:
-            msg = await bot.wait_for('message', check=check, timeout=60)
-        except:
-            del active_blackjack[ctx.author.id]
-            await ctx.send('⏰ Hết thời gian! Ván bài bị hủy.')
+async def show_blackjack(ctx, table, footer, reveal=False, message=None):
+    """Cả ván bài nằm trong một tin nhắn: lượt đầu gửi mới, các lượt sau sửa lại tin nhắn đó.
+
+    `blackjack_messages` giữ task gửi tin nhắn đầu của ván đang chơi (hit/stand có thể tới trước
+    khi tin nhắn đó gửi xong nếu kênh đang chờ rate limit). Khi ván kết thúc, người gọi lấy task ra
+    trước khi trả tiền để ván mới không sửa nhầm, rồi truyền vào `message`.
+    """
+    text = format_blackjack(table, footer, reveal)
+    sent = message or blackjack_messages.get(ctx.author.id)
+    if sent is None:
+        sent = blackjack_messages[ctx.author.id] = asyncio.ensure_future(ctx.send(text, coalesce=False))
+        await sent
+    else:
+        await edit_message(ctx, await sent, content=text)
+
+async def blackjack_action(session, action):
+    """Xử lý `hit`/`stand` của người chơi, được SessionManager gọi từ listener on_message"""
+    ctx, table = session.ctx, session.state
+    if action == 'hit':
+        card = bj.hit(table)
+        drawn = f"Bạn rút: {bj.format_hand([card])}."
+        if bj.hand_value(table.player) <= 21:
+            await show_blackjack(ctx, table, f"{drawn} Gõ `hit` để rút, `stand` để dừng.")
             return
-        if msg.content.lower() == 'hit':
-            player.append(draw_card(deck))
-            await ctx.send(f"Bạn rút: {format_hand([player[-1]])}. Bài: {format_hand(player)} (Tổng: {hand_value(player)})")
-            if hand_value(player) > 21:
-                user_data['balance'] -= amount
-                update_user_data(ctx.author.id, user_data)
-                del active_blackjack[ctx.author.id]
-                await ctx.send(f'💥 Quá 21! Bạn thua **{amount:,.2f}** xu. Số dư: **{user_data["balance"]:,.2f}**')
-                return
-        else:
-            break
+        # Đóng phiên trước khi await để tin nhắn tiếp theo không xử lý lại ván đã kết thúc
+        game_sessions.close(session.key)
+        message = blackjack_messages.pop(ctx.author.id, None)
+        balance = await settle_blackjack(ctx.author.id, 0)
+        await show_blackjack(ctx, table, f'{drawn} 💥 Quá 21! Bạn thua **{table.bet:,.2f}** xu. Số dư: **{balance:,.2f}**', message=message)
+        return
     # Dealer turn
-    while hand_value(dealer) < 17:
-        dealer.append(draw_card(deck))
-    await ctx.send(f"Bài dealer: {format_hand(dealer)} (Tổng: {hand_value(dealer)})")
-    player_val = hand_value(player)
-    dealer_val = hand_value(dealer)
-    if dealer_val > 21 or player_val > dealer_val:
-        user_data['balance'] += amount
-        result = f'🎉 Bạn thắng **{amount:,.2f}** xu!'
-    elif player_val == dealer_val:
+    game_sessions.close(session.key)
+    bj.play_dealer(table)
+    payout = bj.payout(table)
+    if payout > table.bet:
+        result = f'🎉 Bạn thắng **{table.bet:,.2f}** xu!'
+    elif payout == table.bet:
         result = '🤝 Hòa! Không mất tiền.'
     else:
-        user_data['balance'] -= amount
-        result = f'😢 Bạn thua **{amount:,.2f}** xu.'
-    update_user_data(ctx.author.id, user_data)
-    del active_blackjack[ctx.author.id]
-    await ctx.send(f'{result} Số dư: **{user_data["balance"]:,.2f}**')
+        result = f'😢 Bạn thua **{table.bet:,.2f}** xu.'
+    message = blackjack_messages.pop(ctx.author.id, None)
+    balance = await settle_blackjack(ctx.author.id, payout)
+    await show_blackjack(ctx, table, f'{result} Số dư: **{balance:,.2f}**', reveal=True, message=message)
+
+async def blackjack_timeout(session):
+    message = blackjack_messages.pop(session.ctx.author.id, None)
+    await settle_blackjack(session.ctx.author.id, session.state.bet)
+    await show_blackjack(session.ctx, session.state, '⏰ Hết thời gian! Ván bài bị hủy.', message=message)
+
+async def settle_blackjack(user_id, payout):
+    """Kết thúc ván: trả `payout` (gồm cả tiền cược đã giữ) vào số dư hiện tại và trả về số dư mới"""
+    async with user_locks.hold(user_id):
+        user_data = await get_user_data(user_id)
+        user_data['balance'] += payout
+        update_user_data(user_id, user_data)
+        del active_blackjack[user_id]
+    return user_data['balance']
 
-def format_hand(hand):
-    return ', '.join([f'{r}{s}' for r, s in hand])
 @bot.command(name='help')
 async def help(ctx):
     embed = discord.Embed(
@@ -271,8 +395,10 @@ async def help(ctx):
         ],
         "📊 Khác": [
             "`!z foxcoin <check/buy/sell>` - Giao dịch foxcoin",
-            "`!z leaderboard` - Bảng xếp hạng",
-            "`!z love @user1 @user2` - Xem độ hợp nhau"
+            "`!z foxcoin history <24h/7d/4w/1y/all>` - Lịch sử giá foxcoin",
+            "`!z leaderboard [trang]` - Bảng xếp hạng",
+            "`!z love @user1 @user2` - Xem độ hợp nhau",
+            "`!z logs search [event:BAN] [user:@user] [since:7d]` - Tìm log server (quản trị viên)"
         ]
     }
     
@@ -299,36 +425,74 @@ async def love(ctx):
         return j+k
     s1, s2 = tong_chu_so(user_id1), tong_chu_so(user_id2)
     hop_nhau = (int((s1*s2)**0.5) + random.randint(0, 100)) % 100
-    await ctx.send(f"Tỷ lệ hợp nhau của 2 bạn là {hop_nhau}%")
     if hop_nhau == 100:
-        await ctx.send(
+        verdict = (
             "💍 **CẦN ĐỂ GẤP!!!!!** 💍\n"
             "Vì 2 bạn là định mệnh là có thật! 💘 Hai bạn là cặp đôi hoàn hảo từ tên đến trái tim! 💍💖 Chúc mừng vì đã tìm thấy nửa kia của mình!"
             )
     elif 99 >= hop_nhau >= 90:
-        await ctx.send("Mình nghĩ 2 bạn nên về chung 1 nhà với nhau! 🏡💑")
+        verdict = "Mình nghĩ 2 bạn nên về chung 1 nhà với nhau! 🏡💑"
     elif 89 >= hop_nhau >= 80:
-        await ctx.send("Một tình yêu đáng ngưỡng mộ! 💖")
+        verdict = "Một tình yêu đáng ngưỡng mộ! 💖"
     elif 79 >= hop_nhau >= 70:
-        await ctx.send("Rất hợp nhau đấy! Thử tìm hiểu thêm xem sao! 😊")
+        verdict = "Rất hợp nhau đấy! Thử tìm hiểu thêm xem sao! 😊"
     elif 69 >= hop_nhau >= 50:
-        await ctx.send("Cũng tạm ổn, nhưng vẫn cần cố gắng! 🤝")
+        verdict = "Cũng tạm ổn, nhưng vẫn cần cố gắng! 🤝"
     elif 49 >= hop_nhau >= 30:
-        await ctx.send("Hmm... Có lẽ chỉ nên làm bạn. 😅")
+        verdict = "Hmm... Có lẽ chỉ nên làm bạn. 😅"
     elif 29 >= hop_nhau >= 10:
-        await ctx.send("Khó đấy... chắc không cùng tần số. 😬")
+        verdict = "Khó đấy... chắc không cùng tần số. 😬"
     elif 9 >= hop_nhau >= 1:
-        await ctx.send("💔 Oan gia trái số luôn rồi!")
+        verdict = "💔 Oan gia trái số luôn rồi!"
     else:
-        await ctx.send("Là do giá trị không hợp lệ hay... **không hợp nhau**? 🤖")
+        verdict = "Là do giá trị không hợp lệ hay... **không hợp nhau**? 🤖"
+    await ctx.send(f"Tỷ lệ hợp nhau của 2 bạn là {hop_nhau}%\n{verdict}")
+
+HISTORY_UNITS = {'h': HOUR, 'd': DAY, 'w': WEEK, 'm': 30 * DAY, 'y': 365 * DAY}
+HISTORY_ROWS = 12  # Số nến hiển thị trong lệnh foxcoin history
+
+def format_price_history(label, candles, width):
+    first, last = candles[0], candles[-1]
+    change = (last['c'] - first['o']) / first['o'] * 100
+    time_format = '%Y-%m-%d %H:%M' if width == HOUR else '%Y-%m-%d'
+    rows = [
+        f"{datetime.fromtimestamp(int(c['t'])).strftime(time_format):<16} {c['o']:>8.2f} {c['h']:>8.2f} {c['l']:>8.2f} {c['c']:>8.2f}"
+        for c in candles[-HISTORY_ROWS:]
+    ]
+    return (
+        f"📈 Giá foxcoin trong **{label}**: mở cửa **{first['o']:,.2f}**, đóng cửa **{last['c']:,.2f}** ({change:+.2f}%)\n"
+        f"Cao nhất **{candles['h'].max():,.2f}**, thấp nhất **{candles['l'].min():,.2f}**\n"
+        f"```\n{'Thời gian':<16} {'Mở':>8} {'Cao':>8} {'Thấp':>8} {'Đóng':>8}\n" + '\n'.join(rows) + "\n```"
+    )
+
+async def foxcoin_history(ctx, time_range):
+    now = int(time.time())
+    if time_range == 'all':
+        start = price_history.first_time() or now
+    elif time_range and time_range[:-1].isdigit() and int(time_range[:-1]) > 0 and time_range[-1] in HISTORY_UNITS:
+        start = now - int(time_range[:-1]) * HISTORY_UNITS[time_range[-1]]
+    else:
+        await ctx.send('Cú pháp: `!z foxcoin history <khoảng thời gian>`. Ví dụ: `24h`, `7d`, `4w`, `6m`, `1y`, `all`')
+        return
+    span = now - start
+    width = HOUR if span <= 2 * DAY else DAY if span <= 90 * DAY else WEEK
+    candles = price_history.ohlc(start, now + 1, width)
+    if len(candles) == 0:
+        await ctx.send('Chưa có dữ liệu giá foxcoin trong khoảng thời gian này!')
+        return
+    await ctx.send(format_price_history(time_range, candles, width))
 
 @bot.command(name='foxcoin', aliases=foxcoin_commands[1:])
+@user_locks.locked
 async def foxcoin(ctx, choice: str = None, number: str = None):
-    msg_khong_hop_le = 'Hãy chọn 1 trong 3 lựa chọn dưới đây:\nKiểm tra giá và số lượng foxcoin đang sở hữu. `!z foxcoin check`\nMua foxcoin. `!z foxcoin buy <số lượng>`\nBán foxcoin. `!z foxcoin sell <số lượng>`'
-    if choice not in ['check', 'buy', 'sell']:
+    msg_khong_hop_le = 'Hãy chọn 1 trong 4 lựa chọn dưới đây:\nKiểm tra giá và số lượng foxcoin đang sở hữu. `!z foxcoin check`\nMua foxcoin. `!z foxcoin buy <số lượng>`\nBán foxcoin. `!z foxcoin sell <số lượng>`\nXem lịch sử giá foxcoin. `!z foxcoin history <khoảng thời gian>`'
+    if choice not in ['check', 'buy', 'sell', 'history']:
         await ctx.send(msg_khong_hop_le)
         return
-    user_data = get_user_data(ctx.author.id)
+    if choice == 'history':
+        await foxcoin_history(ctx, number)
+        return
+    user_data = await get_user_data(ctx.author.id)
     foxcoin_price = get_foxcoin_price()
     if choice == 'check':
         if number is not None:
@@ -337,7 +501,7 @@ async def foxcoin(ctx, choice: str = None, number: str = None):
         so_coin = user_data['foxcoin']
         await ctx.send(
             f'Bạn đang có **{so_coin:,.2f}** foxcoin.\n'
-            f'Nguồn cung foxcoin trên thị trường hiện tại là **{get_total_supply():,.2f}/{MAX_FOXCOIN:,.2f}**\n'
+            f'Nguồn cung foxcoin trên thị trường hiện tại là **{await get_total_supply():,.2f}/{MAX_FOXCOIN:,.2f}**\n'
             f'Giá 1 foxcoin hiện tại là **{get_foxcoin_price()}**\n'
             f'Tổng giá trị số foxcoin bạn đang sở hữu là **{(get_foxcoin_price() * so_coin):,.2f}**'
             )
@@ -347,10 +511,10 @@ async def foxcoin(ctx, choice: str = None, number: str = None):
     else:
         if number == 'all':
             if choice in ['buy']:
-                if (user_data['balance'] / foxcoin_price) + get_total_supply() <= MAX_FOXCOIN:
+                if (user_data['balance'] / foxcoin_price) + await get_total_supply() <= MAX_FOXCOIN:
                     number = user_data['balance'] / foxcoin_price
                 else:
-                    number = MAX_FOXCOIN - get_total_supply()
+                    number = MAX_FOXCOIN - await get_total_supply()
             elif choice in ['sell']:
                 number = user_data['foxcoin']
         else:
@@ -363,22 +527,28 @@ async def foxcoin(ctx, choice: str = None, number: str = None):
         if number <= 0 or number*foxcoin_price > user_data['balance']:
             await ctx.send('Số foxcoin không hợp lệ hoặc vượt quá số dư!')
             return
-        if number + get_total_supply() > MAX_FOXCOIN:
+        if number + await get_total_supply() > MAX_FOXCOIN:
             await ctx.send('Số lượng foxcoin có sẵn trên thị trường hiện không đủ!')
             return
-        if get_total_supply() == MAX_FOXCOIN:
+        if await get_total_supply() == MAX_FOXCOIN:
             await ctx.send('Số lượng foxcoin đã đạt đến giới hạn!')
-        user_data['balance'] -= float(format(number*foxcoin_price, '.2f'))
-        user_data['foxcoin'] += number
+        legs = [(ctx.author.id, 'balance', -float(format(number*foxcoin_price, '.2f'))), (ctx.author.id, 'foxcoin', number)]
         msg = 'mua'
     elif choice == 'sell':
         if number <= 0 or number > user_data['foxcoin']:
             await ctx.send('Số foxcoin không hợp lệ hoặc vượt quá số lượng bạn đang có!')
             return
-        user_data['balance'] += float(format(number*foxcoin_price, '.2f'))
-        user_data['foxcoin'] -= number
+        legs = [(ctx.author.id, 'balance', float(format(number*foxcoin_price, '.2f'))), (ctx.author.id, 'foxcoin', -number)]
         msg = 'bán'
-    update_user_data(ctx.author.id, user_data)
+    try:
+        await apply_user_batch(legs)
+    except InsufficientFunds:
+        await ctx.send('Số dư không đủ để thực hiện giao dịch!')
+        return
+    except SupplyExceeded:
+        # Kiểm tra ở trên có thể đã cũ khi nhiều process shard cùng mua
+        await ctx.send('Số lượng foxcoin có sẵn trên thị trường hiện không đủ!')
+        return
     await ctx.send(
         "Bạn đã " + msg + ' **' + str(format(number, '.2f')) + f"** foxcoin với tổng giá trị giao dịch là **{(number*foxcoin_price):,.2f}**.\n"
         f"Hiện tại bạn có **{user_data['foxcoin']:,.2f}** foxcoin.\n"
@@ -391,42 +561,43 @@ async def update_price():
     change_percent = random.choice([0.005, -0.005, 0.01, -0.01, 0.02, -0.02, 0.03, -0.03])
     foxcoin_price *= (1 + change_percent)
     save_foxcoin_price(round(foxcoin_price, 2))
+    price_history.downsample()
+    user_store.load()
+    networth_index.rebase(get_foxcoin_price())
 
 @bot.command(name='leaderboard', aliases=leaderboard_commands[1:])
-async def leaderboard(ctx):
-    def bubble_sort(arr):
-        for i in range(len(arr)):
-            for j in range(len(arr)-i-1):
-                if arr[j][1] < arr[j+1][1]:
-                    arr[j], arr[j+1] = arr[j+1], arr[j]
-        return arr[:10]
-    
-    data = load_data()
-    leaderboard_list = []
-    for user_id, user_data in data.items():
-        leaderboard_list.append((user_id, user_data['balance'] + user_data['foxcoin']*get_foxcoin_price()))
-    leaderboard_list = bubble_sort(leaderboard_list)
+async def leaderboard(ctx, page: int = 1):
+    page = max(page, 1)
+    offset = (page - 1) * LEADERBOARD_PAGE_SIZE
+    leaderboard_list = await user_store.top_networth_async(get_foxcoin_price(), LEADERBOARD_PAGE_SIZE, offset)
+    if not leaderboard_list:
+        await ctx.send('Trang này không có ai cả!')
+        return
+    names = await user_names.resolve_many([user_id for user_id, _ in leaderboard_list], ctx.guild)
     embed = discord.Embed(title="🏆 Bảng xếp hạng tài sản 🏆", color=discord.Color.gold())
-    for rank, (user_id, total_value) in enumerate(leaderboard_list, start=1):
-        user = await bot.fetch_user(int(user_id))
+    for rank, (user_id, total_value) in enumerate(leaderboard_list, start=offset + 1):
         embed.add_field(
-            name = f"{rank}. {user.name}",
+            name = f"{rank}. {names[int(user_id)]}",
             value = f"Tổng tài sản: {total_value:.2f}",
             inline = False
         )
+    pages = (await user_store.ranked_count_async() + LEADERBOARD_PAGE_SIZE - 1) // LEADERBOARD_PAGE_SIZE
+    my_rank = await user_store.networth_rank_async(ctx.author.id)
+    embed.set_footer(text=f"Trang {page}/{pages}" + (f" | Hạng của bạn: #{my_rank}" if my_rank else ""))
     await ctx.send(embed=embed)
 
 @bot.command(name='taisan')
 async def taisan(ctx):
-    user_data = get_user_data(ctx.author.id)
+    user_data = await get_user_data(ctx.author.id)
     await ctx.send(f"💰 {ctx.author.mention} Tài sản của bạn gồm có:\n- Số dư: **{user_data['balance']:,.2f}**\n- Foxcoin: **{user_data['foxcoin']:,.2f}** foxcoin, trị giá khoảng **{user_data['foxcoin']*get_foxcoin_price():,.2f}** *({get_foxcoin_price():,.2f}/foxcoin)*\nTổng tài sản của bạn là: **{user_data['balance']+user_data['foxcoin']*get_foxcoin_price():,.2f}**")
 
 @bot.command(name='spin', aliases=spin_commands[1:])
+@user_locks.locked
 async def spin(ctx, amount: str = None):
     if amount is None:
         await ctx.send('Hãy nhập đúng cú pháp! `!z spin <số tiền cược>`')
         return
-    user_data = get_user_data(ctx.author.id)
+    user_data = await get_user_data(ctx.author.id)
     if amount.isdigit():
         amount = int(amount)
         if amount <= 0 or amount > user_data['balance']:
@@ -437,18 +608,17 @@ async def spin(ctx, amount: str = None):
             await ctx.send('Hãy nhập đúng cú pháp! `!z spin <số tiền cược>`')
             return
         amount = user_data['balance']
-    slots = ['🍕','🍔','🍟','🌭','🍿','🍖','🍗','🥩','🍠','🍘','🍤','🍉']
-    result = random.choices(slots, k=3)
-    if result[0] == result[1] == result[2]:
+    result, multiplier = games.spin()
+    user_data['balance'] += amount * multiplier
+    if multiplier > 0:
         msg = f"🎉 {ctx.author.mention} thắng! Nhận **{amount:,.2f}** xu.\n"
-        user_data['balance'] += amount
     else:
         msg = f"😢 {ctx.author.mention} thua! Mất **{amount:,.2f}** xu.\n"
-        user_data['balance'] -= amount
     update_user_data(ctx.author.id, user_data)
     await ctx.send('Đang quay số... Vui lòng đợi!\nKết quả: **' + ' | '.join(result) + '**\n' + msg + 'Số dư: **' + format(user_data['balance'], ',.2f') + '**')
 
 @bot.command(name='taixiu')
+@user_locks.locked
 async def taixiu(ctx, choice: str = None, amount: str = None):
     if choice not in ['tai', 'xiu'] or amount is None:
         await ctx.send('Cú pháp: `!z taixiu tai/xiu <số tiền>`')
@@ -456,7 +626,7 @@ async def taixiu(ctx, choice: str = None, amount: str = None):
     if amount is None:
         await ctx.send('Cú pháp: `!z taixiu tai/xiu <số tiền>`')
         return
-    user_data = get_user_data(ctx.author.id)
+    user_data = await get_user_data(ctx.author.id)
     if amount.isdigit():
         amount = int(amount)
     else:
@@ -467,26 +637,16 @@ async def taixiu(ctx, choice: str = None, amount: str = None):
     if amount <= 0 or amount > user_data['balance']:
         await ctx.send('Số tiền cược không hợp lệ hoặc vượt quá số dư!')
         return
-    result1 = random.randint(1, 6)
-    result2 = random.randint(1, 6)
-    result3 = random.randint(1, 6)
+    (result1, result2, result3), outcome, multiplier = games.taixiu(choice)
     total_result = result1 + result2 + result3
-    if 10 >= total_result >= 4:
-        if choice in ['xiu']:
-            user_data['balance'] += amount
-            msg = f"🎉 Chúc mừng {ctx.author.mention} thắng!\nTổng điểm: **{result1} + {result2} + {result3} = {total_result}**.\nKết quả: **XỈU**.\nNhận **{amount:,.2f}** xu."
-        else:
-            user_data['balance'] -= amount
-            msg = f"😢 Rất tiếc! {ctx.author.mention} thua!\nTổng điểm: **{result1} + {result2} + {result3} = {total_result}**.\nKết quả: **XỈU**.\nMất **{amount:,.2f}** xu."
-    elif 17 >= total_result >= 11:
-        if choice in ['tai']:
-            user_data['balance'] += amount
-            msg = f"🎉 Chúc mừng {ctx.author.mention} thắng!\nTổng điểm: **{result1} + {result2} + {result3} = {total_result}**.\nKết quả: **TÀI**.\nNhận **{amount:,.2f}** xu."
-        else:
-            user_data['balance'] -= amount
-            msg = f"😢 Rất tiếc! {ctx.author.mention} thua!\nTổng điểm: **{result1} + {result2} + {result3} = {total_result}**.\nKết quả: **TÀI**.\nMất **{amount:,.2f}** xu."
+    user_data['balance'] += amount * multiplier
+    dice = f"Tổng điểm: **{result1} + {result2} + {result3} = {total_result}**."
+    if outcome is None:
+        msg = f"{dice}\nKết quả: **NHÀ CÁI ĂN**.\nKhông bị mất xu."
+    elif multiplier > 0:
+        msg = f"🎉 Chúc mừng {ctx.author.mention} thắng!\n{dice}\nKết quả: **{'TÀI' if outcome == 'tai' else 'XỈU'}**.\nNhận **{amount:,.2f}** xu."
     else:
-        msg = f"Tổng điểm: **{result1} + {result2} + {result3} = {total_result}**.\nKết quả: **NHÀ CÁI ĂN**.\nKhông bị mất xu."
+        msg = f"😢 Rất tiếc! {ctx.author.mention} thua!\n{dice}\nKết quả: **{'TÀI' if outcome == 'tai' else 'XỈU'}**.\nMất **{amount:,.2f}** xu."
 
     update_user_data(ctx.author.id, user_data)
     await ctx.send(msg + f" Số dư: **{user_data['balance']:,.2f}**")
@@ -496,60 +656,59 @@ async def pets(ctx, choice: str = None, pets_name: str = None):
     if choice not in ['buy', 'sell', 'feed', 'give'] or pets_name not in get_pet_list():
         await ctx.send("Hãy nhập đúng cú pháp!\n`!z pets buy/sell <tên pet>`\n`!z pets feed <tên pet>`\n`!z pets give <tên pet><người dùng>`")
         return
-    user_data = get_user_data(ctx.author.id)
-    if not user_data:
-        await ctx.send("❌ Không thể tải dữ liệu người dùng.")
-        return
-
-    if choice == 'give':
-        if not ctx.message.mentions:
-            await ctx.send("❌ Bạn cần tag người nhận!")
-            return
-        recipient = ctx.message.mentions[0]
-        if recipient.id == ctx.author.id:
-            await ctx.send("❌ Bạn không thể tặng pet cho chính mình!")
+    lock_ids = [ctx.author.id]
+    if choice == 'give' and ctx.message.mentions:
+        lock_ids.append(ctx.message.mentions[0].id)
+    async with user_locks.hold(*lock_ids):
+        user_data = await get_user_data(ctx.author.id)
+        if not user_data:
+            await ctx.send("❌ Không thể tải dữ liệu người dùng.")
             return
 
-        recipient_data = get_user_data(recipient.id)
-        if not recipient_data:
-            await ctx.send("❌ Người nhận không hợp lệ hoặc chưa có dữ liệu!")
-            return
-        if pets_name not in user_data['pets']:
-            await ctx.send("❌ Bạn không sở hữu pet này!")
-            return
+        if choice == 'give':
+            if not ctx.message.mentions:
+                await ctx.send("❌ Bạn cần tag người nhận!")
+                return
+            recipient = ctx.message.mentions[0]
+            if recipient.id == ctx.author.id:
+                await ctx.send("❌ Bạn không thể tặng pet cho chính mình!")
+                return
 
-        user_data['pets'].remove(pets_name)
-        recipient_data.setdefault('pets', []).append(pets_name)
-        update_user_data(ctx.author.id, user_data)
-        update_user_data(recipient.id, recipient_data)
-        await ctx.send(f"🎁 {ctx.author.mention} đã tặng pet **{pets_name}** cho {recipient.mention}!")
-        return
-    elif choice == 'buy':
-        if user_data['balance'] < get_pet_price(pets_name):
-            await ctx.send("❌ Số dư không đủ để mua pet này!")
-            return
-        user_data['balance'] -= get_pet_price(pets_name)
-        user_data.setdefault('pets', []).append(pets_name)
-        msg = f"🎉 {ctx.author.mention} đã mua pet **{pets_name}** với giá **{get_pet_price(pets_name):,.2f}** xu!"
-    elif choice == 'sell':
-        if pets_name not in user_data.get('pets', []):
-            await ctx.send("❌ Bạn không sở hữu pet này!")
-            return
-        user_data['pets'].remove(pets_name)
-        user_data['balance'] += get_pet_price(pets_name) * 0.8
-        msg = f"💰 {ctx.author.mention} đã bán pet **{pets_name}** và nhận được **{get_pet_price(pets_name) * 0.8:,.2f}** xu!"
-    elif choice == 'feed':
-        if pets_name not in user_data.get('pets', []):
-            await ctx.send("❌ Bạn không sở hữu pet này!")
-            return
-        feed_cost = 50
-        if user_data['balance'] < feed_cost:
-            await ctx.send("❌ Số dư không đủ để cho ăn pet này!")
+            try:
+                move_user_item(ctx.author.id, recipient.id, pets_name)
+            except InsufficientFunds:
+                await ctx.send("❌ Bạn không sở hữu pet này!")
+                return
+            await ctx.send(f"🎁 {ctx.author.mention} đã tặng pet **{pets_name}** cho {recipient.mention}!")
             return
-        user_data['balance'] -= feed_cost
-        msg = f"🍖 {ctx.author.mention} đã cho pet **{pets_name}** ăn và mất **{feed_cost:,.2f}** xu!"
-    await ctx.send(msg + f' Số dư hiện tại: **{user_data["balance"]:,.2f}** xu.\nDanh sách pet của bạn: **' + ', '.join(user_data.get('pets', [])) + "**")
-    update_user_data(ctx.author.id, user_data)
+        elif choice == 'buy':
+            price = get_pet_price(pets_name)
+            if user_data['balance'] < price:
+                await ctx.send("❌ Số dư không đủ để mua pet này!")
+                return
+            user_data['balance'] -= price
+            user_data.setdefault('pets', []).append(pets_name)
+            msg = f"🎉 {ctx.author.mention} đã mua pet **{pets_name}** với giá **{price:,.2f}** xu!"
+        elif choice == 'sell':
+            if pets_name not in user_data.get('pets', []):
+                await ctx.send("❌ Bạn không sở hữu pet này!")
+                return
+            user_data['pets'].remove(pets_name)
+            refund = get_pet_price(pets_name) * 0.8
+            user_data['balance'] += refund
+            msg = f"💰 {ctx.author.mention} đã bán pet **{pets_name}** và nhận được **{refund:,.2f}** xu!"
+        elif choice == 'feed':
+            if pets_name not in user_data.get('pets', []):
+                await ctx.send("❌ Bạn không sở hữu pet này!")
+                return
+            feed_cost = 50
+            if user_data['balance'] < feed_cost:
+                await ctx.send("❌ Số dư không đủ để cho ăn pet này!")
+                return
+            user_data['balance'] -= feed_cost
+            msg = f"🍖 {ctx.author.mention} đã cho pet **{pets_name}** ăn và mất **{feed_cost:,.2f}** xu!"
+        update_user_data(ctx.author.id, user_data)
+        await ctx.send(msg + f' Số dư hiện tại: **{user_data["balance"]:,.2f}** xu.\nDanh sách pet của bạn: **' + ', '.join(user_data.get('pets', [])) + "**")
 
 @bot.command(name='info')
 async def info(ctx):
@@ -566,8 +725,6 @@ Chào bạn! Mình là **Zero Bot Beta 2.2**, một bot Discord thân thiện đ
             -Facebook: https://www.facebook.com/profile.php?id=61578577050196""")
 
 # --- Rob Command ---
-rob_cooldowns = {}
-
 @bot.command(name='rob', aliases=('cuop', 'trom'))
 async def rob(ctx, member: discord.Member = None):
     if member is None:
@@ -578,52 +735,44 @@ async def rob(ctx, member: discord.Member = None):
         await ctx.send("Bạn không thể tự cướp chính mình!")
         return
     
-    # Cooldown check (1 hour)
-    now = time.time()
-    last_rob = rob_cooldowns.get(ctx.author.id, 0)
-    if now - last_rob < 3600:
-        remaining = 3600 - (now - last_rob)
-        mins = int(remaining // 60)
-        await ctx.send(f"⏳ Bạn cần chờ {mins} phút nữa trước khi cướp tiếp!")
-        return
+    async with user_locks.hold(ctx.author.id, member.id):
+        # Cooldown check (1 hour)
+        remaining = await cooldown_remaining(ctx.author.id, 'rob')
+        if remaining:
+            mins = int(remaining // 60)
+            await ctx.send(f"⏳ Bạn cần chờ {mins} phút nữa trước khi cướp tiếp!")
+            return
     
-    robber_data = get_user_data(ctx.author.id)
-    victim_data = get_user_data(member.id)
+        robber_data = await get_user_data(ctx.author.id)
+        victim_data = await get_user_data(member.id)
     
-    # Victim must have at least 100 coins
-    if victim_data['balance'] < 100:
-        await ctx.send("Nạn nhân không có đủ tiền để cướp!")
-        return
+        # Victim must have at least 100 coins
+        if victim_data['balance'] < games.ROB_MIN_VICTIM_BALANCE:
+            await ctx.send("Nạn nhân không có đủ tiền để cướp!")
+            return
     
-    # 40% success chance
-    if random.random() < 0.4:
-        # Steal 10-25% of victim's balance
-        steal_percent = random.uniform(0.1, 0.25)
-        amount = random.randint(100, 500)
-        
-        victim_data['balance'] -= amount
-        robber_data['balance'] += amount
+        # 40% success chance
+        success, amount = games.rob(robber_data['balance'], victim_data['balance'])
+        if success:
+            robber_data = transfer_money(member.id, ctx.author.id, amount)[str(ctx.author.id)]
         
-        update_user_data(member.id, victim_data)
-        update_user_data(ctx.author.id, robber_data)
-        
-        rob_cooldowns[ctx.author.id] = now
-        await ctx.send(
-            f"💰 {ctx.author.mention} đã cướp thành công {amount:,.2f} xu từ {member.mention}!\n"
-            f"Số dư hiện tại: {robber_data['balance']:,.2f} xu"
-        )
-    else:
-        # Fine for failed robbery
-        fine = min(int(robber_data['balance'] * 0.05), 5000)
-        robber_data['balance'] -= fine
-        update_user_data(ctx.author.id, robber_data)
+            await start_cooldown(ctx.author.id, 'rob', games.ROB_COOLDOWN)
+            await ctx.send(
+                f"💰 {ctx.author.mention} đã cướp thành công {amount:,.2f} xu từ {member.mention}!\n"
+                f"Số dư hiện tại: {robber_data['balance']:,.2f} xu"
+            )
+        else:
+            # Fine for failed robbery
+            fine = amount
+            robber_data['balance'] -= fine
+            update_user_data(ctx.author.id, robber_data)
         
-        rob_cooldowns[ctx.author.id] = now
-        await ctx.send(
-            f"🚨 {ctx.author.mention} đã bị bắt khi cố cướp {member.mention}!\n"
-            f"Bạn bị phạt {fine:,.2f} xu\n"
-            f"Số dư hiện tại: {robber_data['balance']:,.2f} xu"
-        )
+            await start_cooldown(ctx.author.id, 'rob', games.ROB_COOLDOWN)
+            await ctx.send(
+                f"🚨 {ctx.author.mention} đã bị bắt khi cố cướp {member.mention}!\n"
+                f"Bạn bị phạt {fine:,.2f} xu\n"
+                f"Số dư hiện tại: {robber_data['balance']:,.2f} xu"
+            )
 
 # --- Give Money Command ---
 @bot.command(name='give', aliases=('gift', 'tang'))
@@ -640,19 +789,13 @@ async def give(ctx, member: discord.Member = None, amount: int = None):
         await ctx.send("Số tiền phải lớn hơn 0!")
         return
     
-    sender_data = get_user_data(ctx.author.id)
-    receiver_data = get_user_data(member.id)
-    
-    if sender_data['balance'] < amount:
-        await ctx.send("Số dư không đủ để thực hiện giao dịch!")
-        return
-    
-    # Transfer money
-    sender_data['balance'] -= amount
-    receiver_data['balance'] += amount
-    
-    update_user_data(ctx.author.id, sender_data)
-    update_user_data(member.id, receiver_data)
+    async with user_locks.hold(ctx.author.id, member.id):
+        # Trừ và cộng tiền trong cùng một giao dịch
+        try:
+            sender_data = transfer_money(ctx.author.id, member.id, amount)[str(ctx.author.id)]
+        except InsufficientFunds:
+            await ctx.send("Số dư không đủ để thực hiện giao dịch!")
+            return
     
     await ctx.send(
         f"🎁 {ctx.author.mention} đã tặng {amount:,.2f} xu cho {member.mention}!\n"
@@ -663,15 +806,16 @@ async def give(ctx, member: discord.Member = None, amount: int = None):
 @bot.command(name='inventory', aliases=('inv', 'tui'))
 async def inventory(ctx, member: discord.Member = None):
     target = member or ctx.author
-    user_data = get_user_data(target.id)
+    user_data = await get_user_data(target.id)
     inventory = user_data.get('inventory', {})
+    target_name = await user_names.resolve(target.id, ctx.guild)
     
     if not inventory:
-        await ctx.send(f"{'Bạn' if target == ctx.author else target.display_name} chưa có vật phẩm nào!")
+        await ctx.send(f"{'Bạn' if target == ctx.author else target_name} chưa có vật phẩm nào!")
         return
     
     embed = discord.Embed(
-        title=f"🎒 KHO ĐỒ CỦA {target.display_name.upper()}",
+        title=f"🎒 KHO ĐỒ CỦA {target_name.upper()}",
         color=discord.Color.blue()
     )
     
@@ -684,26 +828,23 @@ async def inventory(ctx, member: discord.Member = None):
 
 # --- Work System ---
 @bot.command(name='work', aliases=work_commands[1:])
+@user_locks.locked
 async def work(ctx):
-    user_data = get_user_data(ctx.author.id)
-    now = time.time()
-    last_work = user_data.get('last_work')
-    
     # 30 minutes cooldown
-    if last_work and (now - last_work) < 1800:
-        remaining = 1800 - (now - last_work)
+    remaining = await cooldown_remaining(ctx.author.id, 'work')
+    if remaining:
         mins, secs = divmod(int(remaining), 60)
         await ctx.send(f"⏳ Bạn cần nghỉ ngơi! Thử lại sau {mins} phút {secs} giây")
         return
     
     # Earn between 100-500 coins
-    earnings = random.randint(100, 500)
+    user_data = await get_user_data(ctx.author.id)
+    earnings = games.work_earnings()
     user_data['balance'] += earnings
-    user_data['last_work'] = now
     update_user_data(ctx.author.id, user_data)
+    await start_cooldown(ctx.author.id, 'work', games.WORK_COOLDOWN)
     
-    jobs = ["lập trình", "thiết kế", "nhiếp ảnh", "viết content", "dịch thuật"]
-    job = random.choice(jobs)
+    job = random.choice(games.WORK_JOBS)
     
     await ctx.send(
         f"💼 {ctx.author.mention} đã làm công việc **{job}** và kiếm được **{earnings}** xu!\n"
@@ -711,14 +852,16 @@ async def work(ctx):
     )
 
 # --- Shop System ---
-SHOP_ITEMS = {
+# Bảng giá mặc định khi chưa có shop_items.json, sửa file đó để đổi giá khi bot đang chạy
+SHOP_ITEMS = Catalog(SHOP_ITEMS_FILE, default={
     "diamond": {"price": 5000, "emoji": "💎", "description": "Vật phẩm quý hiếm"},
     "gold": {"price": 1000, "emoji": "🥇", "description": "Vàng nguyên chất"},
     "potion": {"price": 300, "emoji": "🧪", "description": "Thuốc hồi phục"},
     "key": {"price": 2000, "emoji": "🔑", "description": "Chìa khóa bí mật"}
-}
+})
 
 @bot.command(name='shop', aliases=shop_commands[1:])
+@user_locks.locked
 async def shop(ctx, action: str = None, item: str = None, amount: int = 1):
     if action is None:
         embed = discord.Embed(title="🛒 CỬA HÀNG VẬT PHẨM 🛒", color=discord.Color.gold())
@@ -742,8 +885,9 @@ async def shop(ctx, action: str = None, item: str = None, amount: int = 1):
             await ctx.send("Vật phẩm không tồn tại trong cửa hàng!")
             return
         
-        user_data = get_user_data(ctx.author.id)
-        item_price = SHOP_ITEMS[item]["price"] * amount
+        details = SHOP_ITEMS[item]
+        user_data = await get_user_data(ctx.author.id)
+        item_price = details["price"] * amount
         
         if user_data['balance'] < item_price:
             await ctx.send(f"Số dư không đủ! Bạn cần thêm {item_price - user_data['balance']:,.2f} xu")
@@ -757,7 +901,7 @@ async def shop(ctx, action: str = None, item: str = None, amount: int = 1):
         
         update_user_data(ctx.author.id, user_data)
         await ctx.send(
-            f"🎉 {ctx.author.mention} đã mua {amount} {SHOP_ITEMS[item]['emoji']} {item} "
+            f"🎉 {ctx.author.mention} đã mua {amount} {details['emoji']} {item} "
             f"với giá {item_price:,.2f} xu!\n"
             f"Số dư còn lại: {user_data['balance']:,.2f} xu"
         )
@@ -789,16 +933,49 @@ async def hom_nay_an_gi(ctx):
     else:
         await ctx.send(f"Mình nghĩ hôm nay bạn nên nhịn đói!")
 
+@tasks.loop(seconds=USER_FLUSH_INTERVAL)
+async def flush_users():
+    with metrics.timer('storage_flush'):
+        await user_store.flush_async()
+        cooldowns.purge()
+        await cooldowns.flush_async()
+
+# Log và sự kiện được ghi ở thread riêng: xuất cả số liệu hàng đợi của chúng
+metrics.add_collector('zero_server_log', 'Hàng đợi log theo server và FilePool', logger_stats)
+metrics.add_collector('zero_events', 'Hàng đợi ghi sự kiện', events.stats)
+
+@tasks.loop(seconds=METRICS_INTERVAL)
+async def write_metrics():
+    os.makedirs(os.path.dirname(METRICS_FILE) or '.', exist_ok=True)
+    await asyncio.to_thread(atomic_write, METRICS_FILE, metrics.prometheus())
+
+@tasks.loop(seconds=1)
+async def expire_sessions():
+    await game_sessions.expire()
+    outbox.prune()
+
 @tasks.loop(hours=24)
 async def update_server_list():
-    with open("server_list.txt", "w") as f:
+    with open(f"server_list{PROCESS_SUFFIX}.txt", "w") as f:
         for guild in bot.guilds:
             f.writelines(f"Name: {guild.name}; ID: {guild.id}\n")
 
 @bot.event
 async def on_ready(): 
-    update_price.start()
+    if not ECONOMY_ADDRESS:
+        # Process shard không giữ dữ liệu: giá và việc ghi đĩa do process chủ làm
+        update_price.start()
+        flush_users.start()
     update_server_list.start()
+    expire_sessions.start()
+    write_metrics.start()
+    stall_watchdog.watch()
+
+# Chuyển hit/stand... tới phiên tương tác của người gửi (listener, không thay on_message xử lý lệnh)
+@bot.listen('on_message')
+async def route_sessions(message):
+    if not message.author.bot:
+        await game_sessions.dispatch(message)
 
 # --- Ghi Log ---
 
@@ -807,7 +984,8 @@ async def on_ready():
 async def on_member_remove(member):
     guild = member.guild
     logger = get_logger(guild.id)
-    logger.info(f"[LEAVE] {member} đã rời khỏi server.")
+    logger.info(f"[LEAVE] {member} (ID: {member.id}) đã rời khỏi server.")
+    events.emit('member_remove', guild, member, name=str(member))
 
 # --- Tham gia server ---
 @bot.event
@@ -816,13 +994,15 @@ async def on_member_join(member):
     logger = get_logger(guild.id)
 
     logger.info(f"[JOIN] {member} (ID: {member.id}) đã tham gia server.")
+    events.emit('member_join', guild, member, name=str(member))
 
 # --- Tin nhắn bị xoá ---
 @bot.event
 async def on_message_delete(message):
     if message.guild and not message.author.bot:
         logger = get_logger(message.guild.id)
-        logger.info(f"[DELETE] {message.author} in #{message.channel}: {message.content}")
+        logger.info(f"[DELETE] {message.author} ({message.author.id}) in #{message.channel}: {message.content}")
+        events.emit('message_delete', message.guild, message.author, message.channel, message_id=message.id, content=message.content)
 
 # --- Lệnh được sử dụng ---
 @bot.event
@@ -830,26 +1010,30 @@ async def on_command(ctx):
     guild = ctx.guild
     if guild:
         logger = get_logger(guild.id)
-        logger.info(f"[COMMAND] {ctx.author} dùng lệnh: {ctx.message.content}")
+        logger.info(f"[COMMAND] {ctx.author} ({ctx.author.id}) dùng lệnh: {ctx.message.content}")
+        events.emit('command', guild, ctx.author, ctx.channel, command=ctx.command.qualified_name, content=ctx.message.content)
 
 # --- Chỉnh sửa tin nhắn ---
 @bot.event
 async def on_message_edit(before, after):
     if before.guild and not before.author.bot and before.content != after.content:
         logger = get_logger(before.guild.id)
-        logger.info(f"[EDIT] {before.author} in #{before.channel}:\n\t- Trước: {before.content}\n\t- Sau: {after.content}")
+        logger.info(f"[EDIT] {before.author} ({before.author.id}) in #{before.channel}:\n\t- Trước: {before.content}\n\t- Sau: {after.content}")
+        events.emit('message_edit', before.guild, before.author, before.channel, message_id=before.id, before=before.content, after=after.content)
 
 # --- Ban ---
 @bot.event
 async def on_member_ban(guild, user):
     logger = get_logger(guild.id)
     logger.info(f"[BAN] {user} ({user.id}) đã bị ban khỏi server.")
+    events.emit('member_ban', guild, user, name=str(user))
 
 # --- Unban ---
 @bot.event
 async def on_member_unban(guild, user):
     logger = get_logger(guild.id)
     logger.info(f"[UNBAN] {user} ({user.id}) đã được unban.")
+    events.emit('member_unban', guild, user, name=str(user))
 
 # --- Role thay đổi ---
 @bot.event
@@ -860,12 +1044,137 @@ async def on_member_update(before, after):
         removed_roles = [r.name for r in before.roles if r not in after.roles]
 
         if added_roles:
-            logger.info(f"[ROLE ADDED] {after} được thêm role: {', '.join(added_roles)}")
+            logger.info(f"[ROLE ADDED] {after} ({after.id}) được thêm role: {', '.join(added_roles)}")
+            events.emit('role_add', after.guild, after, roles=added_roles)
         if removed_roles:
-            logger.info(f"[ROLE REMOVED] {after} bị gỡ role: {', '.join(removed_roles)}")
+            logger.info(f"[ROLE REMOVED] {after} ({after.id}) bị gỡ role: {', '.join(removed_roles)}")
+            events.emit('role_remove', after.guild, after, roles=removed_roles)
+
+# --- Tìm log ---
+LOG_SEARCH_LIMIT = 10
+
+def parse_log_time(value, end_of_day=False):
+    """'7d', '12h'... tính lùi từ hiện tại, hoặc ngày dạng 'YYYY-MM-DD'"""
+    if value[:-1].isdigit() and value[-1] in HISTORY_UNITS:
+        moment = datetime.now() - timedelta(seconds=int(value[:-1]) * HISTORY_UNITS[value[-1]])
+        return moment.strftime('%Y-%m-%d %H:%M:%S')
+    try:
+        day = datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        return None
+    return day.strftime('%Y-%m-%d') + (' 23:59:59' if end_of_day else ' 00:00:00')
+
+@bot.command(name='logs')
+async def logs(ctx, action: str = None, *filters):
+    syntax = 'Cú pháp: `!z logs search [event:BAN] [user:@người_dùng] [since:7d] [until:2025-08-01] [nội dung]`'
+    if ctx.guild is None:
+        await ctx.send('Lệnh này chỉ dùng được trong server!')
+        return
+    if not ctx.author.guild_permissions.administrator:
+        await ctx.send('❌ Chỉ quản trị viên mới có thể xem log!')
+        return
+    if action != 'search':
+        await ctx.send(syntax)
+        return
+    query = {}
+    words = []
+    for token in filters:
+        key, sep, value = token.partition(':')
+        if not sep or not value or key not in ('event', 'user', 'since', 'until'):
+            words.append(token)
+        elif key == 'event':
+            query['event'] = value.upper().replace('_', ' ')
+        elif key == 'user':
+            query['user_id'] = value.strip('<@!>')
+        else:
+            query[key] = parse_log_time(value, end_of_day=(key == 'until'))
+            if query[key] is None:
+                await ctx.send(syntax)
+                return
+    if words:
+        query['text'] = ' '.join(words)
+    results, stats = await asyncio.to_thread(log_archive.search, LOG_DIR, ctx.guild.id, limit=LOG_SEARCH_LIMIT, **query)
+    if not results:
+        await ctx.send(f"🔎 Không tìm thấy bản ghi nào. (Đã đọc {stats['scanned']}/{stats['segments']} file log nén, {stats['ms']:.0f}ms)")
+        return
+    body = '\n'.join(results)
+    if len(body) > 1800:
+        body = body[:1800] + '\n...'
+    await ctx.send(
+        f"🔎 {len(results)} bản ghi mới nhất (Đã đọc {stats['scanned']}/{stats['segments']} file log nén, {stats['ms']:.0f}ms)\n"
+        f"```\n{body}\n```"
+    )
+
+def format_ms(seconds):
+    return f"{seconds * 1000:.1f}ms"
+
+@bot.command(name='stats')
+async def stats(ctx):
+    if not await bot.is_owner(ctx.author):
+        await ctx.send('❌ Chỉ chủ bot mới có thể xem thống kê!')
+        return
+    uptime = int(time.time() - metrics.started_at)
+    total = sum(metrics.completed.values())
+    errors = sum(metrics.errors.values())
+    embed = discord.Embed(title="📊 Thống kê bot", color=discord.Color.blue())
+    embed.description = f"Uptime: {uptime // 3600}h{uptime % 3600 // 60:02d}m | Lệnh: {total} | Lỗi: {errors}"
+    lines = [
+        f"`{name}` {hist.count} lần, p50 {format_ms(hist.quantile(0.5))}, p99 {format_ms(hist.quantile(0.99))}, tb {format_ms(hist.mean)}"
+        for name, hist in metrics.top_commands()
+    ]
+    embed.add_field(name="Lệnh chạy nhiều nhất", value='\n'.join(lines) or 'Chưa có', inline=False)
+    lines = [
+        f"`{phase}` p50 {format_ms(hist.quantile(0.5))}, p99 {format_ms(hist.quantile(0.99))} ({hist.count} lần)"
+        for phase, hist in metrics.phases.items()
+    ]
+    embed.add_field(name="Lưu trữ và gửi tin nhắn", value='\n'.join(lines), inline=False)
+    lines = [
+        f"`{name}` {per_run:.2f} lần/lệnh ({requests} tin nhắn → {calls:.0f} lần gọi)"
+        for name, requests, calls, per_run in metrics.top_api_commands(5)
+    ]
+    embed.add_field(name="Gọi API Discord", value='\n'.join(lines) or 'Chưa có', inline=False)
+    lines = [
+        f"`{guild_id}` {hist.count} lệnh, p99 {format_ms(hist.quantile(0.99))}"
+        for guild_id, hist in metrics.top_guilds()
+    ]
+    embed.add_field(name="Server bận nhất", value='\n'.join(lines) or 'Chưa có', inline=False)
+    await ctx.send(embed=embed)
+
+@bot.command(name='stalls')
+async def stalls(ctx, detail: str = None):
+    if not await bot.is_owner(ctx.author):
+        await ctx.send('❌ Chỉ chủ bot mới có thể xem thống kê!')
+        return
+    report = stall_watchdog.report(limit=5 if detail == 'full' else 10, stacks=detail == 'full')
+    if len(report) > 1900:
+        report = report[:1900] + '\n...'
+    await ctx.send(f"```\n{report}\n```")
+
+async def run_economy_owner():
+    """Process chủ khi BOT_WORKERS > 1: giữ dữ liệu kinh tế, cập nhật giá và chạy các process shard"""
+    server = cluster.EconomyServer(user_store, get_foxcoin_price, cooldowns=cooldowns)
+    address = await server.start()
+    update_price.start()
+    flush_users.start()
+    stall_watchdog.watch()
+    print(f'Dữ liệu kinh tế phục vụ tại {address}, chạy {BOT_WORKERS} process shard.')
+    try:
+        await cluster.run_workers(os.path.abspath(__file__), BOT_WORKERS, SHARD_COUNT or BOT_WORKERS, address, server.secret)
+    finally:
+        server.close()
 
 # --- Run Bot ---
-if __name__ == '__main__':
+if __name__ == '__main__' and ECONOMY_ADDRESS:
+    # Process shard do process chủ khởi động (xem cluster.run_workers)
+    price_feed.load()
+    price_history.load()
+    try:
+        bot.run(TOKEN)
+    finally:
+        user_store.close()
+        shutdown_logger()
+        events.shutdown()
+elif __name__ == '__main__':
     dotenv.load_dotenv()
     bot_discord_password = os.getenv("BOT_DISCORD_PASSWORD")
     password = input('Nhập mật khẩu để khởi động bot: ')
@@ -876,7 +1185,23 @@ if __name__ == '__main__':
                 time.sleep(0.5)
             print(" " * 50, end='\r')
         print('Bot đã được khởi động.')
-        bot.run(TOKEN)
+        user_store.load()
+        migrate_cooldowns()
+        price_feed.load()
+        price_history.load()
+        try:
+            if BOT_WORKERS > 1:
+                asyncio.run(run_economy_owner())
+            else:
+                bot.run(TOKEN)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            stall_watchdog.stop()
+            user_store.close()
+            cooldowns.close()
+            shutdown_logger()
+            events.shutdown()
         print('Bot đã offline')
     else:
         print('Mật khẩu không chính xác.')
@@ -0,0 +1,178 @@
+import bisect
+import contextlib
+import contextvars
+import time
+from collections import Counter, defaultdict
+
+# Giới hạn trên (giây) của các bucket, giống histogram của Prometheus
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PHASES = ('storage_read', 'storage_write', 'storage_flush', 'discord_send')
+# Số liệu tức thời trong dict của collector (xem Metrics.add_collector), các số còn lại là bộ đếm cộng dồn
+GAUGES = ('queue_depth', 'open_files')
+
+# (tên lệnh, thời điểm bắt đầu) của lệnh đang chạy trong task hiện tại
+_current = contextvars.ContextVar('metrics_current_command', default=None)
+
+
+class Histogram:
+    """Histogram với bucket cố định: ghi nhận O(log số bucket), ước lượng phân vị từ bucket"""
+
+    __slots__ = ('counts', 'count', 'sum', 'max')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # bucket cuối là +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        """Giới hạn trên của bucket chứa phân vị `q` (max nếu rơi vào bucket +Inf)"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else 0.0
+
+
+class Metrics:
+    """Số liệu thời gian chạy lệnh theo tên lệnh và theo server, cùng thời gian lưu trữ và gửi tin nhắn"""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.commands = defaultdict(Histogram)  # tên lệnh -> thời gian chạy
+        self.guilds = defaultdict(Histogram)  # guild_id -> thời gian chạy
+        self.phases = {phase: Histogram() for phase in PHASES}
+        self.phase_seconds = Counter()  # (tên lệnh, phase) -> tổng số giây
+        self.started = Counter()
+        self.completed = Counter()
+        self.errors = Counter()
+        self.discord_requests = Counter()  # tên lệnh -> số tin nhắn lệnh gửi/sửa
+        self.discord_calls = Counter()  # tên lệnh -> số lần gọi API Discord (lần gọi gộp chia đều cho các lệnh trong đó)
+        self.collectors = []  # (tiền tố, mô tả, hàm stats) của các thành phần khác
+
+    def add_collector(self, prefix, help_text, stats):
+        """Xuất thêm dict số liệu `stats()` (ví dụ server_logger.stats) trong prometheus(), tên có tiền tố `prefix`"""
+        self.collectors.append((prefix, help_text, stats))
+
+    def command_started(self, ctx):
+        name = ctx.command.qualified_name
+        self.started[name] += 1
+        _current.set((name, time.perf_counter()))
+
+    def command_finished(self, ctx):
+        current = _current.get()
+        if current is None:
+            return
+        name, start = current
+        elapsed = time.perf_counter() - start
+        _current.set(None)
+        self.commands[name].observe(elapsed)
+        self.guilds[ctx.guild.id if ctx.guild else 'dm'].observe(elapsed)
+        if ctx.command_failed:
+            self.errors[name] += 1
+        else:
+            self.completed[name] += 1
+
+    @contextlib.contextmanager
+    def timer(self, phase):
+        """Đo một đoạn lưu trữ/gửi tin nhắn, cộng vào lệnh đang chạy (nếu có)"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            current = _current.get()
+            self.observe(phase, time.perf_counter() - start, current[0] if current else '-')
+
+    def observe(self, phase, seconds, command='-'):
+        """Ghi một lần đo của `phase` cho lệnh `command` (dùng khi không đo được bằng `timer`)"""
+        self.phases[phase].observe(seconds)
+        self.phase_seconds[command, phase] += seconds
+
+    def discord_request(self, command):
+        self.discord_requests[command] += 1
+
+    def discord_call(self, commands):
+        share = 1 / len(commands)
+        for name in commands:
+            self.discord_calls[name] += share
+
+    def top_api_commands(self, limit=10):
+        """[(tên lệnh, số tin nhắn, số lần gọi API, số lần gọi mỗi lần chạy lệnh)] theo số lần gọi API"""
+        return [
+            (name, self.discord_requests[name], calls, calls / self.started[name] if self.started[name] else calls)
+            for name, calls in self.discord_calls.most_common(limit)
+        ]
+
+    def top_commands(self, limit=10):
+        return sorted(self.commands.items(), key=lambda item: item[1].count, reverse=True)[:limit]
+
+    def top_guilds(self, limit=5):
+        return sorted(self.guilds.items(), key=lambda item: item[1].count, reverse=True)[:limit]
+
+    def prometheus(self):
+        """Xuất toàn bộ số liệu ở định dạng text của Prometheus"""
+        lines = []
+
+        def histogram(name, help_text, label, series):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} histogram')
+            for value, hist in series:
+                labels = f'{label}="{value}",' if label else ''
+                cumulative = 0
+                for bound, count in zip(BUCKETS, hist.counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{{labels}le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_bucket{{{labels}le="+Inf"}} {hist.count}')
+                suffix = '{' + labels.rstrip(',') + '}' if labels else ''
+                lines.append(f'{name}_sum{suffix} {hist.sum:.6f}')
+                lines.append(f'{name}_count{suffix} {hist.count}')
+
+        histogram('zero_command_duration_seconds', 'Thời gian chạy lệnh theo tên lệnh', 'command', sorted(self.commands.items()))
+        histogram('zero_guild_command_duration_seconds', 'Thời gian chạy lệnh theo server', 'guild',
+                  sorted(self.guilds.items(), key=lambda item: str(item[0])))
+        histogram('zero_phase_duration_seconds', 'Thời gian đọc/ghi dữ liệu và gửi tin nhắn Discord', 'phase', self.phases.items())
+        lines.append('# HELP zero_commands_total Số lệnh đã chạy theo kết quả')
+        lines.append('# TYPE zero_commands_total counter')
+        for status, counter in (('ok', self.completed), ('error', self.errors)):
+            for name, count in sorted(counter.items()):
+                lines.append(f'zero_commands_total{{command="{name}",status="{status}"}} {count}')
+        lines.append('# HELP zero_command_phase_seconds_total Tổng thời gian của từng phase trong mỗi lệnh')
+        lines.append('# TYPE zero_command_phase_seconds_total counter')
+        for (name, phase), seconds in sorted(self.phase_seconds.items()):
+            lines.append(f'zero_command_phase_seconds_total{{command="{name}",phase="{phase}"}} {seconds:.6f}')
+        for name, help_text, counter in (
+                ('zero_discord_messages_total', 'Số tin nhắn lệnh gửi/sửa (trước khi gộp)', self.discord_requests),
+                ('zero_discord_api_calls_total', 'Số lần gọi API Discord theo lệnh', self.discord_calls)):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} counter')
+            for command, count in sorted(counter.items()):
+                lines.append(f'{name}{{command="{command}"}} {round(count, 3)}')
+        for prefix, help_text, stats in self.collectors:
+            for key, value in stats().items():
+                gauge = key in GAUGES
+                name = f'{prefix}_{key}' if gauge else f'{prefix}_{key}_total'
+                lines.append(f'# HELP {name} {help_text}: {key}')
+                lines.append(f'# TYPE {name} {"gauge" if gauge else "counter"}')
+                lines.append(f'{name} {round(value, 3)}')
+        lines.append('# HELP zero_uptime_seconds Số giây từ khi bot khởi động')
+        lines.append('# TYPE zero_uptime_seconds gauge')
+        lines.append(f'zero_uptime_seconds {time.time() - self.started_at:.0f}')
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
@@ -0,0 +1,58 @@
+from sortedcontainers import SortedList
+
+
+class NetWorthIndex:
+    """Bảng xếp hạng tổng tài sản (balance + foxcoin × giá) được cập nhật dần.
+
+    Mỗi lần số dư thay đổi chỉ mất O(log n) để cập nhật thứ hạng. Khi giá foxcoin đổi,
+    toàn bộ bảng được tính lại một lần bằng `rebase`. Lấy top K, trang bất kỳ và hạng
+    của một người đều không phải duyệt hết người dùng.
+    """
+
+    def __init__(self, get_price):
+        self.get_price = get_price
+        self.price = None
+        self.holdings = {}  # user_id -> (balance, foxcoin)
+        self.keys = {}  # user_id -> khoá của người dùng trong `ranking`
+        self.ranking = SortedList()
+
+    def _key(self, user_id, balance, foxcoin):
+        # Sắp xếp tăng dần theo -tài sản, cùng tài sản thì theo ID để thứ tự ổn định
+        return (-(balance + foxcoin * self.price), user_id)
+
+    def build(self, users):
+        """Tạo lại bảng xếp hạng từ các cặp (user_id, dữ liệu)"""
+        self.holdings = {uid: (user['balance'], user['foxcoin']) for uid, user in users}
+        self.rebase(self.get_price())
+
+    def rebase(self, price):
+        """Tính lại toàn bộ thứ hạng theo giá foxcoin mới"""
+        self.price = price
+        self.keys = {uid: self._key(uid, balance, foxcoin) for uid, (balance, foxcoin) in self.holdings.items()}
+        self.ranking = SortedList(self.keys.values())
+
+    def update(self, user_id, user_data):
+        holding = (user_data['balance'], user_data['foxcoin'])
+        if self.holdings.get(user_id) == holding:
+            return
+        old_key = self.keys.get(user_id)
+        if old_key is not None:
+            self.ranking.remove(old_key)
+        key = self._key(user_id, *holding)
+        self.holdings[user_id] = holding
+        self.keys[user_id] = key
+        self.ranking.add(key)
+
+    def top(self, limit, offset=0):
+        """Danh sách (user_id, tổng tài sản) từ hạng `offset + 1`"""
+        return [(uid, -neg_worth) for neg_worth, uid in self.ranking.islice(offset, offset + limit)]
+
+    def rank(self, user_id):
+        """Hạng (bắt đầu từ 1) của người dùng, None nếu chưa có dữ liệu"""
+        key = self.keys.get(user_id)
+        if key is None:
+            return None
+        return self.ranking.index(key) + 1
+
+    def __len__(self):
+        return len(self.ranking)
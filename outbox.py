@@ -0,0 +1,206 @@
+import asyncio
+import collections
+import functools
+import logging
+import time
+
+from metrics import metrics
+
+log = logging.getLogger(__name__)
+
+MAX_CONTENT = 2000  # Số ký tự tối đa của một tin nhắn Discord
+MAX_EMBEDS = 10
+
+
+def _finish_background(command, start, future):
+    # Tin nhắn gửi với wait=False: không ai chờ future nên đo thời gian gửi và ghi log lỗi ở đây
+    metrics.observe('discord_send', time.perf_counter() - start, command)
+    if not future.cancelled() and future.exception() is not None:
+        log.warning('Không gửi được tin nhắn lên Discord: %r', future.exception())
+
+
+class RateBucket:
+    """Token bucket: tối đa `capacity` lần gọi liền nhau, hồi lại đều `capacity` lần mỗi `per` giây"""
+
+    __slots__ = ('capacity', 'rate', 'tokens', 'updated')
+
+    def __init__(self, capacity, per, now):
+        self.capacity = capacity
+        self.rate = capacity / per
+        self.tokens = capacity
+        self.updated = now
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, now):
+        """Lấy một lượt gọi: trả về 0 nếu gọi được ngay, nếu không là số giây phải chờ"""
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def full(self, now):
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+class _Pending:
+    """Một lần gọi API đang chờ: gửi tin nhắn mới vào `target` (khi `message` là None) hoặc sửa `message`"""
+
+    __slots__ = ('target', 'message', 'content', 'embeds', 'kwargs', 'mergeable', 'waiters')
+
+    def __init__(self, target, message, content, embeds, kwargs, mergeable):
+        self.target = target
+        self.message = message
+        self.content = content
+        self.embeds = embeds
+        self.kwargs = kwargs
+        self.mergeable = mergeable
+        self.waiters = []  # (future, tên lệnh)
+
+    def can_merge(self, content, embeds):
+        if not self.mergeable:
+            return False
+        length = len(self.content or '') + len(content or '') + 1
+        return length <= MAX_CONTENT and len(self.embeds) + len(embeds) <= MAX_EMBEDS
+
+    def merge(self, content, embeds):
+        if content:
+            self.content = f'{self.content}\n{content}' if self.content else content
+        self.embeds.extend(embeds)
+
+
+class _Channel:
+    __slots__ = ('queue', 'bucket', 'task')
+
+    def __init__(self, bucket):
+        self.queue = collections.deque()
+        self.bucket = bucket
+        self.task = None
+
+
+class Outbox:
+    """Hàng đợi gửi tin nhắn ra Discord theo từng kênh.
+
+    Tin nhắn gửi vào cùng một kênh trong vòng `window` giây, hoặc trong lúc kênh đang chờ rate
+    limit, được gộp thành một tin nhắn (nội dung nối bằng xuống dòng, tối đa 2000 ký tự và 10
+    embed); nhiều lần sửa cùng một tin nhắn chỉ giữ lần gọi cuối. Mỗi kênh có một RateBucket
+    (`rate` lần gọi mỗi `per` giây, như giới hạn của Discord cho mỗi kênh, `rate=None` để tắt)
+    nên lần gọi vượt quá được xếp hàng thay vì bị Discord trả 429.
+
+    Mỗi lần gọi API được ghi vào metrics, chia đều cho các lệnh có tin nhắn trong lần gọi đó.
+
+    Với `wait=False`, `send`/`edit` chỉ xếp lần gọi vào hàng đợi và trả về future của Message;
+    thời gian tới khi gửi xong được ghi vào phase discord_send của metrics và lỗi được ghi log.
+    """
+
+    def __init__(self, window=0.05, rate=5, per=5.0):
+        self.window = window
+        self.rate = rate
+        self.per = per
+        self.channels = {}  # channel_id -> _Channel
+        self.requests = 0
+        self.api_calls = 0
+
+    def _channel(self, channel_id):
+        state = self.channels.get(channel_id)
+        if state is None:
+            bucket = RateBucket(self.rate, self.per, time.monotonic()) if self.rate else None
+            state = self.channels[channel_id] = _Channel(bucket)
+        return state
+
+    async def send(self, channel, content=None, *, command='-', coalesce=True, wait=True, embed=None, embeds=None, **kwargs):
+        """Gửi tin nhắn vào `channel`, trả về Message chứa nó (có thể chung với tin nhắn khác).
+
+        Tin nhắn có tham số khác (file, view, reference...) hoặc `coalesce=False` (ví dụ tin nhắn
+        sẽ được sửa lại sau) được gửi riêng.
+        """
+        content = None if content is None else str(content)
+        embeds = list(embeds or ()) + ([embed] if embed is not None else [])
+        mergeable = coalesce and not kwargs
+        state = self._channel(channel.id)
+        last = state.queue[-1] if state.queue else None
+        if mergeable and last is not None and last.can_merge(content, embeds):
+            last.merge(content, embeds)
+            item = last
+        else:
+            item = _Pending(channel, None, content, embeds, kwargs, mergeable)
+            state.queue.append(item)
+        return await self._wait(state, item, command, wait)
+
+    async def edit(self, message, *, command='-', wait=True, **fields):
+        """Sửa `message` (content=..., embed=...), gộp với lần sửa cùng tin nhắn đang chờ"""
+        state = self._channel(message.channel.id)
+        for item in state.queue:
+            if item.message is not None and item.message.id == message.id:
+                item.kwargs.update(fields)
+                break
+        else:
+            item = _Pending(None, message, None, [], dict(fields), False)
+            state.queue.append(item)
+        return await self._wait(state, item, command, wait)
+
+    async def _wait(self, state, item, command, wait):
+        future = asyncio.get_running_loop().create_future()
+        item.waiters.append((future, command))
+        self.requests += 1
+        metrics.discord_request(command)
+        if state.task is None:
+            state.task = asyncio.create_task(self._drain(state))
+        if not wait:
+            future.add_done_callback(functools.partial(_finish_background, command, time.perf_counter()))
+            return future
+        return await future
+
+    async def _drain(self, state):
+        item = None
+        try:
+            if self.window:
+                await asyncio.sleep(self.window)
+            while state.queue:
+                if state.bucket is not None:
+                    delay = state.bucket.acquire(time.monotonic())
+                    if delay:
+                        await asyncio.sleep(delay)
+                        continue
+                item = state.queue.popleft()
+                await self._call(item)
+                item = None
+        finally:
+            state.task = None
+            # Task bị huỷ (ví dụ khi tắt bot): huỷ future của các lần gọi chưa xong để không lệnh nào chờ mãi
+            unsent = ([item] if item is not None else []) + list(state.queue)
+            state.queue.clear()
+            for pending in unsent:
+                for future, _ in pending.waiters:
+                    future.cancel()
+
+    async def _call(self, item):
+        self.api_calls += 1
+        metrics.discord_call([command for _, command in item.waiters])
+        try:
+            if item.message is None:
+                extra = {'embeds': item.embeds} if item.embeds else {}
+                result = await item.target.send(item.content, **extra, **item.kwargs)
+            else:
+                result = await item.message.edit(**item.kwargs)
+        except Exception as e:
+            for future, _ in item.waiters:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for future, _ in item.waiters:
+            if not future.done():
+                future.set_result(result)
+
+    def prune(self):
+        """Bỏ trạng thái của các kênh không còn gì chờ gửi và đã hồi đủ lượt gọi"""
+        now = time.monotonic()
+        idle = [channel_id for channel_id, state in self.channels.items()
+                if state.task is None and not state.queue and (state.bucket is None or state.bucket.full(now))]
+        for channel_id in idle:
+            del self.channels[channel_id]
+        return len(idle)
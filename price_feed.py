@@ -0,0 +1,76 @@
+import csv
+import os
+from collections import deque
+from datetime import datetime
+
+
+def read_tail_rows(path, count, block_size=8192):
+    """Đọc `count` dòng cuối của file CSV mà không phải đọc cả file"""
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        end = f.tell()
+        pos = end
+        chunk = b''
+        while pos > 0 and chunk.count(b'\n') <= count:
+            step = min(block_size, pos)
+            pos -= step
+            f.seek(pos)
+            chunk = f.read(step) + chunk
+    lines = chunk.decode('utf-8').splitlines()
+    if pos > 0:
+        # Dòng đầu tiên có thể bị cắt giữa chừng
+        lines = lines[1:]
+    return list(csv.reader(lines[-count:]))
+
+
+class PriceFeed:
+    """Giữ giá foxcoin hiện tại và lịch sử gần đây (ring buffer) trong bộ nhớ.
+
+    File CSV chỉ được đọc phần cuối một lần khi khởi động và chỉ được ghi nối khi có giá mới,
+    các lệnh đọc giá không bao giờ chạm tới file.
+    """
+
+    def __init__(self, path, history_size=168, default_price=10.0):
+        self.path = path
+        self.default_price = default_price
+        self.history = deque(maxlen=history_size)  # (timestamp, price), mới nhất ở cuối
+        self.loaded = False
+
+    def load(self):
+        if self.loaded:
+            return
+        self.loaded = True
+        if not os.path.exists(self.path):
+            return
+        for row in read_tail_rows(self.path, self.history.maxlen):
+            if len(row) != 2 or row[0] == 'timestamp':
+                continue
+            self.history.append((row[0], float(row[1])))
+
+    def reload(self):
+        """Bỏ dữ liệu trong bộ nhớ để lần đọc sau đọc lại file (khi process khác đã ghi giá mới)"""
+        self.history.clear()
+        self.loaded = False
+
+    def current(self):
+        self.load()
+        if not self.history:
+            return self.default_price
+        return self.history[-1][1]
+
+    def recent(self, count=None):
+        """Danh sách (timestamp, price) gần nhất, cũ nhất trước"""
+        self.load()
+        rows = list(self.history)
+        return rows if count is None else rows[-count:]
+
+    def append(self, price):
+        self.load()
+        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M')
+        new_file = not os.path.exists(self.path)
+        with open(self.path, 'a', newline='') as f:
+            writer = csv.writer(f)
+            if new_file:
+                writer.writerow(['timestamp', 'price'])
+            writer.writerow([timestamp, price])
+        self.history.append((timestamp, price))
@@ -0,0 +1,152 @@
+import csv
+import os
+from datetime import datetime
+
+import numpy as np
+
+from journal import atomic_write
+
+TICK_DTYPE = np.dtype([('t', '<i8'), ('p', '<f8')])
+CANDLE_DTYPE = np.dtype([('t', '<i8'), ('o', '<f8'), ('h', '<f8'), ('l', '<f8'), ('c', '<f8')])
+
+HOUR = 3600
+DAY = 24 * HOUR
+WEEK = 7 * DAY
+# Ngày 1/1/1970 là thứ Năm, dịch 3 ngày để tuần bắt đầu từ thứ Hai
+WEEK_OFFSET = 3 * DAY
+
+
+def to_candles(ticks):
+    """Mỗi tick thành một nến có open = high = low = close"""
+    candles = np.empty(len(ticks), dtype=CANDLE_DTYPE)
+    candles['t'] = ticks['t']
+    for field in ('o', 'h', 'l', 'c'):
+        candles[field] = ticks['p']
+    return candles
+
+
+def resample(candles, width, offset=0):
+    """Gộp các nến (đã sắp xếp theo thời gian) thành nến OHLC có độ dài `width` giây"""
+    if len(candles) == 0:
+        return candles
+    buckets = (candles['t'] + offset) // width
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(buckets)) + 1))
+    ends = np.concatenate((starts[1:], [len(candles)])) - 1
+    result = np.empty(len(starts), dtype=CANDLE_DTYPE)
+    result['t'] = buckets[starts] * width - offset
+    result['o'] = candles['o'][starts]
+    result['h'] = np.maximum.reduceat(candles['h'], starts)
+    result['l'] = np.minimum.reduceat(candles['l'], starts)
+    result['c'] = candles['c'][ends]
+    return result
+
+
+class PriceHistory:
+    """Lưu lịch sử giá foxcoin dạng nhị phân theo cột, hỗ trợ gộp nến OHLC bằng NumPy.
+
+    - `<name>.bin`: các tick gốc (int64 thời gian unix, float64 giá), 16 byte/tick
+    - `<name>_1h.bin`: nến 1 giờ của các tick cũ hơn `raw_retention` giây đã được gộp lại
+
+    Lần đầu chạy, dữ liệu được nhập từ file CSV cũ `csv_path` (nếu có).
+    """
+
+    def __init__(self, path, csv_path=None, raw_retention=30 * DAY):
+        self.tick_path = path
+        self.csv_path = csv_path
+        self.candle_path = os.path.splitext(path)[0] + '_1h.bin'
+        self.raw_retention = raw_retention
+        self.ticks = None
+        self.candles = None
+        self._pending = []
+
+    def load(self):
+        if self.ticks is not None:
+            return
+        if not os.path.exists(self.tick_path) and self.csv_path and os.path.exists(self.csv_path):
+            self._import_csv(self.csv_path)
+        self.ticks = self._read(self.tick_path, TICK_DTYPE)
+        self.candles = self._read(self.candle_path, CANDLE_DTYPE)
+        if len(self.candles):
+            # Bỏ các tick đã được gộp thành nến (nếu bot crash giữa lúc downsample)
+            covered = self.candles['t'][-1] + HOUR
+            self.ticks = self.ticks[np.searchsorted(self.ticks['t'], covered):]
+
+    def reload(self):
+        """Bỏ dữ liệu trong bộ nhớ để lần đọc sau đọc lại file (khi process khác đã ghi giá mới)"""
+        self.ticks = None
+        self.candles = None
+        self._pending = []
+
+    @staticmethod
+    def _read(path, dtype):
+        if not os.path.exists(path):
+            return np.empty(0, dtype=dtype)
+        return np.fromfile(path, dtype=dtype)
+
+    @staticmethod
+    def _write(path, array):
+        atomic_write(path, array.tobytes())
+
+    def _import_csv(self, csv_path):
+        """Chuyển foxcoin_price.csv cũ sang định dạng nhị phân (chỉ chạy một lần)"""
+        rows = []
+        with open(csv_path, 'r', newline='') as f:
+            for row in csv.reader(f):
+                if len(row) != 2 or row[0] == 'timestamp':
+                    continue
+                rows.append((int(datetime.strptime(row[0], '%Y-%m-%d %H:%M').timestamp()), float(row[1])))
+        ticks = np.array(rows, dtype=TICK_DTYPE)
+        ticks.sort(order='t', kind='stable')
+        self._write(self.tick_path, ticks)
+
+    def append(self, price, timestamp=None):
+        self.load()
+        tick = np.array([(int(timestamp if timestamp is not None else datetime.now().timestamp()), price)], dtype=TICK_DTYPE)
+        with open(self.tick_path, 'ab') as f:
+            tick.tofile(f)
+        self._pending.append(tick)
+
+    def _all_ticks(self):
+        if self._pending:
+            self.ticks = np.concatenate([self.ticks] + self._pending)
+            self._pending = []
+        return self.ticks
+
+    def downsample(self, now=None):
+        """Gộp các tick cũ hơn `raw_retention` thành nến 1 giờ và xoá khỏi file tick"""
+        self.load()
+        ticks = self._all_ticks()
+        now = now if now is not None else datetime.now().timestamp()
+        cutoff = int(now - self.raw_retention) // HOUR * HOUR
+        split = np.searchsorted(ticks['t'], cutoff)
+        if split == 0:
+            return 0
+        old = resample(to_candles(ticks[:split]), HOUR)
+        self.candles = np.concatenate([self.candles, old])
+        self.ticks = ticks[split:]
+        # Ghi file nến trước, nếu crash trước khi ghi file tick thì `load` sẽ bỏ qua các tick đã gộp
+        self._write(self.candle_path, self.candles)
+        self._write(self.tick_path, self.ticks)
+        return int(split)
+
+    def ohlc(self, start, end, width):
+        """Nến OHLC độ dài `width` giây trong khoảng thời gian [start, end)"""
+        self.load()
+        ticks = self._all_ticks()
+        candles = self.candles
+        candles = candles[np.searchsorted(candles['t'], start):np.searchsorted(candles['t'], end)]
+        ticks = ticks[np.searchsorted(ticks['t'], start):np.searchsorted(ticks['t'], end)]
+        merged = np.concatenate([candles, to_candles(ticks)])
+        return resample(merged, width, WEEK_OFFSET if width == WEEK else 0)
+
+    def first_time(self):
+        """Thời điểm của dữ liệu giá cũ nhất (None nếu chưa có dữ liệu)"""
+        self.load()
+        if len(self.candles):
+            return int(self.candles['t'][0])
+        ticks = self._all_ticks()
+        return int(ticks['t'][0]) if len(ticks) else None
+
+    def tick_count(self):
+        self.load()
+        return len(self._all_ticks())
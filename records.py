@@ -0,0 +1,372 @@
+import json
+import struct
+from array import array
+from collections.abc import MutableMapping
+from datetime import datetime, timedelta
+
+# Bản ghi người dùng gọn: mỗi người là một object có __slots__ thay vì dict, pet và vật phẩm
+# được lưu bằng mã số nguyên (uint16) trong bytes thay vì list/dict các chuỗi. Bản ghi vẫn
+# dùng được như dict (user_data['balance'], .get, .setdefault...) nên code của lệnh không đổi.
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+_MAX_EXACT_INT = 2 ** 53  # Số nguyên lớn hơn không lưu chính xác được bằng float64
+
+
+class Codebook:
+    """Bảng mã tên <-> số nguyên. Mã được cấp theo thứ tự gặp lần đầu và không bao giờ đổi"""
+
+    def __init__(self, names=()):
+        self.names = []
+        self.codes = {}
+        for name in names:
+            self.code(name)
+
+    def code(self, name):
+        code = self.codes.get(name)
+        if code is None:
+            code = self.codes[name] = len(self.names)
+            self.names.append(name)
+        return code
+
+    def __len__(self):
+        return len(self.names)
+
+
+PETS = Codebook()
+ITEMS = Codebook()
+
+
+def _to_micros(value):
+    return None if value is None else (datetime.fromisoformat(value) - _EPOCH) // _MICROSECOND
+
+
+def _from_micros(value):
+    return None if value is None else (_EPOCH + value * _MICROSECOND).isoformat()
+
+
+class CodedList:
+    """Danh sách pet của một bản ghi, đọc/ghi thẳng vào mã uint16 lưu trong bản ghi"""
+
+    __slots__ = ('record',)
+
+    def __init__(self, record):
+        self.record = record
+
+    def _codes(self):
+        return array('H', self.record.pet_codes)
+
+    def __iter__(self):
+        names = PETS.names
+        return (names[code] for code in self._codes())
+
+    def __len__(self):
+        return len(self.record.pet_codes) // 2
+
+    def __getitem__(self, index):
+        return list(self)[index]
+
+    def __contains__(self, name):
+        code = PETS.codes.get(name)
+        return code is not None and code in self._codes()
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __repr__(self):
+        return repr(list(self))
+
+    def append(self, name):
+        self.record.pet_codes += array('H', (PETS.code(name),)).tobytes()
+
+    def remove(self, name):
+        codes = self._codes()
+        code = PETS.codes.get(name)
+        if code is None:
+            raise ValueError(f'{name!r} không có trong danh sách')
+        codes.remove(code)
+        self.record.pet_codes = codes.tobytes()
+
+
+class UserRecord(MutableMapping):
+    """Bản ghi người dùng gọn, dùng được như dict với các khoá balance, last_daily, foxcoin,
+    pets, last_work, inventory. Khoá khác (hoặc giá trị không mã hoá được) nằm trong `extra`.
+    """
+
+    __slots__ = ('balance', 'foxcoin', 'daily', 'last_work', 'pet_codes', 'inventory_codes', 'extra')
+
+    def __init__(self, balance=0, foxcoin=0):
+        self.balance = balance
+        self.foxcoin = foxcoin
+        self.daily = None  # last_daily tính bằng micro giây từ 1970 (giờ địa phương như datetime.now())
+        self.last_work = None
+        self.pet_codes = None  # bytes các mã uint16, None: chưa có khoá 'pets'
+        self.inventory_codes = None  # bytes các cặp (mã, số lượng) uint32
+        self.extra = None
+
+    @classmethod
+    def from_dict(cls, data):
+        record = cls(data.get('balance', 0), data.get('foxcoin', 0))
+        for key, value in data.items():
+            if key not in ('balance', 'foxcoin'):
+                record[key] = value
+        return record
+
+    def to_dict(self):
+        return dict(self.items())
+
+    def get(self, key, default=None):
+        # Nhanh hơn Mapping.get (không cần try/except) với các trường hay dùng
+        if key == 'balance':
+            return self.balance
+        if key == 'foxcoin':
+            return self.foxcoin
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def setdefault(self, key, default=None):
+        # Mapping.setdefault trả về `default`, nhưng pets/inventory được lưu dưới dạng mã nên sửa
+        # `default` sau đó không vào bản ghi: trả về giá trị đang nằm trong bản ghi
+        if key not in self:
+            self[key] = default
+        value = self[key]
+        if key == 'inventory' and self.inventory_codes is not None:
+            # dict giải mã từ mã số là bản sao: chuyển sang extra để người gọi sửa trực tiếp
+            self.inventory_codes = None
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+        return value
+
+    def __getitem__(self, key):
+        if key == 'balance':
+            return self.balance
+        if key == 'foxcoin':
+            return self.foxcoin
+        if key == 'last_daily' and (self.daily is not None or not self.extra or key not in self.extra):
+            return _from_micros(self.daily)
+        if key == 'pets' and self.pet_codes is not None:
+            return CodedList(self)
+        if key == 'last_work' and self.last_work is not None:
+            return self.last_work
+        if key == 'inventory' and self.inventory_codes is not None:
+            pairs = array('I', self.inventory_codes)
+            return {ITEMS.names[pairs[i]]: pairs[i + 1] for i in range(0, len(pairs), 2)}
+        if self.extra is not None and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key == 'balance':
+            self.balance = value
+        elif key == 'foxcoin':
+            self.foxcoin = value
+        elif key == 'last_daily' and (value is None or isinstance(value, str)):
+            self.daily = _to_micros(value)
+        elif key == 'pets' and isinstance(value, (list, tuple, CodedList)):
+            self.pet_codes = array('H', [PETS.code(name) for name in value]).tobytes()
+        elif key == 'last_work' and isinstance(value, (int, float)):
+            self.last_work = value
+        elif key == 'inventory' and isinstance(value, dict) and all(
+                isinstance(quantity, int) and 0 <= quantity < 2 ** 32 for quantity in value.values()):
+            pairs = array('I')
+            for item, quantity in value.items():
+                pairs.append(ITEMS.code(item))
+                pairs.append(quantity)
+            self.inventory_codes = pairs.tobytes()
+        else:
+            # Giá trị không mã hoá được: giữ nguyên trong extra
+            self._clear(key)
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+            return
+        if self.extra is not None:
+            self.extra.pop(key, None)
+
+    def _clear(self, key):
+        # Xoá giá trị ở dạng gọn, trả về True nếu có
+        if key == 'last_daily' and self.daily is not None:
+            self.daily = None
+        elif key == 'pets' and self.pet_codes is not None:
+            self.pet_codes = None
+        elif key == 'last_work' and self.last_work is not None:
+            self.last_work = None
+        elif key == 'inventory' and self.inventory_codes is not None:
+            self.inventory_codes = None
+        else:
+            return False
+        return True
+
+    def __delitem__(self, key):
+        if key in ('balance', 'foxcoin', 'last_daily'):
+            raise KeyError(f'Không thể xoá trường bắt buộc {key!r}')
+        if not self._clear(key):
+            if self.extra is None or key not in self.extra:
+                raise KeyError(key)
+            del self.extra[key]
+
+    def __iter__(self):
+        yield 'balance'
+        yield 'last_daily'
+        yield 'foxcoin'
+        if self.pet_codes is not None:
+            yield 'pets'
+        if self.last_work is not None:
+            yield 'last_work'
+        if self.inventory_codes is not None:
+            yield 'inventory'
+        if self.extra:
+            yield from (key for key in self.extra if key != 'last_daily')
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f'UserRecord({self.to_dict()!r})'
+
+
+def as_record(data):
+    return data if isinstance(data, UserRecord) else UserRecord.from_dict(data)
+
+
+def to_json(value):
+    """Dùng làm `default` của json.dumps để ghi bản ghi gọn như dict thường"""
+    if isinstance(value, UserRecord):
+        return value.to_dict()
+    if isinstance(value, CodedList):
+        return list(value)
+    raise TypeError(f'Không thể chuyển {type(value).__name__} sang JSON')
+
+
+# --- Codec nhị phân ---
+#
+# File: MAGIC, độ dài header (uint32), header JSON {"count", "pets", "items"} (bảng mã lúc ghi),
+# rồi mỗi người dùng một RECORD_HEAD (little-endian) theo sau là các mã pet (uint16), các cặp
+# vật phẩm (uint32) theo thứ tự byte của máy (little-endian trên x86/ARM) và `extra` dạng JSON.
+
+MAGIC = b'ZUR1'
+RECORD_HEAD = struct.Struct('<QBddqdHHI')  # id, cờ, balance, foxcoin, daily, last_work, số pet, số cặp, độ dài extra
+_LENGTH = struct.Struct('<I')
+
+BALANCE_INT = 1
+FOXCOIN_INT = 2
+HAS_DAILY = 4
+HAS_WORK = 8
+HAS_PETS = 16
+HAS_INVENTORY = 32
+
+
+def _number(value, flag, key, extra):
+    # Trả về (float64, cờ nếu là số nguyên); số không lưu chính xác được thì để vào extra
+    if isinstance(value, float):
+        return value, 0
+    if isinstance(value, int) and -_MAX_EXACT_INT <= value <= _MAX_EXACT_INT:
+        return float(value), flag
+    extra[key] = value
+    return 0.0, 0
+
+
+def encode_header(count, pets=None, items=None):
+    """MAGIC + header của file có `count` bản ghi, mặc định với bảng mã hiện tại"""
+    header = json.dumps({'count': count, 'pets': PETS.names if pets is None else pets,
+                         'items': ITEMS.names if items is None else items}, ensure_ascii=False).encode('utf-8')
+    return MAGIC + _LENGTH.pack(len(header)) + header
+
+
+def encode_record(user_id, record):
+    """Mã hoá một bản ghi (UserRecord hoặc dict), không kèm header.
+
+    Mã pet/vật phẩm không bao giờ đổi nên bytes này vẫn đúng với header ghi sau đó.
+    """
+    record = as_record(record)
+    extra = dict(record.extra) if record.extra else {}
+    balance, flags = _number(record.balance, BALANCE_INT, 'balance', extra)
+    foxcoin, flag = _number(record.foxcoin, FOXCOIN_INT, 'foxcoin', extra)
+    flags |= flag
+    if record.daily is not None:
+        flags |= HAS_DAILY
+    if record.last_work is not None:
+        flags |= HAS_WORK
+    pets = record.pet_codes
+    if pets is not None:
+        flags |= HAS_PETS
+    inventory = record.inventory_codes
+    if inventory is not None:
+        flags |= HAS_INVENTORY
+    extra_bytes = json.dumps(extra, ensure_ascii=False, separators=(',', ':')).encode('utf-8') if extra else b''
+    head = RECORD_HEAD.pack(
+        int(user_id), flags, balance, foxcoin, record.daily or 0, record.last_work or 0.0,
+        len(pets) // 2 if pets else 0, len(inventory) // 8 if inventory else 0, len(extra_bytes),
+    )
+    return b''.join((head, pets or b'', inventory or b'', extra_bytes))
+
+
+def encode_records(data):
+    """Mã hoá dict {user_id: bản ghi} (UserRecord hoặc dict) thành bytes"""
+    return encode_header(len(data)) + b''.join([encode_record(user_id, record) for user_id, record in data.items()])
+
+
+def _remap(codebook, names):
+    # Đổi mã trong file sang mã trong bộ nhớ; None nếu hai bảng mã trùng nhau
+    codes = [codebook.code(name) for name in names]
+    if codes == list(range(len(codes))):
+        return None
+    return codes
+
+
+def decode_records(payload, blobs=None):
+    """Giải mã bytes của encode_records thành dict {user_id (str): UserRecord}.
+
+    Nếu có dict `blobs`, bytes của từng bản ghi (như encode_record) được ghi vào đó, trừ khi mã
+    pet/vật phẩm trong file khác bảng mã trong bộ nhớ (khi đó `blobs` để trống).
+    """
+    view = memoryview(payload)
+    if bytes(view[:4]) != MAGIC:
+        raise ValueError('Không phải file bản ghi người dùng (sai MAGIC)')
+    (header_size,) = _LENGTH.unpack_from(view, 4)
+    offset = 8 + header_size
+    header = json.loads(bytes(view[8:offset]).decode('utf-8'))
+    pet_map = _remap(PETS, header['pets'])
+    item_map = _remap(ITEMS, header['items'])
+    unpack = RECORD_HEAD.unpack_from
+    head_size = RECORD_HEAD.size
+    if pet_map is not None or item_map is not None:
+        blobs = None
+    data = {}
+    for _ in range(header['count']):
+        start = offset
+        user_id, flags, balance, foxcoin, daily, last_work, pet_count, pair_count, extra_size = unpack(view, offset)
+        offset += head_size
+        record = UserRecord(int(balance) if flags & BALANCE_INT else balance,
+                            int(foxcoin) if flags & FOXCOIN_INT else foxcoin)
+        if flags & HAS_DAILY:
+            record.daily = daily
+        if flags & HAS_WORK:
+            record.last_work = last_work
+        if flags & HAS_PETS:
+            end = offset + pet_count * 2
+            pets = bytes(view[offset:end])
+            if pet_map is not None:
+                pets = array('H', [pet_map[code] for code in array('H', pets)]).tobytes()
+            record.pet_codes = pets
+            offset = end
+        if flags & HAS_INVENTORY:
+            end = offset + pair_count * 8
+            inventory = bytes(view[offset:end])
+            if item_map is not None:
+                pairs = array('I', inventory)
+                pairs[::2] = array('I', [item_map[code] for code in pairs[::2]])
+                inventory = pairs.tobytes()
+            record.inventory_codes = inventory
+            offset = end
+        if extra_size:
+            for key, value in json.loads(bytes(view[offset:offset + extra_size]).decode('utf-8')).items():
+                record[key] = value
+            offset += extra_size
+        data[str(user_id)] = record
+        if blobs is not None:
+            blobs[str(user_id)] = bytes(view[start:offset])
+    return data
@@ -1,27 +1,181 @@
-import logging
-import os
-
-loggers = {}  # Lưu trữ logger theo server ID
-
-def get_logger(guild_id):
-    """Trả về logger cho một server cụ thể"""
-    log_filename = f"logs/{guild_id}.log"
-
-    if guild_id in loggers:
-        return loggers[guild_id]
-
-    # Tạo thư mục nếu chưa có
-    if not os.path.exists("logs"):
-        os.makedirs("logs")
-
-    logger = logging.getLogger(str(guild_id))
-    logger.setLevel(logging.INFO)
-
-    if not logger.handlers:
-        handler = logging.FileHandler(log_filename, encoding="utf-8")
-        formatter = logging.Formatter("[%(asctime)s] %(message)s", "%Y-%m-%d %H:%M:%S")
-        handler.setFormatter(formatter)
-        logger.addHandler(handler)
-
-    loggers[guild_id] = logger
-    return logger
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import log_archive
+from batch_writer import BatchWriter
+
+LOG_DIR = "logs"
+MAX_OPEN_FILES = int(os.getenv("LOG_MAX_OPEN_FILES", 128))  # Số file log tối đa được mở cùng lúc
+ROTATE_BYTES = int(os.getenv("LOG_ROTATE_BYTES", 5 * 1024 * 1024))  # Nén file log khi vượt quá kích thước này
+ROTATE_SECONDS = float(os.getenv("LOG_ROTATE_SECONDS", 7 * 24 * 3600))  # hoặc khi file đã ghi lâu hơn số giây này
+
+
+class FilePool:
+    """Giữ tối đa `max_open` file log đang mở, đóng file của server ít dùng nhất (LRU).
+
+    File bị đóng sẽ được mở lại ở chế độ append khi server đó có log mới.
+    """
+
+    def __init__(self, max_open=128):
+        self.max_open = max_open
+        self.files = OrderedDict()
+        self.started = {}  # Thời điểm bản ghi đầu tiên của file log đang ghi
+        self.seen = set()  # Các server đã từng được mở file, để đếm số lần mở lại
+        self.hits = 0
+        self.opens = 0
+        self.reopens = 0
+        self.evictions = 0
+        self.reopen_seconds = 0.0
+
+    def get(self, guild_id):
+        f = self.files.get(guild_id)
+        if f is not None:
+            self.hits += 1
+            self.files.move_to_end(guild_id)
+            return f
+        start = time.perf_counter()
+        os.makedirs(LOG_DIR, exist_ok=True)
+        path = f"{LOG_DIR}/{guild_id}.log"
+        self.started[guild_id] = log_archive.first_timestamp(path) or time.time()
+        f = open(path, "a", encoding="utf-8")
+        self.opens += 1
+        if guild_id in self.seen:
+            self.reopens += 1
+            self.reopen_seconds += time.perf_counter() - start
+        self.seen.add(guild_id)
+        self.files[guild_id] = f
+        while len(self.files) > self.max_open:
+            old_id, old = self.files.popitem(last=False)
+            old.close()
+            del self.started[old_id]
+            self.evictions += 1
+        return f
+
+    def discard(self, guild_id):
+        f = self.files.pop(guild_id, None)
+        if f is not None:
+            f.close()
+            del self.started[guild_id]
+
+    def close(self):
+        for f in self.files.values():
+            f.close()
+        self.files.clear()
+        self.started.clear()
+
+    def stats(self):
+        return {
+            "open_files": len(self.files),
+            "hits": self.hits,
+            "opens": self.opens,
+            "reopens": self.reopens,
+            "evictions": self.evictions,
+            "reopen_ms": self.reopen_seconds * 1000,
+        }
+
+
+class LogWriter(BatchWriter):
+    """Thread nền ghi log xuống đĩa, event loop chỉ việc đưa (guild_id, dòng log) vào hàng đợi.
+
+    Các dòng log được gom theo server và ghi khi đủ `batch_size` dòng hoặc sau
+    `flush_interval` giây (xem BatchWriter). Nếu hàng đợi đầy, dòng log bị bỏ và được đếm vào `dropped`.
+    File log được giữ trong FilePool (chỉ thread này dùng) để giới hạn số file mở.
+    Khi file vượt `rotate_bytes` hoặc cũ hơn `rotate_seconds`, nó được nén vào logs/archive (xem log_archive).
+    """
+
+    def __init__(self, max_queue=10000, batch_size=256, flush_interval=1.0, max_open_files=128,
+                 rotate_bytes=5 * 1024 * 1024, rotate_seconds=7 * 24 * 3600):
+        super().__init__("server-logger", max_queue, batch_size, flush_interval)
+        self.files = FilePool(max_open_files)
+        self.rotate_bytes = rotate_bytes
+        self.rotate_seconds = rotate_seconds
+        self.rotations = 0
+
+    def _write(self, batch):
+        pending = {}
+        for guild_id, line in batch:
+            pending.setdefault(guild_id, []).append(line)
+        for guild_id, lines in pending.items():
+            f = self.files.get(guild_id)
+            f.write("\n".join(lines) + "\n")
+            f.flush()
+            if f.tell() >= self.rotate_bytes or time.time() - self.files.started[guild_id] >= self.rotate_seconds:
+                self._rotate(guild_id)
+
+    def _rotate(self, guild_id):
+        self.files.discard(guild_id)
+        try:
+            log_archive.archive_segment(LOG_DIR, guild_id, f"{LOG_DIR}/{guild_id}.log")
+            self.rotations += 1
+        except OSError:
+            logging.getLogger(__name__).exception("Không thể nén file log của server %s", guild_id)
+
+    def _close(self):
+        self.files.close()
+
+    def stats(self):
+        result = super().stats()
+        result["rotations"] = self.rotations
+        result.update(self.files.stats())
+        return result
+
+
+class QueuedGuildHandler(logging.Handler):
+    """Handler chỉ format dòng log rồi đưa vào hàng đợi của LogWriter, server lấy từ `record.guild_id`"""
+
+    def __init__(self, writer):
+        super().__init__()
+        self.writer = writer
+
+    def emit(self, record):
+        try:
+            self.writer.submit((record.guild_id, self.format(record)))
+        except Exception:
+            self.handleError(record)
+
+
+_writer = None
+_writer_lock = threading.Lock()
+# Một logger dùng chung cho mọi server, không giữ logger riêng cho từng server mãi mãi
+_logger = logging.getLogger("server_logger")
+_logger.setLevel(logging.INFO)
+_logger.propagate = False
+
+
+def get_writer():
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = LogWriter(max_open_files=MAX_OPEN_FILES, rotate_bytes=ROTATE_BYTES, rotate_seconds=ROTATE_SECONDS)
+            _writer.start()
+            _logger.handlers.clear()
+            handler = QueuedGuildHandler(_writer)
+            formatter = logging.Formatter("[%(asctime)s] %(message)s", "%Y-%m-%d %H:%M:%S")
+            handler.setFormatter(formatter)
+            _logger.addHandler(handler)
+        return _writer
+
+
+def get_logger(guild_id):
+    """Trả về logger cho một server cụ thể"""
+    get_writer()
+    return logging.LoggerAdapter(_logger, {"guild_id": guild_id})
+
+
+def stats():
+    """Số liệu của hàng đợi log (số dòng đang chờ, đã ghi, bị bỏ) và của FilePool"""
+    if _writer is None:
+        return {"queue_depth": 0, "written": 0, "dropped": 0, "failed": 0, "batches": 0}
+    return _writer.stats()
+
+
+def shutdown():
+    """Ghi hết log còn trong hàng đợi (gọi khi tắt bot)"""
+    global _writer
+    with _writer_lock:
+        if _writer is not None:
+            _writer.stop()
+            _writer = None
@@ -0,0 +1,138 @@
+import asyncio
+import logging
+import math
+import time
+
+log = logging.getLogger(__name__)
+
+
+class TimerWheel:
+    """Bánh xe hẹn giờ: mỗi ô chứa các khoá hết hạn trong cùng một nhịp `resolution` giây.
+
+    Đặt, huỷ và gia hạn đều là O(1). `advance` chỉ duyệt những ô đã qua kể từ lần gọi trước,
+    nên chi phí không phụ thuộc số phiên đang chờ. Khoá có hạn xa hơn một vòng bánh xe
+    vẫn nằm ở ô của nó cho tới đúng vòng.
+    """
+
+    def __init__(self, resolution=1.0, slots=128, now=None):
+        self.resolution = resolution
+        self.slots = [{} for _ in range(slots)]  # khoá -> nhịp hết hạn
+        self.where = {}  # khoá -> ô đang chứa khoá
+        self.tick = self._tick(time.monotonic() if now is None else now)
+
+    def _tick(self, moment):
+        return math.floor(moment / self.resolution)
+
+    def schedule(self, key, deadline):
+        """Đặt (hoặc dời) hạn của `key` sang thời điểm `deadline` (theo time.monotonic)"""
+        self.cancel(key)
+        tick = max(math.ceil(deadline / self.resolution), self.tick + 1)
+        slot = tick % len(self.slots)
+        self.slots[slot][key] = tick
+        self.where[key] = slot
+
+    def cancel(self, key):
+        slot = self.where.pop(key, None)
+        if slot is not None:
+            del self.slots[slot][key]
+
+    def advance(self, now=None):
+        """Trả về danh sách các khoá đã hết hạn tính tới `now` và gỡ chúng khỏi bánh xe"""
+        target = self._tick(time.monotonic() if now is None else now)
+        if target <= self.tick:
+            return []
+        expired = []
+        steps = min(target - self.tick, len(self.slots))
+        for step in range(1, steps + 1):
+            slot = (self.tick + step) % len(self.slots)
+            bucket = self.slots[slot]
+            due = [key for key, tick in bucket.items() if tick <= target]
+            for key in due:
+                del bucket[key]
+                del self.where[key]
+            expired.extend(due)
+        self.tick = target
+        return expired
+
+    def __len__(self):
+        return len(self.where)
+
+
+class Session:
+    """Một phiên tương tác (ví dụ một ván blackjack) đang chờ tin nhắn của người chơi"""
+
+    __slots__ = ('key', 'ctx', 'state', 'commands', 'on_message', 'on_timeout')
+
+    def __init__(self, key, ctx, state, commands, on_message, on_timeout):
+        self.key = key
+        self.ctx = ctx
+        self.state = state
+        self.commands = commands
+        self.on_message = on_message
+        self.on_timeout = on_timeout
+
+
+class SessionManager:
+    """Điều phối tin nhắn tới các phiên tương tác theo khoá (kênh, người dùng).
+
+    Thay cho mỗi phiên một `bot.wait_for`: mỗi tin nhắn chỉ cần một lần tra dict, và hạn
+    chờ của mọi phiên nằm chung một TimerWheel. `dispatch` được gọi từ listener on_message,
+    `expire` được gọi định kỳ (mỗi `resolution` giây).
+    """
+
+    def __init__(self, timeout=60, resolution=1.0):
+        self.timeout = timeout
+        self.sessions = {}
+        self.wheel = TimerWheel(resolution, slots=math.ceil(timeout / resolution) + 2)
+        self.dispatched = 0
+        self.expired = 0
+
+    def open(self, ctx, state, commands, on_message, on_timeout):
+        """Mở phiên cho người gọi lệnh trong kênh hiện tại.
+
+        `on_message(session, lệnh)` được gọi khi người đó gửi một trong `commands` (chữ thường).
+        `on_timeout(session)` được gọi khi hết `timeout` giây không có tin nhắn nào.
+        """
+        key = (ctx.channel.id, ctx.author.id)
+        session = Session(key, ctx, state, frozenset(commands), on_message, on_timeout)
+        self.sessions[key] = session
+        self.touch(key)
+        return session
+
+    def get(self, channel_id, user_id):
+        return self.sessions.get((channel_id, user_id))
+
+    def touch(self, key):
+        """Gia hạn thêm `timeout` giây kể từ bây giờ"""
+        self.wheel.schedule(key, time.monotonic() + self.timeout)
+
+    def close(self, key):
+        self.wheel.cancel(key)
+        return self.sessions.pop(key, None)
+
+    async def dispatch(self, message):
+        """Chuyển tin nhắn cho phiên của người gửi (nếu có), trả về True nếu tin nhắn được xử lý"""
+        session = self.sessions.get((message.channel.id, message.author.id))
+        if session is None:
+            return False
+        content = message.content.strip().lower()
+        if content not in session.commands:
+            return False
+        self.touch(session.key)
+        self.dispatched += 1
+        await session.on_message(session, content)
+        return True
+
+    async def expire(self, now=None):
+        """Đóng các phiên hết hạn và gọi `on_timeout` của chúng"""
+        expired = [self.sessions.pop(key) for key in self.wheel.advance(now) if key in self.sessions]
+        self.expired += len(expired)
+        if expired:
+            results = await asyncio.gather(*(session.on_timeout(session) for session in expired), return_exceptions=True)
+            for session, result in zip(expired, results):
+                if isinstance(result, Exception):
+                    log.error('Lỗi khi đóng phiên %s hết hạn', session.key, exc_info=result)
+        return len(expired)
+
+    def __len__(self):
+        return len(self.sessions)
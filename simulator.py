@@ -0,0 +1,199 @@
+"""Mô phỏng offline các trò chơi và dòng tiền của nền kinh tế bằng NumPy.
+
+Mỗi trò chơi được chơi hàng triệu ván theo lô, báo cáo kỳ vọng (EV) và phương sai trên mỗi
+đơn vị tiền cược. Phần mô phỏng kinh tế chạy nhiều ngày cho một nhóm người dùng (daily,
+work, cờ bạc, rob) để xem tổng số tiền tăng/giảm bao nhiêu mỗi ngày, dùng để chỉnh
+DAILY_AMOUNT, tiền work và tỉ lệ rob trong games.py.
+
+Chạy: python simulator.py --rounds 1000000 --users 10000 --days 30
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+import blackjack as bj
+import games
+
+_POINTS = np.array(bj.CARD_POINTS, dtype=np.int16)
+_ACES = np.array(bj.IS_ACE, dtype=bool)
+_HAND_VALUES = np.array(bj.HAND_VALUES, dtype=np.int16)
+
+
+def simulate_coinflip(n, rng):
+    """Lời/lỗ trên mỗi đơn vị tiền cược của `n` ván (luôn chọn heads)"""
+    return np.where(rng.integers(0, len(games.COIN_SIDES), n) == 0, 1, -1).astype(np.int8)
+
+
+def simulate_spin(n, rng):
+    reels = rng.integers(0, len(games.SPIN_SLOTS), (n, games.SPIN_REELS))
+    win = (reels == reels[:, :1]).all(axis=1)
+    return np.where(win, 1, -1).astype(np.int8)
+
+
+def simulate_taixiu(n, rng):
+    """Luôn chọn tài, tổng 3 hoặc 18 là hoà"""
+    total = rng.integers(1, 7, (n, 3)).sum(axis=1)
+    tai = (total >= games.TAIXIU_TAI.start) & (total < games.TAIXIU_TAI.stop)
+    xiu = (total >= games.TAIXIU_XIU.start) & (total < games.TAIXIU_XIU.stop)
+    return np.where(tai, 1, np.where(xiu, -1, 0)).astype(np.int8)
+
+
+def _hand_values(hard, has_ace):
+    return _HAND_VALUES[np.minimum(hard, bj.MAX_HARD) * 2 + has_ace]
+
+
+def _draw_until(decks, rows, pos, hard, has_ace, stand_on):
+    # Rút cho các tay có điểm dưới `stand_on` cho tới khi mọi tay đều dừng
+    while True:
+        active = _hand_values(hard, has_ace) < stand_on
+        if not active.any():
+            return
+        cards = decks[rows, pos]
+        hard += np.where(active, _POINTS[cards], 0)
+        has_ace |= active & _ACES[cards]
+        pos += active
+
+
+def simulate_blackjack(n, rng, stand_on=17, chunk=200_000):
+    """Người chơi rút tới khi đạt `stand_on` điểm, dealer rút tới 17 (giống blackjack.py).
+
+    Mỗi ván dùng một bộ bài 52 lá mới xáo, chia theo đúng thứ tự của `blackjack.deal`.
+    """
+    results = np.empty(n, dtype=np.int8)
+    for start in range(0, n, chunk):
+        size = min(chunk, n - start)
+        decks = rng.permuted(np.tile(np.arange(52, dtype=np.int8), (size, 1)), axis=1)
+        rows = np.arange(size)
+        player_hard = _POINTS[decks[:, 0]] + _POINTS[decks[:, 1]]
+        player_ace = _ACES[decks[:, 0]] | _ACES[decks[:, 1]]
+        dealer_hard = _POINTS[decks[:, 2]] + _POINTS[decks[:, 3]]
+        dealer_ace = _ACES[decks[:, 2]] | _ACES[decks[:, 3]]
+        pos = np.full(size, 4)
+        _draw_until(decks, rows, pos, player_hard, player_ace, stand_on)
+        _draw_until(decks, rows, pos, dealer_hard, dealer_ace, 17)
+        player = _hand_values(player_hard, player_ace)
+        dealer = _hand_values(dealer_hard, dealer_ace)
+        outcome = np.where(player > 21, -1, np.where((dealer > 21) | (player > dealer), 1, np.where(player == dealer, 0, -1)))
+        results[start:start + size] = outcome
+    return results
+
+
+GAMES = {
+    'coinflip': simulate_coinflip,
+    'spin': simulate_spin,
+    'taixiu': simulate_taixiu,
+    'blackjack': simulate_blackjack,
+}
+
+
+def summarize(net):
+    """EV, phương sai và tỉ lệ thắng/hoà/thua trên mỗi đơn vị tiền cược"""
+    net = net.astype(np.float64)
+    return {
+        'rounds': int(net.size),
+        'ev': float(net.mean()),
+        'variance': float(net.var()),
+        'house_edge': float(-net.mean()),
+        'win': float((net > 0).mean()),
+        'push': float((net == 0).mean()),
+        'loss': float((net < 0).mean()),
+    }
+
+
+def simulate_economy(rng, users=10000, days=30, works_per_day=4, bets_per_day=3, bet_fraction=0.1,
+                     robs_per_day=1, game='coinflip', daily_amount=games.DAILY_AMOUNT, start_balance=1000):
+    """Mô phỏng dòng tiền: mỗi ngày mỗi người nhận daily, work `works_per_day` lần,
+    cược `bets_per_day` ván `game` với `bet_fraction` số dư, và thử rob `robs_per_day` lần.
+
+    Trả về tổng tiền theo từng ngày và lượng tiền mỗi nguồn tạo ra/mất đi (tiền cướp chỉ
+    đổi chủ, tiền phạt rob và tiền thua cược bị huỷ).
+    """
+    balance = np.full(users, float(start_balance))
+    play = GAMES[game]
+    flows = {'daily': 0.0, 'work': 0.0, 'games': 0.0, 'rob_fines': 0.0}
+    totals = [float(balance.sum())]
+    for _ in range(days):
+        balance += daily_amount
+        flows['daily'] += daily_amount * users
+        earned = rng.integers(games.WORK_EARNINGS[0], games.WORK_EARNINGS[1] + 1, (users, works_per_day)).sum(axis=1)
+        balance += earned
+        flows['work'] += float(earned.sum())
+        for _ in range(bets_per_day):
+            bet = np.floor(balance * bet_fraction)
+            net = bet * play(users, rng)
+            balance += net
+            flows['games'] += float(net.sum())
+        for _ in range(robs_per_day):
+            victims = rng.permutation(users)
+            targets = balance[victims] >= games.ROB_MIN_VICTIM_BALANCE
+            success = targets & (rng.random(users) < games.ROB_SUCCESS_RATE)
+            failed = targets & ~success
+            amount = np.where(success, np.minimum(rng.integers(games.ROB_AMOUNT[0], games.ROB_AMOUNT[1] + 1, users), balance[victims]), 0)
+            np.subtract.at(balance, victims, amount)
+            balance += amount
+            fine = np.where(failed, np.minimum(np.floor(balance * games.ROB_FINE_RATE), games.ROB_FINE_MAX), 0)
+            balance -= fine
+            flows['rob_fines'] -= float(fine.sum())
+        totals.append(float(balance.sum()))
+    drift = np.diff(totals)
+    return {
+        'users': users,
+        'days': days,
+        'game': game,
+        'start_total': totals[0],
+        'end_total': totals[-1],
+        'drift_per_day': float(drift.mean()) if days else 0.0,
+        'drift_per_user_per_day': float(drift.mean() / users) if days else 0.0,
+        'median_balance': float(np.median(balance)),
+        'broke_users': float((balance < 1).mean()),
+        'flows': flows,
+        'totals': totals,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rounds', type=int, default=1_000_000, help='Số ván mỗi trò chơi')
+    parser.add_argument('--games', default=','.join(GAMES))
+    parser.add_argument('--stand-on', type=int, default=17, help='Người chơi blackjack dừng khi đạt số điểm này')
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--economy-game', default='coinflip', choices=list(GAMES))
+    parser.add_argument('--bet-fraction', type=float, default=0.1)
+    parser.add_argument('--daily', type=float, default=games.DAILY_AMOUNT)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--json', action='store_true', help='In kết quả dạng JSON')
+    args = parser.parse_args()
+    rng = np.random.default_rng(args.seed)
+
+    report = {'games': {}}
+    for name in args.games.split(','):
+        start = time.perf_counter()
+        net = simulate_blackjack(args.rounds, rng, args.stand_on) if name == 'blackjack' else GAMES[name](args.rounds, rng)
+        elapsed = time.perf_counter() - start
+        report['games'][name] = dict(summarize(net), rounds_per_second=args.rounds / elapsed)
+    report['economy'] = simulate_economy(
+        rng, args.users, args.days, game=args.economy_game, bet_fraction=args.bet_fraction, daily_amount=args.daily,
+    )
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return
+
+    print(f"{'trò chơi':<10} {'EV':>9} {'phương sai':>11} {'thắng':>7} {'hoà':>7} {'thua':>7} {'ván/s':>14}")
+    for name, result in report['games'].items():
+        print(
+            f"{name:<10} {result['ev']:>+9.4f} {result['variance']:>11.4f} {result['win']:>7.2%} "
+            f"{result['push']:>7.2%} {result['loss']:>7.2%} {result['rounds_per_second']:>14,.0f}"
+        )
+    economy = report['economy']
+    print(f"\nKinh tế: {economy['users']:,} người dùng, {economy['days']} ngày, cược {economy['game']}")
+    print(f"Tổng tiền: {economy['start_total']:,.0f} -> {economy['end_total']:,.0f} "
+          f"({economy['drift_per_day']:+,.0f}/ngày, {economy['drift_per_user_per_day']:+,.1f}/người/ngày)")
+    print('Nguồn tiền: ' + ', '.join(f'{name} {value:+,.0f}' for name, value in economy['flows'].items()))
+    print(f"Số dư trung vị: {economy['median_balance']:,.0f}, hết tiền: {economy['broke_users']:.1%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,300 @@
+import functools
+import json
+import os
+import sqlite3
+import threading
+
+from journal import UserJournal, atomic_write
+from records import decode_records, encode_header, encode_record, to_json
+
+
+def _dump_user(user):
+    # Thụt thêm một mức để ghép thẳng vào users.json (chuỗi JSON không chứa xuống dòng thật)
+    return json.dumps(user, ensure_ascii=False, indent=2, default=to_json).replace('\n', '\n  ')
+
+
+class JsonStorage:
+    """Lưu toàn bộ người dùng trong một file JSON, mỗi lần flush ghi lại cả file (phù hợp server nhỏ).
+
+    `persisted` giữ nội dung đã ghi của từng người dùng: chuỗi JSON, hoặc dict đọc từ file (không
+    bao giờ bị sửa) cho tới khi thread ghi serialize nó lần đầu. Mỗi lần flush event loop chỉ
+    serialize người dùng bẩn, phần ghép lại cả file chạy ở thread ghi.
+    """
+
+    lazy = False  # Nạp toàn bộ người dùng vào bộ nhớ khi khởi động
+
+    def __init__(self, path):
+        self.path = path
+        self.persisted = {}
+        self.lock = threading.Lock()
+
+    def load_all(self):
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path, 'r', encoding='utf-8') as f:
+            text = f.read()
+        # Parse hai lần: một bản cho UserStore sửa trực tiếp, một bản giữ nguyên làm `persisted`
+        self.persisted = json.loads(text)
+        return json.loads(text)
+
+    def get(self, user_id):
+        return None
+
+    def stored_supply(self):
+        """Tổng foxcoin đã lưu sẵn (None nếu backend không lưu, khi đó phải đếm lại)"""
+        return None
+
+    def prepare_write(self, user_ids, data):
+        """Serialize người dùng bẩn trên event loop, trả về hàm ghép và ghi cả file để chạy ở thread khác"""
+        with self.lock:
+            persisted = self.persisted
+            for uid in user_ids:
+                user = data.get(uid)
+                if user is None:
+                    persisted.pop(uid, None)
+                else:
+                    persisted[uid] = _dump_user(user)
+            if len(persisted) > len(data):
+                # Sau replace_all: bỏ những người không còn trong dữ liệu
+                for uid in [uid for uid in persisted if uid not in data]:
+                    del persisted[uid]
+            # Bản sao nông: các lần flush sau sửa `persisted` không ảnh hưởng lần ghi này
+            return functools.partial(self._write, dict(persisted))
+
+    def _write(self, users):
+        """Chạy ở thread ghi: ghép users.json giống hệt json.dumps(data, indent=2) rồi ghi"""
+        dumped = {}
+        parts = []
+        for uid, user in users.items():
+            if not isinstance(user, str):
+                user = dumped[uid] = _dump_user(user)
+            parts.append(f'  {json.dumps(uid, ensure_ascii=False)}: {user}')
+        atomic_write(self.path, '{\n' + ',\n'.join(parts) + '\n}' if parts else '{}')
+        # Giữ lại chuỗi JSON để lần sau không phải serialize lại người dùng đọc từ file
+        with self.lock:
+            for uid, text in dumped.items():
+                if isinstance(self.persisted.get(uid), dict):
+                    self.persisted[uid] = text
+
+    def close(self):
+        pass
+
+
+class JournalStorage(JsonStorage):
+    """Snapshot JSON + journal append-only (xem UserJournal)"""
+
+    def __init__(self, path, compact_bytes=4 * 1024 * 1024):
+        super().__init__(path)
+        self.journal = UserJournal(path, compact_bytes=compact_bytes)
+
+    def load_all(self):
+        return self.journal.load()
+
+    def prepare_write(self, user_ids, data):
+        lines = self.journal.encode(user_ids, data)
+        snapshot = None
+        if self.journal.needs_compaction(len(lines)):
+            snapshot = json.dumps(data, ensure_ascii=False, indent=2, default=to_json)
+        return functools.partial(self.journal.commit, lines, snapshot)
+
+
+class BinaryStorage(JsonStorage):
+    """Lưu toàn bộ người dùng trong một file nhị phân gọn (xem records.encode_records).
+
+    Giống JsonStorage là mỗi lần flush ghi lại cả file, nhưng file nhỏ hơn và đọc/ghi nhanh hơn
+    nhiều. `blobs` giữ bytes đã mã hoá của từng người dùng, nên mỗi lần flush event loop chỉ mã
+    hoá người dùng bẩn, phần ghép và ghi cả file chạy ở thread ghi. Lần đầu chạy, dữ liệu được
+    nhập từ users.json (và journal) cũ nếu có.
+    """
+
+    def __init__(self, path, json_path=None):
+        super().__init__(path)
+        self.json_path = json_path
+        self.blobs = {}
+
+    def load_all(self):
+        self.blobs = {}
+        if os.path.exists(self.path):
+            with open(self.path, 'rb') as f:
+                data = decode_records(f.read(), self.blobs)
+        elif self.json_path and UserJournal(self.json_path).exists():
+            data = JournalStorage(self.json_path).load_all()
+        else:
+            data = {}
+        if len(self.blobs) != len(data):
+            # Nhập từ JSON hoặc bảng mã trong file khác trong bộ nhớ: mã hoá lại một lần khi khởi động
+            self.blobs = {uid: encode_record(uid, user) for uid, user in data.items()}
+        return data
+
+    def prepare_write(self, user_ids, data):
+        blobs = self.blobs
+        for uid in user_ids:
+            user = data.get(uid)
+            if user is None:
+                blobs.pop(uid, None)
+            else:
+                blobs[uid] = encode_record(uid, user)
+        if len(blobs) > len(data):
+            # Sau replace_all: bỏ những người không còn trong dữ liệu
+            for uid in [uid for uid in blobs if uid not in data]:
+                del blobs[uid]
+        # bytes không đổi được: chỉ cần chụp danh sách và bảng mã hiện tại
+        header = encode_header(len(blobs))
+        return functools.partial(self._write, header, list(blobs.values()))
+
+    def _write(self, header, blobs):
+        atomic_write(self.path, header + b''.join(blobs))
+
+
+class SqliteStorage:
+    """Mỗi người dùng một dòng trong SQLite (WAL), có index cho số dư và foxcoin.
+
+    Người dùng chỉ được đọc từ database khi cần (lazy). Bộ nhớ chỉ bị giới hạn nếu UserStore được
+    tạo với `cache_size`, nếu không mọi người dùng đã đọc vẫn được giữ lại trong `UserStore.data`.
+    Các câu SQL là hằng số nên được sqlite3 cache lại như prepared statement.
+    """
+
+    lazy = True
+
+    SCHEMA = (
+        '''CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY,
+            balance NUMERIC NOT NULL DEFAULT 0,
+            foxcoin NUMERIC NOT NULL DEFAULT 0,
+            last_daily TEXT,  -- last_daily/last_work: chỉ giữ để migrate_cooldowns (main.py) đọc dữ liệu cũ,
+            last_work REAL,   -- cooldown giờ nằm trong cooldowns.json
+            extra TEXT NOT NULL DEFAULT '{}'
+        )''',
+        'CREATE INDEX IF NOT EXISTS idx_users_balance ON users(balance)',
+        'CREATE INDEX IF NOT EXISTS idx_users_foxcoin ON users(foxcoin)',
+        # Không truy vấn theo cooldown nữa: bỏ index cũ để mỗi lần ghi không phải cập nhật chúng
+        'DROP INDEX IF EXISTS idx_users_last_daily',
+        'DROP INDEX IF EXISTS idx_users_last_work',
+        # Tổng foxcoin đang lưu hành được trigger cập nhật cùng transaction với mỗi lần ghi
+        'CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value NUMERIC)',
+        "INSERT OR IGNORE INTO meta (key, value) SELECT 'foxcoin_supply', total(foxcoin) FROM users",
+        '''CREATE TRIGGER IF NOT EXISTS users_supply_insert AFTER INSERT ON users BEGIN
+            UPDATE meta SET value = value + NEW.foxcoin WHERE key = 'foxcoin_supply';
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS users_supply_update AFTER UPDATE OF foxcoin ON users BEGIN
+            UPDATE meta SET value = value + NEW.foxcoin - OLD.foxcoin WHERE key = 'foxcoin_supply';
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS users_supply_delete AFTER DELETE ON users BEGIN
+            UPDATE meta SET value = value - OLD.foxcoin WHERE key = 'foxcoin_supply';
+        END''',
+    )
+    COLUMNS = ('balance', 'foxcoin', 'last_daily', 'last_work')
+    SELECT_USER = 'SELECT id, balance, foxcoin, last_daily, last_work, extra FROM users WHERE id = ?'
+    SELECT_ALL = 'SELECT id, balance, foxcoin, last_daily, last_work, extra FROM users'
+    UPSERT_USER = (
+        'INSERT INTO users (id, balance, foxcoin, last_daily, last_work, extra) VALUES (?, ?, ?, ?, ?, ?) '
+        'ON CONFLICT(id) DO UPDATE SET balance = excluded.balance, foxcoin = excluded.foxcoin, '
+        'last_daily = excluded.last_daily, last_work = excluded.last_work, extra = excluded.extra'
+    )
+    TOTAL_FOXCOIN = 'SELECT total(foxcoin) FROM users'
+    SELECT_SUPPLY = "SELECT value FROM meta WHERE key = 'foxcoin_supply'"
+    RESET_SUPPLY = "UPDATE meta SET value = ? WHERE key = 'foxcoin_supply'"
+    # Không có index nào dùng được cho balance + foxcoin * giá: quét cả bảng và sắp xếp bằng B-tree
+    # tạm (~0.2 giây với 1 triệu dòng, giữ `lock` suốt lúc đó). Chỉ dùng khi UserStore không có NetWorthIndex
+    TOP_NETWORTH = 'SELECT id, balance + foxcoin * ? AS worth FROM users ORDER BY worth DESC LIMIT ? OFFSET ?'
+    COUNT_USERS = 'SELECT count(*) FROM users'
+
+    def __init__(self, path):
+        self.path = path
+        # Đọc trên event loop, ghi trên thread flush nên dùng chung connection có khoá
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.lock = threading.Lock()
+        with self.lock:
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute('PRAGMA synchronous=NORMAL')
+            for statement in self.SCHEMA:
+                self.conn.execute(statement)
+
+    @staticmethod
+    def _to_record(row):
+        _, balance, foxcoin, last_daily, last_work, extra = row
+        record = {'balance': balance, 'last_daily': last_daily, 'foxcoin': foxcoin}
+        record.update(json.loads(extra))
+        if last_work is not None:
+            record['last_work'] = last_work
+        return record
+
+    @classmethod
+    def _to_row(cls, user_id, record):
+        extra = {k: v for k, v in record.items() if k not in cls.COLUMNS}
+        return (
+            int(user_id), record.get('balance', 0), record.get('foxcoin', 0),
+            record.get('last_daily'), record.get('last_work'),
+            json.dumps(extra, ensure_ascii=False, separators=(',', ':'), default=to_json),
+        )
+
+    def is_empty(self):
+        with self.lock:
+            return self.conn.execute(self.COUNT_USERS).fetchone()[0] == 0
+
+    def load_all(self):
+        return {}
+
+    def get(self, user_id):
+        with self.lock:
+            row = self.conn.execute(self.SELECT_USER, (int(user_id),)).fetchone()
+        return self._to_record(row) if row else None
+
+    def iter_users(self):
+        with self.lock:
+            rows = self.conn.execute(self.SELECT_ALL).fetchall()
+        for row in rows:
+            yield str(row[0]), self._to_record(row)
+
+    def write_many(self, rows):
+        with self.lock:
+            self.conn.execute('BEGIN')
+            try:
+                self.conn.executemany(self.UPSERT_USER, rows)
+            except Exception:
+                self.conn.execute('ROLLBACK')
+                raise
+            self.conn.execute('COMMIT')
+
+    def prepare_write(self, user_ids, data):
+        rows = [self._to_row(uid, data[uid]) for uid in user_ids if uid in data]
+        return functools.partial(self.write_many, rows)
+
+    def total_foxcoin(self):
+        with self.lock:
+            return self.conn.execute(self.TOTAL_FOXCOIN).fetchone()[0]
+
+    def stored_supply(self):
+        with self.lock:
+            return self.conn.execute(self.SELECT_SUPPLY).fetchone()[0]
+
+    def reset_supply(self, value):
+        with self.lock:
+            self.conn.execute(self.RESET_SUPPLY, (value,))
+
+    def top_networth(self, price, limit, offset=0):
+        with self.lock:
+            rows = self.conn.execute(self.TOP_NETWORTH, (price, limit, offset)).fetchall()
+        return [(str(uid), worth) for uid, worth in rows]
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+def open_storage(mode, json_path, sqlite_path=None, compact_bytes=4 * 1024 * 1024, binary_path=None):
+    """Tạo backend lưu trữ theo cấu hình: "json", "journal", "binary" hoặc "sqlite" """
+    if mode == 'json':
+        return JsonStorage(json_path)
+    if mode == 'journal':
+        return JournalStorage(json_path, compact_bytes=compact_bytes)
+    if mode == 'binary':
+        return BinaryStorage(binary_path or os.path.splitext(json_path)[0] + '.bin', json_path)
+    if mode == 'sqlite':
+        storage = SqliteStorage(sqlite_path or os.path.splitext(json_path)[0] + '.db')
+        # Lần đầu chuyển sang SQLite: nhập dữ liệu từ users.json cũ
+        if storage.is_empty() and UserJournal(json_path).exists():
+            data = JournalStorage(json_path).load_all()
+            storage.write_many([storage._to_row(uid, record) for uid, record in data.items()])
+        return storage
+    raise ValueError(f'USER_STORE_MODE không hợp lệ: {mode}')
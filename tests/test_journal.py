@@ -0,0 +1,62 @@
+import json
+
+from journal import UserJournal
+
+
+def commit(journal, data, user_ids):
+    journal.commit(journal.encode(user_ids, data))
+
+
+def test_replay(tmp_path):
+    journal = UserJournal(str(tmp_path / 'users.json'))
+    data = {'1': {'balance': 10}, '2': {'balance': 20}}
+    commit(journal, data, ['1', '2'])
+    data['1'] = {'balance': 5}
+    commit(journal, data, ['1'])
+    assert UserJournal(str(tmp_path / 'users.json')).load() == {'1': {'balance': 5}, '2': {'balance': 20}}
+
+
+def test_replay_on_top_of_snapshot(tmp_path):
+    path = tmp_path / 'users.json'
+    path.write_text(json.dumps({'1': {'balance': 1}, '3': {'balance': 3}}), encoding='utf-8')
+    journal = UserJournal(str(path))
+    commit(journal, {'1': {'balance': 2}}, ['1'])
+    assert UserJournal(str(path)).load() == {'1': {'balance': 2}, '3': {'balance': 3}}
+
+
+def test_torn_tail_is_dropped_and_truncated(tmp_path):
+    path = str(tmp_path / 'users.json')
+    journal = UserJournal(path)
+    commit(journal, {'1': {'balance': 10}, '2': {'balance': 20}}, ['1', '2'])
+    size = journal.journal_bytes
+    # Crash giữa một lần ghi hai người dùng: người đầu đã ghi đủ dòng, người sau ghi dở
+    with open(journal.journal_path, 'a', encoding='utf-8') as f:
+        f.write('{"b":2}\n{"u":"1","d":{"balance":0}}\n{"u":"2","d":{"bal')
+    replayed = UserJournal(path)
+    # Cả lần ghi dở bị bỏ, kể cả bản ghi đã đọc đủ dòng
+    assert replayed.load() == {'1': {'balance': 10}, '2': {'balance': 20}}
+    with open(journal.journal_path, 'rb') as f:
+        assert len(f.read()) == size == replayed.journal_bytes
+    # Ghi tiếp sau khi cắt vẫn phát lại được
+    commit(replayed, {'2': {'balance': 25}}, ['2'])
+    assert UserJournal(path).load() == {'1': {'balance': 10}, '2': {'balance': 25}}
+
+
+def test_incomplete_batch_without_torn_line(tmp_path):
+    path = str(tmp_path / 'users.json')
+    journal = UserJournal(path)
+    commit(journal, {'1': {'balance': 10}}, ['1'])
+    with open(journal.journal_path, 'a', encoding='utf-8') as f:
+        f.write('{"b":2}\n{"u":"1","d":{"balance":0}}\n')
+    assert UserJournal(path).load() == {'1': {'balance': 10}}
+
+
+def test_compaction(tmp_path):
+    path = str(tmp_path / 'users.json')
+    journal = UserJournal(path, compact_bytes=1)
+    data = {'1': {'balance': 10}}
+    lines = journal.encode(['1'], data)
+    assert journal.needs_compaction(len(lines))
+    journal.commit(lines, json.dumps(data))
+    assert journal.journal_bytes == 0
+    assert UserJournal(path).load() == data
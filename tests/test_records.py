@@ -0,0 +1,45 @@
+from records import UserRecord, as_record, decode_records, encode_record, encode_records
+
+
+def sample_users():
+    return {
+        '1': {'balance': 1000, 'last_daily': None, 'foxcoin': 0, 'pets': []},
+        '2': {'balance': 12.5, 'last_daily': '2024-05-01T08:30:00.123456', 'foxcoin': 3.25,
+              'pets': ['Mèo', 'Cáo', 'Mèo'], 'last_work': 1714550000.5, 'inventory': {'Kiếm': 2, 'Khiên': 1}},
+        '3': {'balance': 2 ** 60, 'last_daily': None, 'foxcoin': 7, 'nickname': 'Zero', 'inventory': {'Kiếm': -1}},
+        '18446744073709551615': {'balance': 0, 'last_daily': None, 'foxcoin': 0},
+    }
+
+
+def test_round_trip_dicts():
+    users = sample_users()
+    decoded = decode_records(encode_records(users))
+    assert list(decoded) == list(users)
+    for uid, user in users.items():
+        assert isinstance(decoded[uid], UserRecord)
+        assert decoded[uid].to_dict() == user
+
+
+def test_round_trip_keeps_int_and_float():
+    decoded = decode_records(encode_records(sample_users()))
+    assert type(decoded['1']['balance']) is int
+    assert type(decoded['2']['balance']) is float
+    # Số nguyên quá lớn cho float64 được giữ chính xác (qua extra)
+    assert decoded['3']['balance'] == 2 ** 60
+
+
+def test_round_trip_compact_records():
+    users = {uid: as_record(user) for uid, user in sample_users().items()}
+    assert {uid: r.to_dict() for uid, r in decode_records(encode_records(users)).items()} == \
+        {uid: r.to_dict() for uid, r in users.items()}
+
+
+def test_blobs_match_encode_record():
+    users = sample_users()
+    blobs = {}
+    decode_records(encode_records(users), blobs)
+    assert blobs == {uid: encode_record(uid, user) for uid, user in users.items()}
+
+
+def test_empty():
+    assert decode_records(encode_records({})) == {}
@@ -0,0 +1,65 @@
+import pytest
+
+from storage import open_storage
+from user_store import UserStore
+
+MODES = ['json', 'journal', 'binary', 'sqlite']
+
+
+def open_store(tmp_path, mode, **kwargs):
+    storage = open_storage(mode, str(tmp_path / 'users.json'), str(tmp_path / 'users.db'), **kwargs)
+    return UserStore(storage, compact=mode == 'binary')
+
+
+def fill(store):
+    store.load()
+    store.apply_batch([(1, 'balance', -250), (2, 'balance', 250), (2, 'foxcoin', 1.5)])
+    user = store.get(3)
+    user['pets'].append('Cáo')
+    user['last_daily'] = '2024-05-01T08:30:00'
+    user['inventory'] = {'Kiếm': 2}
+    user['last_work'] = 1714550000.5
+    store.update(3, user)
+
+
+def read_back(store, user_ids):
+    store.load()
+    return {uid: dict(store.get(uid)) for uid in user_ids}
+
+
+@pytest.mark.parametrize('mode', MODES)
+def test_round_trip(tmp_path, mode):
+    store = open_store(tmp_path, mode)
+    fill(store)
+    expected = read_back(store, ['1', '2', '3'])
+    store.close()
+    reloaded = open_store(tmp_path, mode)
+    assert read_back(reloaded, ['1', '2', '3']) == expected
+    assert reloaded.supply == 1.5
+    reloaded.close()
+
+
+@pytest.mark.parametrize('mode', MODES)
+def test_round_trip_after_several_flushes(tmp_path, mode):
+    # compact_bytes nhỏ: journal được nén thành snapshot giữa các lần flush
+    store = open_store(tmp_path, mode, compact_bytes=200)
+    store.load()
+    for step in range(20):
+        store.apply_batch([(step % 5, 'balance', -step), ((step + 1) % 5, 'balance', step)])
+        store.flush()
+    expected = read_back(store, [str(uid) for uid in range(5)])
+    store.close()
+    reloaded = open_store(tmp_path, mode)
+    assert read_back(reloaded, [str(uid) for uid in range(5)]) == expected
+    reloaded.close()
+
+
+@pytest.mark.parametrize('mode', ['binary', 'sqlite'])
+def test_import_from_json(tmp_path, mode):
+    store = open_store(tmp_path, 'journal')
+    fill(store)
+    expected = read_back(store, ['1', '2', '3'])
+    store.close()
+    imported = open_store(tmp_path, mode)
+    assert read_back(imported, ['1', '2', '3']) == expected
+    imported.close()
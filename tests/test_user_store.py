@@ -0,0 +1,82 @@
+import pytest
+
+from storage import JsonStorage, SqliteStorage
+from user_store import InsufficientFunds, SupplyExceeded, UserStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = UserStore(JsonStorage(str(tmp_path / 'users.json')), max_supply=100)
+    store.load()
+    return store
+
+
+def snapshot(store):
+    return {uid: dict(user) for uid, user in store.data.items()}, set(store.dirty), store.supply
+
+
+def test_apply_batch(store):
+    records = store.apply_batch([(1, 'balance', -300), (2, 'balance', 300), (2, 'foxcoin', 4)])
+    assert records['1']['balance'] == 700
+    assert records['2']['balance'] == 1300
+    assert store.supply == 4
+    assert store.dirty == {'1', '2'}
+
+
+def test_apply_batch_rejects_negative_total_across_legs(store):
+    store.get(1)
+    store.get(2)
+    store.flush()
+    before = snapshot(store)
+    # Từng chân không làm âm, nhưng tổng hai chân của người 1 thì có
+    with pytest.raises(InsufficientFunds) as error:
+        store.apply_batch([(1, 'balance', -600), (2, 'balance', 1200), (1, 'balance', -600)])
+    assert (error.value.user_id, error.value.field, error.value.available, error.value.required) == ('1', 'balance', 1000, 1200)
+    assert snapshot(store) == before
+
+
+def test_apply_batch_rejects_when_a_later_leg_fails(store):
+    store.get(1)
+    store.get(2)
+    store.flush()
+    before = snapshot(store)
+    with pytest.raises(InsufficientFunds) as error:
+        store.apply_batch([(1, 'balance', -100), (1, 'foxcoin', 1), (2, 'foxcoin', -1)])
+    assert error.value.user_id == '2'
+    assert snapshot(store) == before
+
+
+def test_apply_batch_nets_legs_of_the_same_user(store):
+    records = store.apply_batch([(1, 'balance', -1500), (1, 'balance', 1000)])
+    assert records['1']['balance'] == 500
+
+
+def test_apply_batch_rejects_supply_over_max(store):
+    store.apply_batch([(1, 'foxcoin', 100)])
+    with pytest.raises(SupplyExceeded):
+        store.apply_batch([(2, 'foxcoin', 1)])
+    assert store.supply == 100
+    # Bán (giảm foxcoin) vẫn được khi đã chạm giới hạn
+    store.apply_batch([(1, 'foxcoin', -1)])
+    assert store.supply == 99
+
+
+def test_lazy_cache_evicts_clean_records(tmp_path):
+    storage = SqliteStorage(str(tmp_path / 'users.db'))
+    store = UserStore(storage, cache_size=10)
+    store.load()
+    for uid in range(50):
+        store.apply_batch([(uid, 'foxcoin', 2)])
+    store.flush()
+    assert len(store.data) == 10
+    # Bản ghi bị bỏ khỏi bộ nhớ giữa lúc đọc và sửa vẫn được ghi và tính đúng supply
+    user = store.get(0)
+    for uid in range(1, 20):
+        store.get(uid)
+    assert '0' not in store.data
+    user['foxcoin'] += 1
+    store.update(0, user)
+    store.flush()
+    assert store.supply == 101 == storage.total_foxcoin()
+    assert storage.get('0')['foxcoin'] == 3
+    storage.close()
@@ -0,0 +1,86 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+import discord
+
+
+class UserNameResolver:
+    """Tra tên hiển thị của người dùng theo ID, dùng chung cho các lệnh liệt kê người dùng.
+
+    Thứ tự tra: cache member/user của gateway -> LRU các tên đã tải (hết hạn sau `ttl` giây)
+    -> gọi API `fetch_user` song song, tối đa `concurrency` request cùng lúc.
+    """
+
+    def __init__(self, bot, ttl=3600, max_size=10000, concurrency=4):
+        self.bot = bot
+        self.ttl = ttl
+        self.max_size = max_size
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.cache = OrderedDict()  # user_id -> (tên, thời điểm hết hạn)
+        self.inflight = {}  # user_id -> Task đang fetch, tránh fetch trùng
+        self.hits = 0
+        self.misses = 0
+
+    def _from_gateway(self, user_id, guild):
+        member = guild.get_member(user_id) if guild is not None else None
+        if member is not None:
+            return member.display_name
+        user = self.bot.get_user(user_id)
+        return user.display_name if user is not None else None
+
+    def _from_cache(self, user_id):
+        entry = self.cache.get(user_id)
+        if entry is None:
+            return None
+        name, expires = entry
+        if expires < time.monotonic():
+            del self.cache[user_id]
+            return None
+        self.cache.move_to_end(user_id)
+        return name
+
+    def _remember(self, user_id, name):
+        self.cache[user_id] = (name, time.monotonic() + self.ttl)
+        self.cache.move_to_end(user_id)
+        while len(self.cache) > self.max_size:
+            self.cache.popitem(last=False)
+
+    async def _fetch(self, user_id):
+        async with self.semaphore:
+            try:
+                user = await self.bot.fetch_user(user_id)
+                name = user.display_name
+            except discord.NotFound:
+                name = f'Người dùng {user_id}'
+        self._remember(user_id, name)
+        return name
+
+    def _fetch_task(self, user_id):
+        task = self.inflight.get(user_id)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(user_id))
+            self.inflight[user_id] = task
+            task.add_done_callback(lambda _: self.inflight.pop(user_id, None))
+        return task
+
+    async def resolve_many(self, user_ids, guild=None):
+        """Trả về dict {user_id: tên} cho danh sách ID (int hoặc str)"""
+        names = {}
+        pending = {}
+        for raw_id in user_ids:
+            user_id = int(raw_id)
+            name = self._from_gateway(user_id, guild) or self._from_cache(user_id)
+            if name is not None:
+                self.hits += 1
+                names[user_id] = name
+            elif user_id not in pending:
+                self.misses += 1
+                pending[user_id] = self._fetch_task(user_id)
+        if pending:
+            results = await asyncio.gather(*pending.values())
+            names.update(zip(pending.keys(), results))
+        return names
+
+    async def resolve(self, user_id, guild=None):
+        return (await self.resolve_many([user_id], guild))[int(user_id)]
@@ -0,0 +1,329 @@
+import asyncio
+import heapq
+import logging
+import math
+
+from records import as_record
+
+log = logging.getLogger(__name__)
+
+
+class InsufficientFunds(ValueError):
+    """Giao dịch bị từ chối vì một tài khoản không đủ số dư"""
+
+    def __init__(self, user_id, field, available, required):
+        super().__init__(f'Người dùng {user_id} không đủ {field}: có {available}, cần {required}')
+        self.user_id = user_id
+        self.field = field
+        self.available = available
+        self.required = required
+
+
+class SupplyExceeded(ValueError):
+    """Giao dịch bị từ chối vì tổng foxcoin đang lưu hành sẽ vượt quá giới hạn"""
+
+    def __init__(self, supply, max_supply, required):
+        super().__init__(f'Nguồn cung foxcoin {supply} + {required} vượt quá giới hạn {max_supply}')
+        self.supply = supply
+        self.max_supply = max_supply
+        self.required = required
+
+
+def new_user():
+    """Dữ liệu mặc định cho người dùng mới"""
+    return {'balance': 1000, 'last_daily': None, 'foxcoin': 0, 'pets': []}
+
+
+class UserStore:
+    """Giữ dữ liệu người dùng trong bộ nhớ và ghi xuống đĩa theo lô (write-behind).
+
+    Dữ liệu được đọc từ `storage` (xem storage.py) một lần khi khởi động, hoặc từng người
+    một khi cần nếu backend là lazy (SQLite). Các bản ghi bị thay đổi được đánh dấu "bẩn"
+    và được ghi xuống cùng một lúc bởi `flush`, được gọi định kỳ và khi tắt bot (chu kỳ flush,
+    USER_FLUSH_INTERVAL trong main.py, là số giây tối đa dữ liệu có thể bị mất nếu bot bị crash).
+
+    `supply` là tổng foxcoin đang lưu hành, được cộng dồn theo chênh lệch foxcoin mỗi lần
+    `update` thay vì cộng lại toàn bộ người dùng.
+
+    Nếu có `index` (NetWorthIndex), bảng xếp hạng được tạo khi nạp dữ liệu và cập nhật
+    theo từng lần `update`.
+
+    Nếu có `max_supply`, `apply_batch` từ chối giao dịch làm `supply` vượt quá giới hạn đó.
+
+    Với backend lazy, `cache_size` giới hạn số người dùng giữ trong bộ nhớ: khi vượt quá, các bản
+    ghi sạch ít được dùng gần đây nhất bị bỏ (LRU) và được đọc lại từ storage khi cần.
+
+    Với `compact=True`, mỗi người dùng được giữ dưới dạng UserRecord (xem records.py) thay vì
+    dict, tốn ít bộ nhớ hơn nhiều khi có hàng triệu người dùng.
+    """
+
+    def __init__(self, storage, index=None, compact=False, max_supply=None, cache_size=None):
+        self.storage = storage
+        self.index = index
+        self.compact = compact
+        self.max_supply = max_supply
+        self.cache_size = cache_size if storage is not None and storage.lazy else None
+        self.data = None
+        self.supply = 0
+        self._foxcoin = {}  # Số foxcoin đã được tính vào `supply` của từng người dùng
+        self.dirty = set()
+        self._writing = set()  # Người dùng flush_async đang ghi ở thread khác
+        self._flushing = False
+
+    def load(self):
+        """Nạp dữ liệu vào bộ nhớ (chỉ lần đầu) và trả về dict người dùng đang được giữ trong bộ nhớ"""
+        if self.data is None:
+            self.data = self.storage.load_all()
+            if self.compact:
+                self.data = {uid: as_record(user) for uid, user in self.data.items()}
+            self._foxcoin = {uid: user.get('foxcoin', 0) for uid, user in self.data.items()}
+            self.supply = self._check_supply()
+            if self.index is not None:
+                users = self.storage.iter_users() if self.storage.lazy else self.data.items()
+                self.index.build(users)
+        return self.data
+
+    def _check_supply(self):
+        """Đếm lại tổng foxcoin khi khởi động và đối chiếu với giá trị đã lưu (nếu có)"""
+        if self.storage.lazy:
+            recount = self.storage.total_foxcoin()
+        else:
+            recount = sum(self._foxcoin.values())
+        stored = self.storage.stored_supply()
+        if stored is not None and not math.isclose(stored, recount, rel_tol=1e-9, abs_tol=1e-6):
+            log.warning('Tổng foxcoin đã lưu (%s) khác với khi đếm lại (%s), dùng giá trị đếm lại', stored, recount)
+            self.storage.reset_supply(recount)
+        return recount
+
+    def get(self, user_id):
+        data = self.load()
+        key = str(user_id)
+        record = data.get(key)
+        if record is None:
+            record = self.storage.get(key)
+            if record is None:
+                record = new_user()
+                self.dirty.add(key)
+                if self.index is not None:
+                    self.index.update(key, record)
+            if self.compact:
+                record = as_record(record)
+            data[key] = record
+            self._foxcoin[key] = record.get('foxcoin', 0)
+            self._evict()
+        elif self.cache_size is not None:
+            # Đưa xuống cuối dict: thứ tự của `data` là thứ tự dùng gần nhất
+            del data[key]
+            data[key] = record
+        return record
+
+    def _evict(self):
+        # Bỏ các bản ghi sạch ít được dùng gần đây nhất, chúng giống hệt bản trong storage.
+        # Bản ghi bẩn hoặc đang được ghi thì phải giữ lại đến khi đã nằm trong storage
+        if self.cache_size is None or len(self.data) <= self.cache_size:
+            return
+        excess = len(self.data) - self.cache_size
+        victims = []
+        for key in self.data:
+            if len(victims) >= excess:
+                break
+            if key not in self.dirty and key not in self._writing:
+                victims.append(key)
+        for key in victims:
+            del self.data[key]
+            del self._foxcoin[key]
+
+    def update(self, user_id, user_data):
+        key = str(user_id)
+        if self.compact:
+            user_data = as_record(user_data)
+        self.load()[key] = user_data
+        self._touch(key, user_data)
+
+    def _touch(self, key, user_data):
+        # Cập nhật supply, bảng xếp hạng và đánh dấu bẩn cho một bản ghi vừa thay đổi
+        foxcoin = user_data.get('foxcoin', 0)
+        previous = self._foxcoin.get(key)
+        if previous is None and self.cache_size is not None:
+            # Bản ghi đã bị bỏ khỏi bộ nhớ giữa lúc đọc và sửa: đưa lại vào, số foxcoin cũ nằm trong storage
+            stored = self.storage.get(key)
+            previous = stored.get('foxcoin', 0) if stored else 0
+            self.data[key] = user_data
+        self.supply += foxcoin - (previous or 0)
+        self._foxcoin[key] = foxcoin
+        if self.index is not None:
+            self.index.update(key, user_data)
+        self.dirty.add(key)
+
+    def apply_batch(self, legs):
+        """Áp dụng các thay đổi `(user_id, trường, chênh lệch)` như một giao dịch duy nhất.
+
+        Mọi chân giao dịch được kiểm tra trước: nếu có trường nào bị âm thì raise
+        InsufficientFunds, nếu supply vượt `max_supply` thì raise SupplyExceeded, và không có gì thay đổi. Sau đó tất cả được ghi cùng lúc, không có
+        `await` ở giữa, nên luôn nằm chung một lần flush (một lần ghi journal/transaction SQLite).
+        Trả về dict {user_id: bản ghi} của các người dùng liên quan.
+        """
+        totals = {}
+        for user_id, field, delta in legs:
+            changes = totals.setdefault(str(user_id), {})
+            changes[field] = changes.get(field, 0) + delta
+        updates = []
+        records = {}
+        for key, changes in totals.items():
+            record = records[key] = self.get(key)
+            for field, delta in changes.items():
+                value = record.get(field, 0) + delta
+                if delta < 0 and value < 0:
+                    raise InsufficientFunds(key, field, record.get(field, 0), -delta)
+                updates.append((record, field, value))
+        self.check_supply(sum(changes.get('foxcoin', 0) for changes in totals.values()))
+        for record, field, value in updates:
+            record[field] = value
+        for key, record in records.items():
+            self._touch(key, record)
+        return records
+
+    def check_supply(self, added):
+        """Raise SupplyExceeded nếu thêm `added` foxcoin làm supply vượt `max_supply`"""
+        self.load()
+        # Bỏ qua sai số float khi mua đúng phần còn lại (MAX_FOXCOIN - supply)
+        if self.max_supply is not None and added > 0 and self.supply + added - self.max_supply > 1e-6:
+            raise SupplyExceeded(self.supply, self.max_supply, added)
+
+    def transfer(self, from_id, to_id, amount, field='balance'):
+        """Chuyển `amount` của trường `field` từ người này sang người khác trong một giao dịch"""
+        return self.apply_batch([(from_id, field, -amount), (to_id, field, amount)])
+
+    def move_item(self, from_id, to_id, item, field='pets'):
+        """Chuyển một món đồ (ví dụ pet) giữa hai người dùng trong một giao dịch"""
+        sender = self.get(from_id)
+        receiver = self.get(to_id)
+        if item not in sender.get(field, []):
+            raise InsufficientFunds(str(from_id), field, sender.get(field, []), item)
+        sender[field].remove(item)
+        receiver.setdefault(field, []).append(item)
+        self._touch(str(from_id), sender)
+        self._touch(str(to_id), receiver)
+        return {str(from_id): sender, str(to_id): receiver}
+
+    def replace_all(self, data):
+        """Thay toàn bộ dữ liệu (tương thích với save_data cũ)"""
+        if self.compact:
+            data = {uid: as_record(user) for uid, user in data.items()}
+        self.data = data
+        self._foxcoin = {uid: user.get('foxcoin', 0) for uid, user in data.items()}
+        self.supply = sum(self._foxcoin.values())
+        if self.index is not None:
+            self.index.build(data.items())
+        self.dirty.update(data.keys())
+
+    def iter_users(self):
+        """Duyệt (user_id, dữ liệu) của mọi người dùng.
+
+        Với backend lazy, hàm này flush đồng bộ rồi đọc cả bảng: chỉ dùng ngoài event loop (khởi động, script).
+        """
+        data = self.load()
+        if not self.storage.lazy:
+            return iter(list(data.items()))
+        self.flush()
+        return self.storage.iter_users()
+
+    def total_foxcoin(self):
+        """Đếm lại toàn bộ foxcoin (chậm, chỉ dùng để kiểm tra `supply`, ngoài event loop)"""
+        if not self.storage.lazy:
+            return sum(user['foxcoin'] for user in self.load().values())
+        self.flush()
+        return self.storage.total_foxcoin()
+
+    def top_networth(self, price, limit, offset=0):
+        """Danh sách (user_id, tổng tài sản) giảm dần theo tổng tài sản.
+
+        Nếu không có `index` và backend là lazy, hàm này flush đồng bộ rồi quét cả bảng SQLite
+        (SqliteStorage.TOP_NETWORTH): trên event loop hãy dùng `top_networth_async`.
+        """
+        self.load()
+        if self.index is not None:
+            if self.index.price != price:
+                self.index.rebase(price)
+            return self.index.top(limit, offset)
+        if not self.storage.lazy:
+            worth = ((uid, user['balance'] + user['foxcoin'] * price) for uid, user in self.load().items())
+            return heapq.nlargest(limit + offset, worth, key=lambda item: item[1])[offset:]
+        self.flush()
+        return self.storage.top_networth(price, limit, offset)
+
+    def ranked_count(self):
+        """Số người dùng trong bảng xếp hạng (để tính số trang)"""
+        self.load()
+        return len(self.index) if self.index is not None else len(self.data)
+
+    def networth_rank(self, user_id):
+        """Hạng tổng tài sản của người dùng (cần `index`)"""
+        self.load()
+        return self.index.rank(str(user_id)) if self.index is not None else None
+
+    # Phiên bản async của các hàm đọc, để code của lệnh dùng chung được với SharedUserStore
+    # (cluster.py), nơi những lần đọc này phải hỏi process chủ qua mạng
+    async def get_async(self, user_id):
+        return self.get(user_id)
+
+    async def apply_batch_async(self, legs):
+        return self.apply_batch(legs)
+
+    async def supply_async(self):
+        self.load()
+        return self.supply
+
+    async def top_networth_async(self, price, limit, offset=0):
+        if self.index is not None or not self.storage.lazy:
+            return self.top_networth(price, limit, offset)
+        # Quét cả bảng SQLite (hàng trăm ms với hàng triệu người dùng): flush và truy vấn ở thread khác.
+        # Nếu một lần flush khác đang chạy, kết quả có thể chưa có thay đổi của lần đó
+        self.load()
+        await self.flush_async()
+        return await asyncio.to_thread(self.storage.top_networth, price, limit, offset)
+
+    async def networth_rank_async(self, user_id):
+        return self.networth_rank(user_id)
+
+    async def ranked_count_async(self):
+        return self.ranked_count()
+
+    def _take_batch(self):
+        # Chụp dữ liệu cần ghi ngay trên event loop để có một ảnh chụp nhất quán,
+        # phần ghi xuống đĩa trả về dưới dạng hàm để chạy ở thread khác
+        batch = self.dirty
+        self.dirty = set()
+        return batch, self.storage.prepare_write(batch, self.data)
+
+    def flush(self):
+        """Ghi đồng bộ mọi thay đổi xuống đĩa (dùng khi tắt bot)"""
+        if self.data is None or not self.dirty:
+            return 0
+        batch, write = self._take_batch()
+        write()
+        self._evict()
+        return len(batch)
+
+    async def flush_async(self):
+        """Ghi các thay đổi xuống đĩa trong thread riêng để không chặn event loop"""
+        if self.data is None or not self.dirty or self._flushing:
+            return 0
+        self._flushing = True
+        batch, write = self._take_batch()
+        self._writing = batch
+        try:
+            await asyncio.to_thread(write)
+        except Exception:
+            # Ghi thất bại: đánh dấu lại để lần sau ghi tiếp
+            self.dirty.update(batch)
+            raise
+        finally:
+            self._writing = set()
+            self._flushing = False
+        self._evict()
+        return len(batch)
+
+    def close(self):
+        self.flush()
+        self.storage.close()